@@ -0,0 +1,181 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from db_writer import get_writer
+from timestamps import now_ms, ms_to_text
+
+logger = logging.getLogger(__name__)
+
+INSERT_ACTIVITY = "INSERT INTO activity_logs (user_id, action, details, timestamp, ts_ms) VALUES (?, ?, ?, ?, ?)"
+
+class _Marker:
+    """Control item for the flusher thread; event is set once everything queued before it is committed."""
+
+    def __init__(self, stop=False):
+        self.stop = stop
+        self.event = threading.Event()
+
+class ActivityLogger:
+    """
+    Buffered, asynchronous activity logging for one database file.
+
+    log() only timestamps the event and puts it on a bounded in-memory queue.
+    A background thread bulk-inserts the queued events every flush_interval
+    seconds or as soon as batch_size events are waiting, whichever comes first.
+    When the queue is full, log() blocks for up to put_timeout seconds
+    (backpressure) and then drops the event with a warning.
+    """
+
+    def __init__(self, db_path, max_queue=10000, batch_size=500, flush_interval=0.25, put_timeout=1.0):
+        """
+        Start the flusher thread.
+
+        Args:
+            db_path: Path to the SQLite database file
+            max_queue: Maximum number of events buffered in memory
+            batch_size: Number of waiting events that triggers an immediate flush
+            flush_interval: Maximum seconds an event waits before being written
+            put_timeout: Seconds log() waits for room in a full queue before dropping the event
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        self.logged = 0
+        self.written = 0
+        self.dropped = 0
+        self._stats_lock = threading.Lock()
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="activity-logger", daemon=True)
+        self._thread.start()
+
+    def log(self, user_id, action, details=None):
+        """Queue an activity event; returns False if it had to be dropped."""
+        if self._closed:
+            logger.warning("Activity logger is closed, dropping event: %s", action)
+            return False
+
+        # Stamp the event now: it may reach the database a little later
+        logged_ms = now_ms()
+        try:
+            self._queue.put((user_id, action, details, ms_to_text(logged_ms), logged_ms), timeout=self.put_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            logger.warning("Activity log queue is full, dropping event: %s", action)
+            return False
+
+        with self._stats_lock:
+            self.logged += 1
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Wait until every event logged so far has been written; returns False on timeout.
+        Like log(), it waits at most put_timeout seconds for room in a full queue.
+        """
+        if self._closed:
+            return True
+        marker = _Marker()
+        try:
+            self._queue.put(marker, timeout=self.put_timeout)
+        except queue.Full:
+            logger.warning("Activity log queue is full, flush request not queued")
+            return False
+        return marker.event.wait(timeout)
+
+    def stats(self):
+        """Return counters for monitoring: events logged, written, dropped and still queued."""
+        with self._stats_lock:
+            return {
+                "logged": self.logged,
+                "written": self.written,
+                "dropped": self.dropped,
+                "queued": self._queue.qsize(),
+            }
+
+    def _run(self):
+        """Flusher loop: block for the first event, then gather more until the batch is full or due."""
+        while True:
+            batch = []
+            markers = []
+            item = self._queue.get()
+
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, _Marker):
+                    markers.append(item)
+                    # Flush and stop requests are served right away
+                    break
+
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+
+            for marker in markers:
+                marker.event.set()
+                if marker.stop:
+                    return
+
+    def _write(self, batch):
+        """Insert a batch of events in a single queued write."""
+        if not batch:
+            return
+
+        try:
+            get_writer(self.db_path).execute(lambda cursor: cursor.executemany(INSERT_ACTIVITY, batch))
+            with self._stats_lock:
+                self.written += len(batch)
+        except Exception as e:
+            logger.error("Failed to write %d activity log events: %s", len(batch), e)
+
+    def close(self):
+        """Write everything still queued and stop the flusher thread."""
+        if self._closed:
+            return
+        self._closed = True
+
+        marker = _Marker(stop=True)
+        self._queue.put(marker)
+        self._thread.join()
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+def get_activity_logger(db_path):
+    """Get the process-wide activity logger for a database file, starting it on first use."""
+    key = os.path.abspath(db_path)
+    with _loggers_lock:
+        activity_logger = _loggers.get(key)
+        if activity_logger is None or activity_logger._closed:
+            activity_logger = ActivityLogger(db_path)
+            _loggers[key] = activity_logger
+        return activity_logger
+
+# Registered after db_writer's handler, so it runs first and its last batch still has a writer
+@atexit.register
+def close_all_activity_loggers():
+    """Flush and stop every activity logger created in this process."""
+    with _loggers_lock:
+        loggers = list(_loggers.values())
+        _loggers.clear()
+
+    for activity_logger in loggers:
+        activity_logger.close()
@@ -0,0 +1,300 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from database import Database
+from result_cache import get_cache
+from query_stats import get_query_stats
+
+logger = logging.getLogger(__name__)
+
+# Maximum age in seconds of the data served to admin reports
+ANALYTICS_MAX_LAG = 60.0
+
+# Tables the admin reports read; the snapshot holds a copy of these only
+REPORTING_TABLES = (
+    "users", "levels", "subjects", "courses",
+    "activity_logs", "activity_daily_rollups", "activity_daily_totals",
+    "activity_user_totals", "activity_active_users",
+)
+
+# Reporting tables whose inserts, updates and deletes the change log records (migration 10)
+CHANGE_LOGGED_TABLES = ("users", "levels", "subjects", "courses")
+
+class AnalyticsSnapshot:
+    """
+    Read-only copy of the reporting tables of a database, refreshed incrementally.
+
+    The snapshot is a database file of its own holding REPORTING_TABLES with
+    their indexes (not their triggers). A refresh attaches the live database
+    read-only and copies, in one transaction, what changed since the last one:
+
+    - activity events above the last id copied, the rollup rows of the days they
+      fall on and the totals of their users; events the archive moved out of
+      the live table are dropped;
+    - users, levels, subjects and courses named in the change log since the last
+      sequence number applied, and rows above the highest id copied (bulk loads
+      bypass the change log).
+
+    The last event id and change log sequence number are kept in the snapshot
+    itself, so any process may refresh it. A new snapshot, or one left behind by
+    an older schema or by a change log gap, is copied whole. Both files are in
+    WAL mode: reading the live database never blocks its writer, and a refresh
+    never blocks the readers of the snapshot.
+
+    The snapshot connection stays open between refreshes, so PRAGMA live.data_version
+    tells whether any connection, in any process, committed to the live database
+    since the last refresh; when none did, the refresh only marks the snapshot as fresh.
+    """
+
+    def __init__(self, db_path, snapshot_path=None, max_lag=ANALYTICS_MAX_LAG):
+        """
+        Args:
+            db_path: Path to the live SQLite database
+            snapshot_path: Where to keep the copy (default: <db name>.analytics.db next to it)
+            max_lag: Seconds between refreshes, i.e. the maximum staleness of reports
+        """
+        root, _ = os.path.splitext(db_path)
+        self.db_path = db_path
+        self.snapshot_path = snapshot_path or f"{root}.analytics.db"
+        self.max_lag = max_lag
+
+        self.refreshed_at = None
+        self._conn = None
+        self._data_version = None
+        self._refresh_lock = threading.Lock()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _open(self):
+        """Open the snapshot for writing, with the live database attached read-only as "live"."""
+        conn = sqlite3.connect(f"file:{self.snapshot_path}", uri=True, isolation_level=None,
+                               check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("ATTACH DATABASE ? AS live", (f"file:{self.db_path}?mode=ro",))
+        return conn
+
+    def refresh(self):
+        """
+        Copy into the snapshot what changed in the live database since the last
+        refresh. Returns whether anything was committed to the live database meanwhile.
+        """
+        with self._refresh_lock:
+            started = time.time()
+            if self._conn is None:
+                # Used by whichever thread refreshes, always under _refresh_lock
+                self._conn = self._open()
+            conn = self._conn
+
+            # Read before the copy starts: a commit landing in between only causes one extra refresh
+            data_version = conn.execute("PRAGMA live.data_version").fetchone()[0]
+            if data_version == self._data_version:
+                self.refreshed_at = started
+                return False
+
+            # Takes the snapshot's write lock; the first read of live starts one consistent read transaction
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = self._state(conn)
+                if state is None:
+                    self._copy_all(conn)
+                else:
+                    self._copy_changes(conn, *state)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+            self._data_version = data_version
+            self.refreshed_at = started
+            # Results cached from the snapshot may be out of date now (another process may have copied the changes)
+            get_cache(self.snapshot_path).clear()
+            return True
+
+    def _state(self, conn):
+        """Return (last activity id, last change log seq) copied, or None when the snapshot must be copied whole."""
+        schema_version = conn.execute("PRAGMA live.user_version").fetchone()[0]
+        if conn.execute("PRAGMA main.user_version").fetchone()[0] != schema_version:
+            return None
+        placeholders = ", ".join("?" for _ in REPORTING_TABLES)
+        present = conn.execute(
+            f"SELECT COUNT(*) FROM main.sqlite_master WHERE type = 'table' AND name IN ('snapshot_state', {placeholders})",
+            REPORTING_TABLES
+        ).fetchone()[0]
+        if present != len(REPORTING_TABLES) + 1:
+            return None
+        return conn.execute("SELECT activity_id, change_seq FROM main.snapshot_state").fetchone()
+
+    def _copy_all(self, conn):
+        """Replace whatever the snapshot holds with a full copy of the reporting tables."""
+        # Virtual tables first: dropping one drops its shadow tables
+        tables = conn.execute("""
+        SELECT name FROM main.sqlite_master
+        WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+        ORDER BY sql LIKE 'CREATE VIRTUAL TABLE%' DESC
+        """).fetchall()
+        for (name,) in tables:
+            conn.execute(f'DROP TABLE IF EXISTS main."{name}"')
+
+        placeholders = ", ".join("?" for _ in REPORTING_TABLES)
+        schema = conn.execute(f"""
+        SELECT sql FROM live.sqlite_master
+        WHERE type IN ('table', 'index') AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+        ORDER BY type = 'index'
+        """, REPORTING_TABLES).fetchall()
+        for (sql,) in schema:
+            conn.execute(sql)
+        for table in REPORTING_TABLES:
+            conn.execute(f"INSERT INTO main.{table} SELECT * FROM live.{table}")
+
+        conn.execute("CREATE TABLE main.snapshot_state (activity_id INTEGER NOT NULL, change_seq INTEGER NOT NULL)")
+        activity_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM live.activity_logs").fetchone()[0]
+        conn.execute("INSERT INTO main.snapshot_state VALUES (?, ?)", (activity_id, self._change_seq(conn)))
+        schema_version = conn.execute("PRAGMA live.user_version").fetchone()[0]
+        conn.execute(f"PRAGMA main.user_version = {int(schema_version)}")
+
+    def _copy_changes(self, conn, activity_id, change_seq):
+        """Copy the activity events logged and the rows changed since the last refresh."""
+        # Events are only ever appended (ids are AUTOINCREMENT) or archived; rollups change with appends only
+        last_id = conn.execute("SELECT MAX(id) FROM live.activity_logs").fetchone()[0] or 0
+        if last_id > activity_id:
+            first_day = conn.execute(
+                "SELECT MIN(date(timestamp)) FROM live.activity_logs WHERE id > ?", (activity_id,)
+            ).fetchone()[0]
+            conn.execute("INSERT INTO main.activity_logs SELECT * FROM live.activity_logs WHERE id > ?", (activity_id,))
+            for table in ("activity_daily_rollups", "activity_daily_totals"):
+                conn.execute(f"DELETE FROM main.{table} WHERE day >= ?", (first_day,))
+                conn.execute(f"INSERT INTO main.{table} SELECT * FROM live.{table} WHERE day >= ?", (first_day,))
+            conn.execute("""
+            INSERT OR REPLACE INTO main.activity_user_totals
+            SELECT * FROM live.activity_user_totals
+            WHERE user_id IN (SELECT COALESCE(user_id, 0) FROM live.activity_logs WHERE id > ?)
+            """, (activity_id,))
+            conn.execute("DELETE FROM main.activity_active_users")
+            conn.execute("INSERT INTO main.activity_active_users SELECT * FROM live.activity_active_users")
+            conn.execute("UPDATE main.snapshot_state SET activity_id = ?", (last_id,))
+
+        # The archive moves every event older than a cutoff, oldest first
+        oldest = conn.execute("SELECT MIN(ts_ms) FROM live.activity_logs").fetchone()[0]
+        if oldest is None:
+            conn.execute("DELETE FROM main.activity_logs")
+        else:
+            conn.execute("DELETE FROM main.activity_logs WHERE ts_ms < ?", (oldest,))
+
+        # Rows added without a change log entry (bulk loads), above the highest id copied so far
+        for table in CHANGE_LOGGED_TABLES:
+            top = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM main.{table}").fetchone()[0]
+            conn.execute(f"INSERT OR REPLACE INTO main.{table} SELECT * FROM live.{table} WHERE id > ?", (top,))
+
+        current_seq = self._change_seq(conn)
+        if current_seq <= change_seq:
+            return
+        first_seq = conn.execute("SELECT MIN(seq) FROM live.change_log WHERE seq > ?", (change_seq,)).fetchone()[0]
+        for table in CHANGE_LOGGED_TABLES:
+            if first_seq != change_seq + 1:
+                # Entries were pruned before this snapshot applied them: copy the table whole
+                conn.execute(f"DELETE FROM main.{table}")
+                conn.execute(f"INSERT INTO main.{table} SELECT * FROM live.{table}")
+                continue
+            changed = "SELECT row_id FROM live.change_log WHERE seq > ? AND table_name = ?"
+            conn.execute(f"DELETE FROM main.{table} WHERE id IN ({changed})", (change_seq, table))
+            conn.execute(f"INSERT INTO main.{table} SELECT * FROM live.{table} WHERE id IN ({changed})", (change_seq, table))
+        conn.execute("UPDATE main.snapshot_state SET change_seq = ?", (current_seq,))
+
+    def _change_seq(self, conn):
+        """Highest change log sequence number handed out in the live database (0 before the first change)."""
+        row = conn.execute("SELECT seq FROM live.sqlite_sequence WHERE name = 'change_log'").fetchone()
+        return row[0] if row else 0
+
+    def ready(self):
+        """Whether this process has refreshed the snapshot yet."""
+        return self.refreshed_at is not None
+
+    def lag(self):
+        """Seconds since the data in the snapshot was last known current (None before the first refresh)."""
+        return None if self.refreshed_at is None else time.time() - self.refreshed_at
+
+    def ensure_fresh(self):
+        """Refresh now if there is no snapshot yet or it is older than max_lag."""
+        lag = self.lag()
+        if lag is None or lag > self.max_lag:
+            self.refresh()
+
+    def start(self):
+        """Refresh in a background thread: right away, then every max_lag seconds."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="analytics-snapshot", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("Analytics snapshot refresh failed: %s", e)
+            if self._stop.wait(self.max_lag):
+                break
+
+    def stop(self):
+        """Stop the background refresh thread and close the snapshot connection."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._refresh_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @contextmanager
+    def connection(self):
+        """Yield this thread's read-only connection to the snapshot, refreshing it first if this process has not yet."""
+        if not self.ready():
+            self.refresh()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.snapshot_path}?mode=ro", uri=True)
+            self._local.conn = conn
+        yield conn
+
+class ReportingDatabase(Database):
+    """
+    Database handle for admin reports: every read is served from the analytics
+    snapshot, at most max_lag seconds behind the live database. The snapshot
+    holds REPORTING_TABLES only, so assignment, search and screenshot reads and
+    entitlement checks are not available. Meant for reading only; writes made
+    through it reach the live database but neither the snapshot nor the live result cache.
+    """
+
+    def __init__(self, db_path="zouhair_elearning.db", max_lag=ANALYTICS_MAX_LAG):
+        # Migrates the live database before the first copy is taken
+        super().__init__(db_path)
+        self.snapshot = get_snapshot(db_path, max_lag)
+        self.cache = get_cache(self.snapshot.snapshot_path)
+        self.query_stats = get_query_stats(self.snapshot.snapshot_path)
+        # The live index would answer for assignments the snapshot does not hold
+        self.entitlements = None
+
+    def _connection(self):
+        """Lend this thread's read-only connection to the snapshot."""
+        return self.snapshot.connection()
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+def get_snapshot(db_path, max_lag=ANALYTICS_MAX_LAG):
+    """Get the process-wide analytics snapshot of a database, starting its refresh thread (which refreshes right away) on first use."""
+    key = os.path.abspath(db_path)
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            snapshot = AnalyticsSnapshot(db_path, max_lag=max_lag)
+            snapshot.start()
+            _snapshots[key] = snapshot
+        return snapshot
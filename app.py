@@ -4,6 +4,8 @@ from auth import initialize_session_state, login_page, require_login, require_ad
 from components.admin_dashboard import admin_dashboard
 from components.student_dashboard import student_dashboard
 from utils import apply_custom_css
+from database import Database
+from maintenance import get_maintenance_scheduler
 import sqlite3
 
 # Configure Streamlit page
@@ -18,6 +20,13 @@ st.set_page_config(
 os.makedirs("uploads", exist_ok=True)
 os.makedirs("uploads/encrypted", exist_ok=True)
 
+# Apply pending schema migrations (only the first run in this process does any work)
+db = Database()
+
+# Statistics, activity log archiving, free page reclaim and WAL checkpoints,
+# in the background during idle moments (never on a user's request)
+get_maintenance_scheduler(db.db_path)
+
 def main():
     """Main application entry point."""
     # Initialize session state
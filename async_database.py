@@ -0,0 +1,75 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database
+
+# Reader threads shared by every facade in the process; each borrows its own pooled connection
+READER_THREADS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_reader_executor():
+    """Get the process-wide thread pool that runs concurrent reads, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=READER_THREADS, thread_name_prefix="db-reader")
+        return _executor
+
+class AsyncDatabase:
+    """
+    asyncio facade over a Database handle.
+
+    Every public Database method is available as a coroutine with the same
+    arguments; the call runs on the reader thread pool, so independent queries
+    awaited together (e.g. with gather) run concurrently on separate pooled
+    connections. SQLite releases the GIL while it executes a statement, so the
+    queries genuinely overlap.
+    """
+
+    def __init__(self, db=None):
+        """
+        Args:
+            db: Database handle to wrap (default: Database() on the default file)
+        """
+        self.db = db if db is not None else Database()
+        self._executor = get_reader_executor()
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if name.startswith("_") or not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+        return call
+
+    async def gather(self, *calls):
+        """Run zero-argument callables (e.g. lambda: db.get_user_levels(user_id)) concurrently; returns their results in order."""
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*[loop.run_in_executor(self._executor, call) for call in calls])
+
+def gather(*calls):
+    """
+    Run independent queries concurrently from synchronous code (e.g. a Streamlit page)
+    and return their results in order. Each call is a zero-argument callable making one query:
+
+        levels, subjects = gather(
+            lambda: db.get_user_levels(user_id),
+            lambda: db.get_user_subjects(user_id),
+        )
+
+    The calls run on the reader thread pool without an event loop, so this also
+    works where no loop can be started. The calls must not gather themselves.
+    """
+    if len(calls) < 2:
+        return [call() for call in calls]
+    executor = get_reader_executor()
+    futures = [executor.submit(call) for call in calls]
+    return [future.result() for future in futures]
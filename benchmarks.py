@@ -0,0 +1,356 @@
+"""
+Micro-benchmarks for the database layer.
+
+Usage:
+    python benchmarks.py            # run every benchmark
+    python benchmarks.py rows ...   # run the named benchmarks
+"""
+import gc
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from rows import map_rows
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Register a benchmark function under a command-line name."""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+def timed(func, repeat=5):
+    """Return the best wall-clock time of several runs, in seconds (GC paused, like timeit)."""
+    best = float("inf")
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best
+
+def retained_memory(func):
+    """Return the bytes still allocated by the value func() returns."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return after - before
+
+@contextmanager
+def temp_database(**seed_options):
+    """Yield a Database on a throwaway file seeded by query_plans.seed_dataset."""
+    from database import Database
+    from query_plans import seed_dataset
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "benchmark.db")
+        seed_dataset(db_path, **seed_options)
+        db = Database(db_path)
+        try:
+            yield db
+        finally:
+            db.change_feed.stop()
+            db.activity_logger.close()
+            db.writer.close()
+            db.pool.close()
+
+def report(title, rows):
+    """Print a small aligned result table: rows of (label, value)."""
+    print(title)
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        print(f"  {label.ljust(width)}  {value}")
+    print()
+
+@benchmark("rows")
+def bench_row_mapping(count=100000):
+    """Hand-built dicts (the old getters) vs. tuple-backed records for listing users."""
+    from database import User, USER_COLUMNS
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute(f"CREATE TABLE users ({', '.join(USER_COLUMNS)})")
+    conn.executemany(
+        f"INSERT INTO users VALUES ({', '.join('?' * len(USER_COLUMNS))})",
+        [
+            (i, f"student_{i}", "x" * 60, "student", f"Student {i}", f"s{i}@example.com",
+             "+212600000000", 1, "2025-01-01 12:00:00")
+            for i in range(count)
+        ]
+    )
+    query = f"SELECT {', '.join(USER_COLUMNS)} FROM users"
+
+    def as_dicts(rows):
+        users = []
+        for user in rows:
+            users.append({
+                "id": user[0],
+                "username": user[1],
+                "password_hash": user[2],
+                "role": user[3],
+                "full_name": user[4],
+                "email": user[5],
+                "phone": user[6],
+                "validated": user[7],
+                "created_at": user[8]
+            })
+        return users
+
+    fetch_time = timed(lambda: conn.execute(query).fetchall())
+    rows = conn.execute(query).fetchall()
+
+    dict_time = timed(lambda: as_dicts(rows))
+    record_time = timed(lambda: map_rows(User, rows))
+
+    # Values (strings) are shared with the raw rows either way; this measures the containers
+    dict_mem = retained_memory(lambda: as_dicts(rows))
+    record_mem = retained_memory(lambda: map_rows(User, rows))
+
+    report(f"Row mapping, {count} users", [
+        ("fetchall", f"{fetch_time * 1000:8.1f} ms"),
+        ("map to dicts", f"{dict_time * 1000:8.1f} ms  ({dict_time * 1e9 / count:5.0f} ns/row)"),
+        ("map to records", f"{record_time * 1000:8.1f} ms  ({record_time * 1e9 / count:5.0f} ns/row)"),
+        ("dict memory", f"{dict_mem / count:8.0f} B/row"),
+        ("record memory", f"{record_mem / count:8.0f} B/row"),
+    ])
+    conn.close()
+
+@benchmark("assign")
+def bench_bulk_assignment(students=500, courses=40):
+    """Per-row assign_course_to_user calls vs. one bulk call per course for a cohort."""
+    with temp_database(users=students, courses=courses, logs=0, courses_per_user=0) as db:
+        student_ids = [user["id"] for user in db.get_all_users(role="student")]
+        course_ids = [course["id"] for course in db.get_all_courses()]
+
+        start = time.perf_counter()
+        for course_id in course_ids:
+            for student_id in student_ids:
+                db.assign_course_to_user(student_id, course_id)
+        per_row = time.perf_counter() - start
+
+        db.writer.execute(lambda cursor: cursor.execute("DELETE FROM user_courses"))
+
+        start = time.perf_counter()
+        for course_id in course_ids:
+            db.assign_course_to_users(course_id, student_ids)
+        bulk = time.perf_counter() - start
+
+        report(f"Assign {len(student_ids)} students to {len(course_ids)} courses", [
+            ("per-row calls", f"{per_row * 1000:9.1f} ms"),
+            ("bulk per course", f"{bulk * 1000:9.1f} ms"),
+        ])
+
+@benchmark("transaction")
+def bench_unit_of_work(students=300):
+    """Enrolling a cohort one call at a time: a commit per call vs. one transaction around all of them."""
+    with temp_database(users=10, courses=20, logs=0, courses_per_user=0) as db:
+        course_ids = [course["id"] for course in db.get_all_courses()][:5]
+
+        def enroll(prefix):
+            for i in range(students):
+                user_id = db.add_user(f"{prefix}_{i}", "x" * 60, "student", full_name=f"Student {i}")
+                db.validate_user(user_id)
+                for course_id in course_ids:
+                    db.assign_course_to_user(user_id, course_id)
+
+        start = time.perf_counter()
+        enroll("committed")
+        per_call = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with db.transaction():
+            enroll("batched")
+        batched = time.perf_counter() - start
+
+        calls = students * (2 + len(course_ids))
+        report(f"Enroll {students} students in {len(course_ids)} courses ({calls} write calls)", [
+            ("commit per call", f"{per_call * 1000:9.1f} ms  ({per_call * 1e6 / calls:6.1f} us/call)"),
+            ("one transaction", f"{batched * 1000:9.1f} ms  ({batched * 1e6 / calls:6.1f} us/call)"),
+        ])
+
+@benchmark("async")
+def bench_page_assembly(rounds=200):
+    """Latency of loading the queries of a dashboard page one after another vs. gathered on the reader pool."""
+    from async_database import AsyncDatabase, gather
+    import asyncio
+
+    with temp_database(users=5000, courses=3000, logs=200000, courses_per_user=300) as db:
+        user_id = 42
+        subject_id = db.get_user_subjects(user_id)[0]["id"]
+        pages = {
+            # A rerun with a subject picked: its courses load with the levels and subjects
+            "Mes Cours": [
+                lambda: db.get_user_levels(user_id),
+                lambda: db.get_user_subjects(user_id),
+                lambda: db.get_user_courses(user_id, subject_id=subject_id),
+            ],
+            "Profil": [
+                lambda: db.get_user_by_id(user_id),
+                lambda: db.get_user_courses(user_id),
+                lambda: db.get_activity_logs(limit=5, user_id=user_id),
+            ],
+            "Admin reports": [
+                lambda: db.get_activity_totals(),
+                lambda: db.get_activity_by_day(),
+                lambda: db.get_activity_by_user(),
+                lambda: db.get_activity_logs(limit=100),
+            ],
+        }
+        adb = AsyncDatabase(db)
+
+        rows = []
+        for label, calls in pages.items():
+            sequential = timed(lambda: [call() for call in calls], repeat=rounds)
+            gathered = timed(lambda: gather(*calls), repeat=rounds)
+            awaited = timed(lambda: asyncio.run(adb.gather(*calls)), repeat=rounds)
+            # With enough cores the gathered page takes as long as its slowest query
+            slowest = max(timed(call, repeat=rounds) for call in calls)
+            rows.append((label, f"sequential {sequential * 1000:7.2f} ms  gather {gathered * 1000:7.2f} ms  "
+                               f"asyncio {awaited * 1000:7.2f} ms  slowest query {slowest * 1000:7.2f} ms"))
+
+        report(f"Page assembly, {len(pages)} pages (best of {rounds}, {os.cpu_count()} CPUs)", rows)
+
+@benchmark("activity")
+def bench_activity_logging(events=2000):
+    """Caller-side latency of log_activity: commit per call vs. queued write vs. buffered logger."""
+    insert = "INSERT INTO activity_logs (user_id, action, details) VALUES (?, ?, ?)"
+
+    with temp_database(users=100, courses=10, logs=0, courses_per_user=0) as db:
+        def run(log):
+            latencies = []
+            start = time.perf_counter()
+            for i in range(events):
+                call_start = time.perf_counter()
+                log(1 + i % 100, "Connexion", None)
+                latencies.append(time.perf_counter() - call_start)
+            called = time.perf_counter() - start
+            db.activity_logger.flush()
+            db.writer.flush()
+            latencies.sort()
+            return called, time.perf_counter() - start, latencies[len(latencies) // 2], latencies[-len(latencies) // 100]
+
+        results = [
+            ("commit per call", run(lambda *args: db._write(insert, args, name="log_activity"))),
+            ("writer queue", run(lambda *args: db._write(insert, args, wait=False, name="log_activity"))),
+            ("activity logger", run(db.log_activity)),
+        ]
+
+        report(f"Log {events} activity events", [
+            (label, f"calls {called * 1000:8.1f} ms  until durable {durable * 1000:8.1f} ms  "
+                    f"p50 {p50 * 1e6:7.1f} us  p99 {p99 * 1e6:7.1f} us")
+            for label, (called, durable, p50, p99) in results
+        ])
+
+@benchmark("search")
+def bench_search(courses=100000, words_per_document=150):
+    """Full-text search latency over courses with titles, JSON descriptions and document text."""
+    import random
+
+    rng = random.Random(99)
+    vocabulary = [
+        "algèbre", "analyse", "matrice", "probabilité", "statistique", "physique", "chimie",
+        "biologie", "histoire", "géographie", "économie", "gestion", "comptabilité", "finance",
+    ] + [f"terme{i}" for i in range(5000)]
+
+    with temp_database(users=1000, courses=courses, logs=0, courses_per_user=20) as db:
+        db.writer.execute(lambda cursor: cursor.executemany(
+            "UPDATE courses_fts SET description = ?, body = ? WHERE rowid = ?",
+            [
+                (" ".join(rng.choices(vocabulary, k=20)), " ".join(rng.choices(vocabulary, k=words_per_document)), i)
+                for i in range(1, courses + 1)
+            ]
+        ))
+
+        queries = [
+            ("one word", {"query": "matrice"}),
+            ("two words", {"query": "matrice probabilité"}),
+            ("prefix", {"query": "statis"}),
+            ("student scope", {"query": "chimie", "user_id": 42}),
+            ("second page", {"query": "matrice", "token": db.search_courses("matrice", page_size=20).next_token}),
+        ]
+
+        rows = []
+        for label, kwargs in queries:
+            elapsed = timed(lambda: db.search_courses(page_size=20, **kwargs))
+            hits = len(db.search_courses(page_size=20, **kwargs).items)
+            rows.append((label, f"{elapsed * 1000:7.2f} ms  ({hits} results on the page)"))
+
+        report(f"Search over {courses} courses", rows)
+
+@benchmark("instrumentation")
+def bench_query_instrumentation(calls=5000, rounds=15):
+    """Cost of the query statistics on hot read paths: the same calls with instrumentation on and off."""
+    from contextlib import nullcontext
+    from rows import record_type
+
+    with temp_database(users=2000, courses=500, logs=20000, courses_per_user=10) as db:
+        student_ids = [user["id"] for user in db.get_all_users(role="student")][:100]
+        course_ids = [course["id"] for course in db.get_all_courses()][:100]
+
+        def workload():
+            for i in range(calls):
+                user_id = student_ids[i % len(student_ids)]
+                db.get_user_by_id(user_id)
+                db.get_user_courses(user_id)
+                db.get_course(course_ids[i % len(course_ids)])
+                db.get_activity_logs(limit=10, user_id=user_id)
+
+        # Alternate the two modes (and which goes first) so drift in machine load affects both alike;
+        # keep the best run of each
+        timings = {False: [], True: []}
+        for round_number in range(rounds):
+            for enabled in ((False, True) if round_number % 2 else (True, False)):
+                db.query_stats.enabled = enabled
+                timings[enabled].append(timed(workload, repeat=1))
+        off, on = min(timings[False]), min(timings[True])
+        queries = calls * 4
+
+        # The difference above is within run-to-run noise on a busy machine, so also measure the
+        # bookkeeping alone: the same choke point on a query that costs next to nothing
+        conn = sqlite3.connect(":memory:")
+        db._connection = lambda: nullcontext(conn)
+        One = record_type("One", ("value",))
+        per_query = {}
+        for enabled in (False, True):
+            db.query_stats.enabled = enabled
+            per_query[enabled] = timed(lambda: [db._fetchone(One, "SELECT 1", name="select_one") for _ in range(10000)], repeat=rounds) / 10000
+        del db._connection
+        db.query_stats.enabled = True
+        conn.close()
+        cost = per_query[True] - per_query[False]
+
+        report(f"Query instrumentation, {queries} queries (best of {rounds} rounds)", [
+            ("disabled", f"{off * 1000:8.1f} ms  ({off * 1e6 / queries:6.1f} us/query)"),
+            ("enabled", f"{on * 1000:8.1f} ms  ({on * 1e6 / queries:6.1f} us/query)"),
+            ("end to end", f"{(on / off - 1) * 100:8.2f} %"),
+            ("cost per query", f"{cost * 1e6:8.2f} us  ({cost / (off / queries) * 100:.2f} % of a query)"),
+        ])
+
+def main(argv=None):
+    names = (argv if argv is not None else sys.argv[1:]) or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}. Available: {', '.join(BENCHMARKS)}")
+        return 1
+
+    for name in names:
+        BENCHMARKS[name]()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from connection_pool import get_pool
+from db_writer import get_writer
+from rows import record_type, map_rows
+from timestamps import ms_ago
+
+logger = logging.getLogger(__name__)
+
+# Maximum delay, in seconds, before a change made by another process is seen here
+CHANGE_POLL_INTERVAL = 1.0
+
+# Entries older than this are pruned; a process that falls further behind resynchronizes from scratch
+CHANGE_LOG_RETENTION = timedelta(hours=1)
+
+Change = record_type("Change", ("seq", "table_name", "op", "row_id", "user_id"))
+
+class ChangeFeed:
+    """
+    Tails the change_log table of one database file.
+
+    Triggers append a row to change_log for every insert, update and delete on
+    the reference and assignment tables, in the same transaction as the change,
+    whichever process makes it. The feed remembers the last sequence number it
+    has seen and, every `interval` seconds, passes the newer entries to its
+    subscribers. A poll with nothing new costs one lookup in sqlite_sequence.
+
+    If entries were pruned before this process saw them, subscribers get None
+    instead of a list: they must assume anything may have changed.
+    """
+
+    def __init__(self, db_path, interval=CHANGE_POLL_INTERVAL, retention=CHANGE_LOG_RETENTION, batch_size=1000):
+        """
+        Args:
+            db_path: Path to the SQLite database file
+            interval: Seconds between polls
+            retention: Age after which entries are pruned
+            batch_size: Maximum entries read per query
+        """
+        self.db_path = db_path
+        self.interval = interval
+        self.retention = retention
+        self.batch_size = batch_size
+
+        self._subscribers = []
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._polls = 0
+        self.stopped = False
+
+        # Only changes made from now on are of interest
+        self.last_seq = self._current_seq()
+
+    def subscribe(self, callback):
+        """Call callback(changes) with each batch of new changes (a list of Change, or None after a gap)."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def _current_seq(self):
+        """Highest sequence number handed out so far (0 before the first change)."""
+        with get_pool(self.db_path).connection() as conn:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        return row[0] if row else 0
+
+    def poll(self):
+        """Deliver the changes committed since the last poll; returns how many there were."""
+        with self._poll_lock:
+            current = self._current_seq()
+            if current <= self.last_seq:
+                return 0
+
+            delivered = 0
+            while self.last_seq < current:
+                with get_pool(self.db_path).connection() as conn:
+                    rows = conn.execute("""
+                    SELECT seq, table_name, op, row_id, user_id FROM change_log
+                    WHERE seq > ?
+                    ORDER BY seq
+                    LIMIT ?
+                    """, (self.last_seq, self.batch_size)).fetchall()
+
+                if not rows or rows[0][0] != self.last_seq + 1:
+                    # Entries we never saw were pruned
+                    logger.warning("Change log entries after %d were pruned, resynchronizing", self.last_seq)
+                    self.last_seq = current
+                    self._publish(None)
+                    return delivered
+
+                changes = map_rows(Change, rows)
+                self.last_seq = changes[-1].seq
+                self._publish(changes)
+                delivered += len(changes)
+
+            return delivered
+
+    def _publish(self, changes):
+        for callback in list(self._subscribers):
+            try:
+                callback(changes)
+            except Exception as e:
+                logger.error("Change feed subscriber failed: %s", e)
+
+    def prune(self):
+        """Queue the deletion of entries older than the retention period."""
+        get_writer(self.db_path).submit_nowait(lambda cursor: cursor.execute(
+            "DELETE FROM change_log WHERE ts_ms < ?", (ms_ago(self.retention),)
+        ))
+
+    def start(self):
+        """Poll in a background thread every interval seconds."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        # Pruning is rare: about ten times per retention period
+        prune_every = max(1, int(self.retention.total_seconds() / 10 / self.interval))
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+                self._polls += 1
+                if self._polls % prune_every == 0:
+                    self.prune()
+            except Exception as e:
+                logger.error("Change feed poll failed: %s", e)
+
+    def stop(self):
+        """Stop the background polling thread."""
+        self.stopped = True
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+def get_change_feed(db_path, on_start=None):
+    """
+    Get the process-wide change feed of a database file, starting its polling thread on first use.
+    on_start(feed) is called once when a feed is created, before polling starts (e.g. to subscribe).
+    """
+    key = os.path.abspath(db_path)
+    with _feeds_lock:
+        feed = _feeds.get(key)
+        if feed is None or feed.stopped:
+            feed = ChangeFeed(db_path)
+            if on_start is not None:
+                on_start(feed)
+            feed.start()
+            _feeds[key] = feed
+        return feed
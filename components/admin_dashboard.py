@@ -1,17 +1,38 @@
 import streamlit as st
 from database import Database
+from analytics_snapshot import ReportingDatabase
+from async_database import gather
+from rows import iter_frames
+from timestamps import ms_ago
 from content_manager import ContentManager
 import json
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from utils import validate_file, save_uploaded_file, delete_file, format_size, apply_custom_css
+from utils import validate_file, save_uploaded_file, delete_file, format_size, apply_custom_css, current_page_token, page_navigation
 import os
-from datetime import datetime, timedelta
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
 from components.pdf_viewer import pdf_preview
 from components.video_player import video_thumbnail
 
+# Page sizes of the paginated admin lists
+USERS_PER_PAGE = 25
+COURSES_PER_PAGE = 20
+
+# Activity log time ranges, in days (None for all time)
+ACTIVITY_TIME_RANGES = {
+    "Last 24 Hours": 1,
+    "Last 7 Days": 7,
+    "Last 30 Days": 30,
+    "All Time": None,
+}
+
+# Columns of the activity CSV export
+ACTIVITY_EXPORT_COLUMNS = ['timestamp', 'username', 'action', 'details']
+
 def admin_dashboard():
     """Admin dashboard for managing content and users."""
     # Apply custom styling for admin dashboard
@@ -197,18 +218,16 @@ def dashboard_overview():
     """Dashboard overview with statistics and charts."""
     st.header("Aperçu de la Plateforme")
 
-    db = Database()
-
-    # Get statistics
-    total_students = len(db.get_all_users(role="student"))
-    validated_students = len(db.get_all_users(role="student", validated=1))
-    total_courses = len(db.get_all_courses())
+    # Reports read the analytics snapshot, never the live database
+    db = ReportingDatabase()
 
-    # Get levels and subjects statistics
-    levels = db.get_all_levels()
-    total_levels = len(levels)
-    subjects = db.get_all_subjects()
-    total_subjects = len(subjects)
+    # Get statistics (one aggregate query, cached until the counted tables change)
+    stats = db.get_platform_stats()
+    total_students = stats.total_students
+    validated_students = stats.validated_students
+    total_courses = stats.total_courses
+    total_levels = stats.total_levels
+    total_subjects = stats.total_subjects
 
     # Recent activity
     recent_activities = db.get_activity_logs(limit=5)
@@ -261,15 +280,7 @@ def dashboard_overview():
 
     with col1:
         # Create data for content by difficulty
-        all_courses = db.get_all_courses()
-        difficulty_counts = {}
-
-        for course in all_courses:
-            difficulty = course['difficulty']
-            if difficulty in difficulty_counts:
-                difficulty_counts[difficulty] += 1
-            else:
-                difficulty_counts[difficulty] = 1
+        difficulty_counts = stats.courses_by_difficulty
 
         if difficulty_counts:
             # Create a pie chart
@@ -286,14 +297,12 @@ def dashboard_overview():
 
     with col2:
         # Create data for content by type
-        content_type_counts = {"PDF": 0, "YouTube": 0}
-
-        for course in all_courses:
-            content_type = course['content_type']
-            if content_type in content_type_counts:
-                content_type_counts[content_type] += 1
+        content_type_counts = {
+            content_type: stats.courses_by_type.get(content_type, 0)
+            for content_type in ("PDF", "YouTube")
+        }
 
-        if all_courses:
+        if total_courses:
             # Create a bar chart
             fig_type = px.bar(
                 x=list(content_type_counts.keys()),
@@ -315,19 +324,10 @@ def dashboard_overview():
         activity_df = pd.DataFrame(recent_activities)
 
         # Format timestamp for better readability
-        activity_df['formatted_time'] = pd.to_datetime(activity_df['timestamp']).dt.strftime('%Y-%m-%d %H:%M')
-
-        # Get usernames for user_ids
-        usernames = {}
-        for activity in recent_activities:
-            if activity['user_id'] not in usernames:
-                user = db.get_user_by_id(activity['user_id'])
-                if user:
-                    usernames[activity['user_id']] = user['username']
-                else:
-                    usernames[activity['user_id']] = f"User {activity['user_id']}"
+        activity_df['formatted_time'] = pd.to_datetime(activity_df['ts_ms'], unit='ms').dt.strftime('%Y-%m-%d %H:%M')
 
-        activity_df['username'] = activity_df['user_id'].map(usernames)
+        # Usernames come joined with the log rows; deleted users keep their id
+        activity_df['username'] = activity_df['username'].fillna("User " + activity_df['user_id'].astype(str))
 
         # Display as a styled table
         st.dataframe(
@@ -447,7 +447,8 @@ def add_content_form():
                         metadata=metadata,
                         difficulty=difficulty,
                         category=selected_subject_id,
-                        user_id=st.session_state.user_id
+                        user_id=st.session_state.user_id,
+                        level_id=selected_level_id
                     )
 
                 else:  # YouTube
@@ -459,13 +460,10 @@ def add_content_form():
                         metadata=metadata,
                         difficulty=difficulty,
                         category=selected_subject_id,
-                        user_id=st.session_state.user_id
+                        user_id=st.session_state.user_id,
+                        level_id=selected_level_id
                     )
 
-                # Update level_id
-                if content_id and selected_level_id:
-                    content_manager.update_content(content_id, level_id=selected_level_id)
-
                 if content_id:
                     st.success(f"Content added successfully with ID: {content_id}")
                     # Log activity
@@ -490,6 +488,13 @@ def view_content_table():
     subjects = db.get_all_subjects()
     levels = db.get_all_levels()
 
+    # Full-text search over titles, descriptions and document text
+    search_query = st.text_input(
+        "🔍 Search courses",
+        placeholder="Title, description or document text",
+        key="content_table_search"
+    ).strip()
+
     # Filtering options
     col1, col2, col3 = st.columns(3)
 
@@ -531,15 +536,32 @@ def view_content_table():
     else:
         filtered_difficulty = selected_difficulty
 
-    # Get filtered courses
+    # Get one page of filtered courses (search results, best matches first, when a query is entered)
+    filters = (search_query, filtered_subject_id, filtered_level_id, filtered_difficulty)
+    page_token = current_page_token("content_table_page", filters)
+
     try:
-        courses = db.get_all_courses(
-            subject_id=filtered_subject_id,
-            level_id=filtered_level_id,
-            difficulty=filtered_difficulty
-        )
+        if search_query:
+            page = db.search_courses(
+                search_query,
+                page_size=COURSES_PER_PAGE,
+                token=page_token,
+                subject_id=filtered_subject_id,
+                level_id=filtered_level_id,
+                difficulty=filtered_difficulty
+            )
+        else:
+            page = db.get_courses_page(
+                page_size=COURSES_PER_PAGE,
+                token=page_token,
+                subject_id=filtered_subject_id,
+                level_id=filtered_level_id,
+                difficulty=filtered_difficulty
+            )
+        courses = page.items
     except Exception as e:
         st.error(f"Error loading courses: {str(e)}")
+        page = None
         courses = []
 
     if not courses:
@@ -587,12 +609,16 @@ def view_content_table():
                 </div>
             </div>
             """, unsafe_allow_html=True)
+            if course.get('snippet'):
+                st.caption(course['snippet'])
 
         with col2:
             if st.button("View/Edit", key=f"view_{course['id']}"):
                 st.session_state.view_content_id = course['id']
                 st.rerun()
 
+    page_navigation("content_table_page", page.next_token)
+
 def display_content_details(content_id):
     """Display details of selected content and provide management options."""
     db = Database()
@@ -718,12 +744,22 @@ def display_content_details(content_id):
         st.markdown("---")
         st.markdown("**Assign to Students:**")
 
-        # Get unassigned students
-        all_students = db.get_all_users(role="student", validated=1)
-        assigned_students = db.get_users_assigned_to_course(content_id)
+        # One page each of the assigned students and of the validated students still available
+        assigned_state = f"course_assigned_page_{content_id}"
+        assigned_page = db.get_users_assigned_to_course_page(
+            content_id,
+            page_size=USERS_PER_PAGE,
+            token=current_page_token(assigned_state, ())
+        )
+        assigned_students = assigned_page.items
 
-        assigned_ids = [student['id'] for student in assigned_students]
-        unassigned_students = [student for student in all_students if student['id'] not in assigned_ids]
+        available_state = f"course_available_page_{content_id}"
+        available_page = db.get_unassigned_students_page(
+            content_id,
+            page_size=USERS_PER_PAGE,
+            token=current_page_token(available_state, ())
+        )
+        unassigned_students = available_page.items
 
         # Display assigned students with option to unassign
         if assigned_students:
@@ -745,6 +781,8 @@ def display_content_details(content_id):
                             st.rerun()
                         else:
                             st.error("Failed to unassign student.")
+
+            page_navigation(assigned_state, assigned_page.next_token)
         else:
             st.info("No students currently assigned to this content.")
 
@@ -752,6 +790,19 @@ def display_content_details(content_id):
         if unassigned_students:
             st.markdown("**Available Students:**")
 
+            if st.button("Assign all validated students", key=f"assign_all_{content_id}"):
+                # Streamed in id order; students already assigned are skipped by the insert
+                assigned_count = db.assign_course_to_users(
+                    content_id, [student['id'] for student in db.iter_users(role="student", validated=1)]
+                )
+                st.success(f"Assigned {assigned_count} students to this content.")
+                # Log activity
+                db.log_activity(
+                    st.session_state.user_id,
+                    f"Assigned {assigned_count} students to content ID {content_id}"
+                )
+                st.rerun()
+
             for student in unassigned_students:
                 cols = st.columns([3, 1])
                 with cols[0]:
@@ -768,6 +819,8 @@ def display_content_details(content_id):
                             st.rerun()
                         else:
                             st.error("Failed to assign student.")
+
+            page_navigation(available_state, available_page.next_token)
         else:
             st.info("No available students to assign.")
 
@@ -901,13 +954,19 @@ def user_management():
     with tab1:
         st.subheader("Students Awaiting Validation")
 
-        # Get pending students
-        pending_students = db.get_all_users(role="student", validated=0)
+        # Get one page of pending students, newest first
+        pending_page = db.get_users_page(
+            page_size=USERS_PER_PAGE,
+            token=current_page_token("pending_users_page", ()),
+            role="student",
+            validated=0
+        )
+        pending_students = pending_page.items
 
         if not pending_students:
             st.info("No students pending validation.")
         else:
-            st.write(f"{len(pending_students)} students waiting for validation")
+            st.write(f"{db.get_platform_stats().pending_students} students waiting for validation")
 
             # Create a DataFrame for better table display
             if pending_students:
@@ -1018,10 +1077,15 @@ def user_management():
                                     if subject["name"] in selected_subjects
                                 ]
 
-                                # Course selection for each subject
+                                # Course selection for each subject (from the cached taxonomy tree)
+                                subject_courses_map = {
+                                    subject["id"]: subject["courses"]
+                                    for level in db.get_taxonomy_tree()
+                                    for subject in level["subjects"]
+                                }
                                 courses_by_subject = {}
                                 for subject_id in selected_subject_ids:
-                                    subject_courses = db.get_all_courses(subject_id=subject_id)
+                                    subject_courses = subject_courses_map.get(subject_id, ())
                                     subject_name = next(s["name"] for s in subjects if s["id"] == subject_id)
 
                                     st.markdown(f"**Courses for {subject_name}:**")
@@ -1032,22 +1096,14 @@ def user_management():
                                         key=f"courses_{student['id']}_{subject_id}"
                                     )
 
-                                    courses_by_subject[subject_id] = []
+                                    # Only collect the selection here; assignments are written on confirmation
                                     if "All" in selected_courses:
-                                        courses_by_subject[subject_id].extend([c["id"] for c in subject_courses])
-
-                                        # Actually assign all courses when "All" is selected
-                                        for course_id in courses_by_subject[subject_id]:
-                                            db.assign_course_to_user(student['id'], course_id)
+                                        courses_by_subject[subject_id] = [c["id"] for c in subject_courses]
                                     else:
-                                        courses_by_subject[subject_id].extend([
+                                        courses_by_subject[subject_id] = [
                                             course["id"] for course in subject_courses 
                                             if course["title"] in selected_courses
-                                        ])
-
-                                        # Assign selected courses
-                                        for course_id in courses_by_subject[subject_id]:
-                                            db.assign_course_to_user(student['id'], course_id)
+                                        ]
 
                                 # Difficulty selection
                                 difficulty = st.selectbox(
@@ -1070,17 +1126,15 @@ def user_management():
                                             st.error("Please select at least one course before validating.")
                                             return
 
-                                        # Assign level
-                                        db.assign_level_to_user(student['id'], selected_level_id)
-
-                                        # Assign subjects and courses
-                                        for subject_id in selected_subject_ids:
-                                            db.assign_subject_to_user(student['id'], subject_id)
-                                            for course_id in courses_by_subject[subject_id]:
-                                                db.assign_course_to_user(student['id'], course_id)
-
-                                        # Finally validate the user
-                                        if db.validate_user(student['id'], validate=True):
+                                        # Assign level, subjects and courses and validate in one transaction
+                                        selected_course_ids = [
+                                            course_id
+                                            for subject_id in selected_subject_ids
+                                            for course_id in courses_by_subject[subject_id]
+                                        ]
+                                        if db.validate_and_assign(
+                                            student['id'], selected_level_id, selected_subject_ids, selected_course_ids
+                                        ):
                                             # Log activity
                                             db.log_activity(
                                                 st.session_state.user_id,
@@ -1099,24 +1153,6 @@ def user_management():
                                         st.session_state[f"selected_courses_{student['id']}"] = {}
                                         st.session_state[f"selected_difficulty_{student['id']}"] = None
                                         st.rerun()
-                                        # Assign level
-                                        db.assign_level_to_user(student['id'], selected_level_id)
-
-                                        # Assign subjects and courses
-                                        for subject_id in selected_subject_ids:
-                                            db.assign_subject_to_user(student['id'], subject_id)
-                                            for course_id in courses_by_subject[subject_id]:
-                                                db.assign_course_to_user(student['id'], course_id)
-
-                                        # Log activity
-                                        db.log_activity(
-                                            st.session_state.user_id,
-                                            f"Validated and assigned student {student['username']} to level {selected_level}"
-                                        )
-                                        st.success(f"User {student['username']} validated and assigned successfully.")
-                                        st.rerun()
-                                    else:
-                                        st.error("Failed to validate user.")
 
                                 st.markdown("</div>", unsafe_allow_html=True)
 
@@ -1134,6 +1170,8 @@ def user_management():
 
                     st.markdown("<hr>", unsafe_allow_html=True)
 
+            page_navigation("pending_users_page", pending_page.next_token)
+
     with tab2:
         st.subheader("All Users")
 
@@ -1159,8 +1197,15 @@ def user_management():
         else:
             validation_param = 0
 
-        # Get filtered users
-        users = db.get_all_users(role=role_param, validated=validation_param)
+        # Get one page of filtered users
+        page_token = current_page_token("all_users_page", (role_param, validation_param))
+        page = db.get_users_page(
+            page_size=USERS_PER_PAGE,
+            token=page_token,
+            role=role_param,
+            validated=validation_param
+        )
+        users = page.items
 
         if not users:
             st.info("No users found with the selected filters.")
@@ -1267,10 +1312,18 @@ def user_management():
                     with st.expander("View/Manage Assignments"):
                         st.markdown("#### User Assignments")
 
-                        # Get user's assignments
-                        user_levels = db.get_user_levels(user['id'])
-                        user_subjects = db.get_user_subjects(user['id'])
-                        user_courses = db.get_user_courses(user['id'])
+                        # Get user's assignments, only while one of their panels is open
+                        # (the expander body runs for every listed user, even collapsed)
+                        panels_open = user['id'] in (
+                            st.session_state.get("manage_user_levels"),
+                            st.session_state.get("manage_user_subjects"),
+                            st.session_state.get("manage_user_courses"),
+                        )
+                        if panels_open:
+                            user_levels, user_subjects = gather(
+                                lambda: db.get_user_levels(user['id']),
+                                lambda: db.get_user_subjects(user['id']),
+                            )
 
                         # Levels tab
                         if st.button("Manage Levels", key=f"manage_levels_{user['id']}"):
@@ -1412,6 +1465,15 @@ def user_management():
                         if "manage_user_courses" in st.session_state and st.session_state.manage_user_courses == user['id']:
                             st.markdown("##### Assigned Courses")
 
+                            # One page of the assigned courses, newest first
+                            courses_state = f"user_courses_page_{user['id']}"
+                            user_courses_page = db.get_user_courses_page(
+                                user['id'],
+                                page_size=COURSES_PER_PAGE,
+                                token=current_page_token(courses_state, ())
+                            )
+                            user_courses = user_courses_page.items
+
                             # Display currently assigned courses with unassign option
                             if user_courses:
                                 for course in user_courses:
@@ -1430,6 +1492,8 @@ def user_management():
                                                 st.rerun()
                                             else:
                                                 st.error("Failed to unassign course.")
+
+                                page_navigation(courses_state, user_courses_page.next_token)
                             else:
                                 st.info("No courses assigned to this user.")
 
@@ -1439,15 +1503,21 @@ def user_management():
                             # Get subject IDs that the user is assigned to
                             assigned_subject_ids = [subject['id'] for subject in user_subjects]
 
-                            # Get all courses from those subjects
+                            # Get all courses from those subjects (from the cached taxonomy tree)
                             all_available_courses = []
+                            subject_courses_map = {
+                                subject["id"]: subject["courses"]
+                                for level in db.get_taxonomy_tree()
+                                for subject in level["subjects"]
+                            }
                             for subject_id in assigned_subject_ids:
-                                subject_courses = db.get_all_courses(subject_id=subject_id)
-                                all_available_courses.extend(subject_courses)
+                                all_available_courses.extend(subject_courses_map.get(subject_id, ()))
 
-                            # Filter out already assigned courses
-                            assigned_course_ids = [course['id'] for course in user_courses]
-                            unassigned_courses = [course for course in all_available_courses if course['id'] not in assigned_course_ids]
+                            # Filter out already assigned courses (in-memory entitlement lookups)
+                            unassigned_courses = [
+                                course for course in all_available_courses
+                                if not db.can_access_course(user['id'], course['id'])
+                            ]
 
                             if unassigned_courses:
                                 for course in unassigned_courses:
@@ -1479,6 +1549,8 @@ def user_management():
 
                 st.markdown("---")
 
+        page_navigation("all_users_page", page.next_token)
+
 def level_management():
     """Level management section of the admin dashboard."""
     st.header("Gestion des Niveaux")
@@ -1520,6 +1592,9 @@ def level_management():
         if not levels:
             st.info("No levels found. Please add a level first.")
         else:
+            # Usage statistics of every level in one query
+            level_counts = db.get_level_counts()
+
             for level in levels:
                 with st.expander(f"{level['name']}"):
                     # Display level details
@@ -1527,8 +1602,9 @@ def level_management():
                     st.markdown(f"**Created at:** {level['created_at']}")
 
                     # Get usage statistics
-                    subjects_count = len(db.get_all_subjects(level_id=level['id']))
-                    students_count = len(db.get_users_assigned_to_level(level['id']))
+                    counts = level_counts.get(level['id'])
+                    subjects_count = counts.subjects if counts else 0
+                    students_count = counts.students if counts else 0
 
                     col1, col2 = st.columns(2)
                     with col1:
@@ -1652,6 +1728,9 @@ def subject_management():
         if not subjects:
             st.info("No subjects found with the selected filter.")
         else:
+            # Usage statistics of every subject in one query
+            subject_counts = db.get_subject_counts()
+
             for subject in subjects:
                 with st.expander(f"{subject['name']} ({subject['level_name']})"):
                     # Display subject details
@@ -1660,8 +1739,9 @@ def subject_management():
                     st.markdown(f"**Created at:** {subject['created_at']}")
 
                     # Get usage statistics
-                    courses_count = len(db.get_all_courses(subject_id=subject['id']))
-                    students_count = len(db.get_users_assigned_to_subject(subject['id']))
+                    counts = subject_counts.get(subject['id'])
+                    courses_count = counts.courses if counts else 0
+                    students_count = counts.students if counts else 0
 
                     col1, col2 = st.columns(2)
                     with col1:
@@ -1754,11 +1834,8 @@ def activity_logs():
     </style>
     """, unsafe_allow_html=True)
 
-    db = Database()
-
-    # Get all users for filter dropdown
-    users = db.get_all_users()
-    user_options = ["All Users"] + [user["username"] for user in users]
+    # Reports read the analytics snapshot, never the live database
+    db = ReportingDatabase()
 
     # Filter options in a container with better styling
     with st.container():
@@ -1766,25 +1843,42 @@ def activity_logs():
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            selected_user = st.selectbox("👤 Filter by User", user_options)
+            selected_user = st.text_input("👤 Filter by User", placeholder="Username (empty for all users)").strip()
 
         with col2:
             # Time range filter
-            time_options = ["Last 24 Hours", "Last 7 Days", "Last 30 Days", "All Time"]
-            selected_time = st.selectbox("⏰ Time Range", time_options)
+            selected_time = st.selectbox("⏰ Time Range", list(ACTIVITY_TIME_RANGES))
 
         with col3:
             limit_options = [10, 25, 50, 100]
-            selected_limit = st.selectbox("📄 Number of Logs", limit_options, index=1)
+            selected_limit = st.selectbox("📄 Logs per Page", limit_options, index=1)
 
     # Get filtered logs
-    if selected_user == "All Users":
-        logs = db.get_activity_logs(limit=selected_limit)
+    if not selected_user:
+        selected_user_id = None
     else:
-        selected_user_id = next((user["id"] for user in users if user["username"] == selected_user), None)
-        logs = db.get_activity_logs(limit=selected_limit, user_id=selected_user_id)
-
-    if not logs:
+        user = db.get_user(selected_user)
+        if not user:
+            st.warning(f"No user named {selected_user}.")
+            return
+        selected_user_id = user["id"]
+
+    # Metrics and charts come from the daily rollups, which also cover archived events
+    days = ACTIVITY_TIME_RANGES[selected_time]
+    since_day = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d') if days else None
+
+    # The queries of the page are independent: run them concurrently
+    logs_token = current_page_token("activity_logs_page", (selected_user_id, selected_limit))
+    logs_page, totals, recent_logs, activity_by_user, activity_by_day = gather(
+        lambda: db.get_activity_logs_page(page_size=selected_limit, token=logs_token, user_id=selected_user_id),
+        lambda: db.get_activity_totals(since_day=since_day, user_id=selected_user_id),
+        lambda: db.count_recent_activities(hours=24, user_id=selected_user_id),
+        lambda: db.get_activity_by_user(since_day=since_day, user_id=selected_user_id),
+        lambda: db.get_activity_by_day(since_day=since_day, user_id=selected_user_id),
+    )
+    logs = logs_page.items
+
+    if not logs and not totals.total:
         st.info("No activity logs found with the selected filters.")
         return
 
@@ -1792,9 +1886,8 @@ def activity_logs():
     st.markdown("### 📈 Activity Overview")
 
     # Calculate metrics
-    total_logs = len(logs)
-    unique_users = len(set(log['username'] for log in logs))
-    recent_logs = len([log for log in logs if (datetime.now() - datetime.strptime(log['timestamp'], '%Y-%m-%d %H:%M:%S')).days < 1])
+    total_logs = totals.total
+    unique_users = totals.active_users
 
     # Display metrics in cards
     col1, col2, col3 = st.columns(3)
@@ -1829,7 +1922,11 @@ def activity_logs():
 
     with col1:
         # Activity by user chart
-        user_activity = pd.DataFrame(logs).groupby('username').size().reset_index(name='count')
+        user_activity = pd.DataFrame(
+            activity_by_user,
+            columns=['user_id', 'username', 'count']
+        )
+        user_activity['username'] = user_activity['username'].fillna("System")
         fig_users = px.bar(
             user_activity,
             x='username',
@@ -1843,10 +1940,11 @@ def activity_logs():
 
     with col2:
         # Activity timeline
-        df_logs = pd.DataFrame(logs)
-        df_logs['timestamp'] = pd.to_datetime(df_logs['timestamp'])
-        df_logs['date'] = df_logs['timestamp'].dt.date
-        daily_activity = df_logs.groupby('date').size().reset_index(name='count')
+        daily_activity = pd.DataFrame(
+            activity_by_day,
+            columns=['day', 'count']
+        )
+        daily_activity['date'] = pd.to_datetime(daily_activity['day'])
 
         fig_timeline = px.line(
             daily_activity,
@@ -1861,9 +1959,14 @@ def activity_logs():
     # Display detailed logs in a modern table
     st.markdown("### 📋 Detailed Activity Logs")
 
+    if not logs:
+        st.info("No recent activity logs; older events have been archived.")
+        return
+
     # Convert logs to DataFrame for better display
     df_display = pd.DataFrame(logs)
-    df_display['timestamp'] = pd.to_datetime(df_display['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    # One vectorized conversion of the epoch-ms column, only for display
+    df_display['timestamp'] = pd.to_datetime(df_display['ts_ms'], unit='ms').dt.strftime('%Y-%m-%d %H:%M:%S')
     df_display = df_display[['timestamp', 'username', 'action', 'details']].rename(columns={
         'timestamp': 'Timestamp',
         'username': 'User',
@@ -1898,4 +2001,37 @@ def activity_logs():
                 width="large"
             )
         }
-    )
\ No newline at end of file
+    )
+
+    page_navigation("activity_logs_page", logs_page.next_token)
+
+    # Export every event of the selected range, not only the rows shown above. Events are
+    # read from the snapshot in chunks and appended to this session's export file, so
+    # building the export holds one chunk in memory however large the range. The download
+    # button takes no stream: it reads the finished file once into Streamlit's media store,
+    # after which the file is removed, whether or not the export went through
+    st.markdown("### 📥 Export")
+    if st.button("Prepare CSV export"):
+        since_ms = ms_ago(timedelta(days=days)) if days else None
+        export_id = st.session_state.setdefault("activity_export_id", uuid.uuid4().hex)
+        export_path = os.path.join(tempfile.gettempdir(), f"activity_logs_{export_id}.csv")
+        try:
+            exported = 0
+            with open(export_path, "w", newline="", encoding="utf-8") as export_file:
+                # Header first, so an empty range still exports a valid CSV
+                pd.DataFrame(columns=ACTIVITY_EXPORT_COLUMNS).to_csv(export_file, index=False)
+                for frame in iter_frames(db.iter_activity_logs(since=since_ms, user_id=selected_user_id)):
+                    frame['timestamp'] = pd.to_datetime(frame['ts_ms'], unit='ms').dt.strftime('%Y-%m-%d %H:%M:%S')
+                    frame[ACTIVITY_EXPORT_COLUMNS].to_csv(export_file, header=False, index=False)
+                    exported += len(frame)
+
+            with open(export_path, "rb") as export_file:
+                st.download_button(
+                    f"Download {exported} activities (CSV)",
+                    export_file,
+                    file_name="activity_logs.csv",
+                    mime="text/csv"
+                )
+        finally:
+            if os.path.exists(export_path):
+                os.remove(export_path)
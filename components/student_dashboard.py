@@ -1,10 +1,15 @@
 import streamlit as st
 from database import Database
+from async_database import gather
 from content_manager import ContentManager
 from components.pdf_viewer import pdf_viewer, pdf_preview
 from components.video_player import video_player, video_thumbnail
+from utils import current_page_token, page_navigation
 import json
 
+# Page size of the course search results
+SEARCH_RESULTS_PER_PAGE = 10
+
 def student_dashboard():
     """Student dashboard for accessing assigned content."""
     st.title("Student Dashboard")
@@ -129,26 +134,41 @@ def student_dashboard():
         # Get student's assigned levels, subjects, and courses
         user_id = st.session_state.user_id
 
-        # Get levels and subjects
-        user_levels = db.get_user_levels(user_id)
-        user_subjects = db.get_user_subjects(user_id)
+        # Search within the student's own courses
+        search_query = st.text_input(
+            "🔍 Rechercher dans mes cours",
+            placeholder="Titre, description ou contenu du document",
+            key="student_course_search"
+        ).strip()
+
+        if search_query:
+            display_search_results(db, user_id, search_query)
+            return
+
+        # The level and subject pickers are keyed, so on a rerun their state already holds
+        # the student's new choice: the courses of that subject load with levels and subjects
+        shown_level_id = st.session_state.get("student_level")
+        shown_subject_id = st.session_state.get(f"student_subject_{shown_level_id}")
+        user_levels, user_subjects, shown_courses = gather(
+            lambda: db.get_user_levels(user_id),
+            lambda: db.get_user_subjects(user_id),
+            lambda: db.get_user_courses(user_id, subject_id=shown_subject_id) if shown_subject_id else None,
+        )
 
         if not user_levels:
             st.info("You haven't been assigned to any levels yet. Please check back later.")
             return
 
         # Select level
-        level_names = [level["name"] for level in user_levels]
-        level_ids = [level["id"] for level in user_levels]
+        level_names = {level["id"]: level["name"] for level in user_levels}
 
-        selected_level_index = st.selectbox(
+        selected_level_id = st.selectbox(
             "Select Level", 
-            range(len(level_names)),
-            format_func=lambda i: level_names[i]
+            list(level_names),
+            format_func=lambda level_id: level_names[level_id],
+            key="student_level"
         )
 
-        selected_level_id = level_ids[selected_level_index]
-
         # Filter subjects by selected level
         level_subjects = [s for s in user_subjects if s["level_id"] == selected_level_id]
 
@@ -156,20 +176,21 @@ def student_dashboard():
             st.info("You haven't been assigned to any subjects in this level yet.")
             return
 
-        # Select subject
-        subject_names = [subject["name"] for subject in level_subjects]
-        subject_ids = [subject["id"] for subject in level_subjects]
+        # Select subject (one picker per level, so each keeps its own choice)
+        subject_names = {subject["id"]: subject["name"] for subject in level_subjects}
 
-        selected_subject_index = st.selectbox(
+        selected_subject_id = st.selectbox(
             "Select Subject", 
-            range(len(subject_names)),
-            format_func=lambda i: subject_names[i]
+            list(subject_names),
+            format_func=lambda subject_id: subject_names[subject_id],
+            key=f"student_subject_{selected_level_id}"
         )
 
-        selected_subject_id = subject_ids[selected_subject_index]
-
-        # Get courses for the selected subject
-        courses = db.get_user_courses(user_id, subject_id=selected_subject_id)
+        # Get courses for the selected subject, unless they came with the first batch
+        if selected_subject_id == shown_subject_id:
+            courses = shown_courses
+        else:
+            courses = db.get_user_courses(user_id, subject_id=selected_subject_id)
 
         if not courses:
             st.info("You haven't been assigned to any courses in this subject yet.")
@@ -193,8 +214,13 @@ def student_dashboard():
     elif page == "Profil":
         st.header("Profil Étudiant")
 
-        # Display student information
-        user = db.get_user_by_id(st.session_state.user_id)
+        # Load the profile, courses and recent activity concurrently
+        user_id = st.session_state.user_id
+        user, user_courses, activities = gather(
+            lambda: db.get_user_by_id(user_id),
+            lambda: db.get_user_courses(user_id),
+            lambda: db.get_activity_logs(limit=5, user_id=user_id),
+        )
 
         if user:
             st.subheader("Personal Information")
@@ -212,12 +238,12 @@ def student_dashboard():
             # Display assigned courses statistics
             st.subheader("Course Statistics")
 
-            total_courses = len(db.get_user_courses(user['id']))
+            # Counted per difficulty from the courses loaded above
+            total_courses = len(user_courses)
             courses_by_difficulty = {}
 
-            for diff in content_manager.get_difficulty_levels():
-                diff_courses = db.get_user_courses(user['id'], difficulty=diff)
-                courses_by_difficulty[diff] = len(diff_courses)
+            for course in user_courses:
+                courses_by_difficulty[course['difficulty']] = courses_by_difficulty.get(course['difficulty'], 0) + 1
 
             col1, col2, col3 = st.columns(3)
 
@@ -233,8 +259,6 @@ def student_dashboard():
             # Display recent activity
             st.subheader("Recent Activity")
 
-            activities = db.get_activity_logs(limit=5, user_id=user['id'])
-
             if activities:
                 for activity in activities:
                     st.write(f"**{activity['action']}** - {activity['timestamp']}")
@@ -243,6 +267,30 @@ def student_dashboard():
         else:
             st.error("Error loading profile information.")
 
+def display_search_results(db, user_id, search_query):
+    """Display one page of search results among the student's assigned courses."""
+    page_token = current_page_token("student_search_page", (search_query,))
+    page = db.search_courses(search_query, page_size=SEARCH_RESULTS_PER_PAGE, token=page_token, user_id=user_id)
+
+    if not page.items:
+        st.info("Aucun cours ne correspond à votre recherche.")
+        return
+
+    st.subheader("Résultats de la recherche")
+
+    cols = st.columns(2)
+    for i, course in enumerate(page.items):
+        with cols[i % 2]:
+            display_content_card(course)
+            if course['snippet']:
+                st.caption(course['snippet'])
+
+    page_navigation("student_search_page", page.next_token)
+
+    # Check if a course is selected for viewing
+    if "view_course_id" in st.session_state and st.session_state.view_course_id:
+        display_content_viewer(st.session_state.view_course_id)
+
 def display_content_card(content):
     """Display a content card in the student dashboard."""
     card_id = f"course-{content['id']}"
@@ -269,6 +317,13 @@ def display_content_card(content):
 def display_content_viewer(content_id):
     """Display a detailed content viewer for the selected content."""
     content_manager = ContentManager()
+
+    # Students may only open courses assigned to them, whatever the session state says
+    if not content_manager.db.can_access_course(st.session_state.user_id, content_id):
+        st.error("Vous n'avez pas accès à ce cours.")
+        st.session_state.view_course_id = None
+        return
+
     content = content_manager.get_content(content_id)
 
     if not content:
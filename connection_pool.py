@@ -0,0 +1,178 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of SQLite connections for one database file."""
+
+    def __init__(self, db_path, max_size=16, timeout=30.0, health_check_interval=30.0):
+        """
+        Create a pool for the given database file.
+
+        Args:
+            db_path: Path to the SQLite database file
+            max_size: Maximum number of open connections
+            timeout: Seconds to wait for a free connection (also used as SQLite busy timeout)
+            health_check_interval: Idle seconds after which a connection is pinged before reuse
+        """
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle = []      # [(conn, last_owner, last_used)]
+        self._in_use = {}    # thread ident -> [conn, depth]
+        self._size = 0
+        self._closed = False
+
+    def _connect(self):
+        """Open a new connection to the database file."""
+        return sqlite3.connect(self.db_path, check_same_thread=False, timeout=self.timeout)
+
+    @staticmethod
+    def _is_healthy(conn):
+        """Check that a connection is still usable."""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _take_idle(self, ident):
+        """Pop an idle connection, preferring the one last used by this thread."""
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._idle[i][1] == ident:
+                return self._idle.pop(i)
+        return self._idle.pop()
+
+    def acquire(self):
+        """
+        Borrow a connection for the current thread.
+        Nested calls from the same thread return the same connection.
+        """
+        ident = threading.get_ident()
+        deadline = time.monotonic() + self.timeout
+
+        with self._cond:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+
+            held = self._in_use.get(ident)
+            if held:
+                held[1] += 1
+                return held[0]
+
+            while True:
+                if self._idle:
+                    conn, _, last_used = self._take_idle(ident)
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise sqlite3.OperationalError("Timed out waiting for a database connection")
+                self._cond.wait(remaining)
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use[ident] = [conn, 1]
+        return conn
+
+    def release(self, conn):
+        """Return a connection borrowed with acquire()."""
+        ident = threading.get_ident()
+
+        with self._cond:
+            held = self._in_use.get(ident)
+            if not held or held[0] is not conn:
+                raise sqlite3.ProgrammingError("Connection released by a thread that does not hold it")
+            held[1] -= 1
+            if held[1] > 0:
+                return
+            del self._in_use[ident]
+
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                conn.close()
+            else:
+                self._idle.append((conn, ident, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection and returns it afterwards."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Return a snapshot of pool usage."""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "max_size": self.max_size
+            }
+
+    def close(self):
+        """Close idle connections; borrowed ones are closed when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn, _, _ in idle:
+            conn.close()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path, **kwargs):
+    """Get the process-wide pool for a database file, creating it on first use."""
+    key = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(db_path, **kwargs)
+            _pools[key] = pool
+        return pool
+
+def close_all_pools():
+    """Close every pool created in this process."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.close()
@@ -3,9 +3,62 @@ import json
 import tempfile
 import shutil
 from datetime import datetime
+import fitz  # PyMuPDF
 from encryption import FileEncryption
 from database import Database
 
+# Upper bound on the text kept in the search index for one document
+MAX_SEARCH_TEXT = 200000
+
+def extract_pdf_text(source, max_chars=MAX_SEARCH_TEXT):
+    """Extract the plain text of a PDF (a file path or its bytes) for the search index (empty if it cannot be read)."""
+    try:
+        doc = fitz.open(stream=source, filetype="pdf") if isinstance(source, bytes) else fitz.open(source)
+    except Exception:
+        return ""
+    
+    parts = []
+    size = 0
+    try:
+        for page in doc:
+            text = page.get_text()
+            parts.append(text)
+            size += len(text)
+            if size >= max_chars:
+                break
+    finally:
+        doc.close()
+    
+    return " ".join(parts)[:max_chars]
+
+def backfill_search_text(db, after_id=0, limit=5, encryption=None):
+    """
+    Index the text of up to limit PDF courses after after_id that are not in the search index yet
+    (uploaded before it existed): each file is decrypted in memory and its text stored for search.
+    Returns (indexed, last_id); pass last_id back to continue, it is None once every course was seen.
+    PDFs without text are marked as such and not looked at again; missing files and files that
+    fail to decrypt are skipped and stay unindexed, to be retried on a later pass.
+    """
+    encryption = encryption or FileEncryption()
+    documents = db.get_unindexed_documents(after_id, limit)
+    
+    indexed = 0
+    for document in documents:
+        if not os.path.exists(document.content_path):
+            continue
+        try:
+            data = encryption.decrypt_file(document.content_path)
+        except Exception:
+            continue
+        
+        text = extract_pdf_text(data)
+        has_text = bool(text.strip())
+        if db.set_course_search_text(document.id, text if has_text else None) and has_text:
+            indexed += 1
+    
+    last_id = documents[-1].id if len(documents) == limit else None
+    return indexed, last_id
+
 class ContentManager:
     """Class for managing educational content (PDFs and videos)."""
     
@@ -20,7 +73,7 @@ class ContentManager:
         os.makedirs(self.upload_dir, exist_ok=True)
         os.makedirs(self.encrypted_dir, exist_ok=True)
     
-    def add_content(self, file_obj, title, content_type, metadata, difficulty, category, user_id):
+    def add_content(self, file_obj, title, content_type, metadata, difficulty, category, user_id, level_id=None):
         """
         Add new content to the system.
         
@@ -32,6 +85,7 @@ class ContentManager:
             difficulty: Difficulty level
             category: Content category
             user_id: ID of the user adding the content
+            level_id: Level of the content
             
         Returns:
             content_id: ID of the newly added content
@@ -46,22 +100,30 @@ class ContentManager:
             with open(file_path, "wb") as f:
                 f.write(file_obj.getbuffer())
             
+            # Extract the text for search while the plain file is still available
+            search_text = extract_pdf_text(file_path)
+            
             # Encrypt file
             encrypted_path = self.encryption.encrypt_file(file_path, self.encrypted_dir)
             
-            # Register in database
-            content_id = self.db.add_course(
-                title=title,
-                content_type=content_type,
-                content_path=encrypted_path,
-                youtube_url=None,
-                difficulty=difficulty,
-                description=metadata_json,
-                subject_id=category,
-                level_id=None,  # Will be updated after creation
-                image_path=None,
-                created_by=user_id
-            )
+            # Register in database and index the document text together
+            with self.db.transaction():
+                content_id = self.db.add_course(
+                    title=title,
+                    content_type=content_type,
+                    content_path=encrypted_path,
+                    youtube_url=None,
+                    difficulty=difficulty,
+                    description=metadata_json,
+                    subject_id=category,
+                    level_id=level_id,
+                    image_path=None,
+                    created_by=user_id
+                )
+                
+                # A PDF without text is marked as such, so the backfill does not try it again
+                if content_id:
+                    self.db.set_course_search_text(content_id, search_text if search_text.strip() else None)
             
             # Clean up original file
             if os.path.exists(file_path):
@@ -81,7 +143,7 @@ class ContentManager:
                 difficulty=difficulty,
                 description=metadata_json,
                 subject_id=category,
-                level_id=None,  # Will be updated after creation
+                level_id=level_id,
                 image_path=None,
                 created_by=user_id
             )
@@ -1,242 +1,446 @@
 import sqlite3
 import os
 import json
+import threading
+import functools
+import re
+from time import perf_counter, monotonic
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from connection_pool import get_pool
+from db_writer import get_writer
+from activity_logger import get_activity_logger
+from migrations import migrate
+from result_cache import get_cache
+from entitlements import get_entitlement_index
+from change_feed import get_change_feed
+from query_stats import TimedCursor, get_query_stats
+from rows import record_type, select_list, map_rows, Page, encode_page_token, decode_page_token
+from timestamps import now_ms, ms_ago, ms_to_text
+
+# Database files whose schema has already been brought up to date in this process
+_initialized_databases = set()
+_initialized_lock = threading.Lock()
+
+# Row records returned by the getters, with the column lists their SELECTs are generated from
+USER_COLUMNS = ("id", "username", "password_hash", "role", "full_name", "email", "phone", "validated", "created_at")
+LEVEL_COLUMNS = ("id", "name", "description", "created_at")
+SUBJECT_COLUMNS = ("id", "name", "description", "level_id", "created_at")
+COURSE_COLUMNS = (
+    "id", "title", "description", "content_type", "content_path", "youtube_url",
+    "subject_id", "level_id", "difficulty", "image_path", "created_by", "created_at", "updated_at"
+)
+ACTIVITY_LOG_COLUMNS = ("id", "user_id", "action", "details", "timestamp", "ts_ms")
+
+User = record_type("User", USER_COLUMNS)
+Level = record_type("Level", LEVEL_COLUMNS)
+Subject = record_type("Subject", SUBJECT_COLUMNS + ("level_name",))
+Course = record_type("Course", COURSE_COLUMNS + ("subject_name", "level_name"))
+ActivityLog = record_type("ActivityLog", ACTIVITY_LOG_COLUMNS + ("username",))
+
+USER_SELECT = select_list("u", USER_COLUMNS)
+LEVEL_SELECT = select_list("l", LEVEL_COLUMNS)
+SUBJECT_SELECT = select_list("s", SUBJECT_COLUMNS) + ", l.name AS level_name"
+COURSE_SELECT = select_list("c", COURSE_COLUMNS) + ", s.name AS subject_name, l.name AS level_name"
+ACTIVITY_LOG_SELECT = select_list("al", ACTIVITY_LOG_COLUMNS) + ", u.username"
+
+# Full-text search hits: the course row with its relevance (lower is better) and a highlighted excerpt
+SearchResult = record_type("SearchResult", COURSE_COLUMNS + ("subject_name", "level_name", "rank", "snippet"))
+
+def search_match_query(text):
+    """
+    Turn free text typed by a user into an FTS5 MATCH expression.
+    Every word must match, as a prefix (so partial words find results while typing);
+    returns None when the text has no searchable words.
+    """
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+# PDF courses whose document text is not in the search index yet
+UnindexedDocument = record_type("UnindexedDocument", ("id", "content_path"))
+
+# Activity summaries read from the daily rollups
+ActivityTotals = record_type("ActivityTotals", ("total", "active_users"))
+DailyActivity = record_type("DailyActivity", ("day", "count"))
+UserActivity = record_type("UserActivity", ("user_id", "username", "count"))
+
+# Raw activity events older than this many days are moved to activity_logs_archive
+ACTIVITY_RETENTION_DAYS = 90
+
+# Rows fetched per round trip by the iter_* streams
+ITER_BATCH_SIZE = 5000
+
+# Best matches a search pages through; their ranking is taken once, on the first page
+SEARCH_RESULT_LIMIT = 200
+
+# One course assignment, as streamed by iter_assignments
+Assignment = record_type("Assignment", ("user_id", "course_id", "assigned_at"))
+
+# Trigger-maintained counts shown on the level and subject management pages
+LevelCounts = record_type("LevelCounts", ("level_id", "subjects", "students"))
+SubjectCounts = record_type("SubjectCounts", ("subject_id", "courses", "students"))
+
+# Level -> subject -> course tree of the reference data, as nested tuples
+TaxonomyCourse = record_type("TaxonomyCourse", (
+    "id", "title", "content_type", "difficulty", "subject_id", "subject_name", "level_id", "created_at"
+))
+TaxonomySubject = record_type("TaxonomySubject", SUBJECT_COLUMNS + ("level_name", "courses"))
+TaxonomyLevel = record_type("TaxonomyLevel", LEVEL_COLUMNS + ("subjects",))
+
+# Aggregate counts for the admin overview; the *_by_* fields map a value to its course count
+PlatformStats = record_type("PlatformStats", (
+    "total_students", "validated_students", "pending_students", "total_courses",
+    "total_levels", "total_subjects", "courses_by_difficulty", "courses_by_type"
+))
+
+# Result cache keys
+PLATFORM_STATS = "platform_stats"
+ALL_LEVELS = "all_levels"
+ALL_SUBJECTS = "all_subjects"
+TAXONOMY_TREE = "taxonomy_tree"
+
+# Result cache keys depending on each table published in change_log
+CACHE_KEYS_BY_TABLE = {
+    "users": (PLATFORM_STATS,),
+    "levels": (PLATFORM_STATS, ALL_LEVELS, TAXONOMY_TREE),
+    "subjects": (PLATFORM_STATS, ALL_SUBJECTS, TAXONOMY_TREE),
+    "courses": (PLATFORM_STATS, TAXONOMY_TREE),
+}
+
+def watch_changes(db_path):
+    """
+    Build the change feed subscriber that keeps this process's caches of a database file
+    current with writes made by any process: result cache keys and entitlement entries.
+    """
+    cache = get_cache(db_path)
+    entitlements = get_entitlement_index(db_path)
+    
+    def on_changes(changes):
+        if changes is None:
+            cache.clear()
+            entitlements.forget()
+            return
+        
+        keys = set()
+        users = set()
+        for change in changes:
+            keys.update(CACHE_KEYS_BY_TABLE.get(change.table_name, ()))
+            if change.user_id is not None:
+                users.add(change.user_id)
+        
+        if keys:
+            cache.invalidate(*keys)
+        for user_id in users:
+            entitlements.forget(user_id)
+    
+    return on_changes
+
+def invalidates(*keys):
+    """
+    Mark a write method as changing the cached results stored under the given keys.
+    Inside a transaction the keys are invalidated once it commits.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.writer.on_commit(lambda: self.cache.invalidate(*keys))
+        return wrapper
+    return decorator
 
 class Database:
     def __init__(self, db_path="zouhair_elearning.db"):
-        """Initialize database connection and create tables if they don't exist."""
+        """Initialize a handle on the shared connection pool and writer, migrating the schema on first use."""
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.cursor = self.conn.cursor()
-        self._create_tables()
-    
-    def _create_tables(self):
-        """Create necessary database tables if they don't exist."""
-        # Users table (both admin and students)
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            role TEXT NOT NULL,
-            full_name TEXT,
-            email TEXT,
-            phone TEXT,
-            validated BOOLEAN DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Levels table (e.g., Bac+2, Bac+3)
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS levels (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            description TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Subjects/Matieres table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS subjects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            level_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (level_id) REFERENCES levels(id),
-            UNIQUE(name, level_id)
-        )
-        ''')
-        
-        # Courses table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS courses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT,
-            content_type TEXT NOT NULL,
-            content_path TEXT,
-            youtube_url TEXT,
-            subject_id INTEGER,
-            level_id INTEGER,
-            difficulty TEXT NOT NULL,
-            image_path TEXT,
-            created_by INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (subject_id) REFERENCES subjects(id),
-            FOREIGN KEY (level_id) REFERENCES levels(id),
-            FOREIGN KEY (created_by) REFERENCES users(id)
-        )
-        ''')
-        
-        # User-Level assignments
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_levels (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            level_id INTEGER,
-            assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (level_id) REFERENCES levels(id),
-            UNIQUE(user_id, level_id)
-        )
-        ''')
-        
-        # User-Subject assignments
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_subjects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            subject_id INTEGER,
-            assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (subject_id) REFERENCES subjects(id),
-            UNIQUE(user_id, subject_id)
-        )
-        ''')
-        
-        # User-Course assignments
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_courses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            course_id INTEGER,
-            assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (course_id) REFERENCES courses(id),
-            UNIQUE(user_id, course_id)
-        )
-        ''')
-        
-        # Screenshot tracking
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS screenshot_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            course_id INTEGER,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (course_id) REFERENCES courses(id)
-        )
-        ''')
-        
-        # Activity logs
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS activity_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            action TEXT NOT NULL,
-            details TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-        ''')
+        self.pool = get_pool(db_path)
+        self._ensure_schema()
+        self.writer = get_writer(db_path)
+        self.cache = get_cache(db_path)
+        self.activity_logger = get_activity_logger(db_path)
+        self.query_stats = get_query_stats(db_path)
+        self.entitlements = get_entitlement_index(db_path)
+        self.change_feed = get_change_feed(db_path, on_start=lambda feed: feed.subscribe(watch_changes(db_path)))
+    
+    def _connection(self):
+        """Context manager lending the current thread a connection for reads."""
+        return self.pool.connection()
+    
+    @contextmanager
+    def _cursor(self, name):
+        """
+        Borrow a reader connection for the current thread and yield a fresh cursor on it.
+        What runs on the cursor is recorded in query_stats under name.
+        """
+        stats = self.query_stats
+        with self._connection() as conn:
+            if not stats.enabled:
+                cursor = conn.cursor()
+                try:
+                    yield cursor
+                finally:
+                    cursor.close()
+                return
+            
+            cursor = conn.cursor(TimedCursor)
+            start = perf_counter()
+            try:
+                yield cursor
+            finally:
+                elapsed = perf_counter() - start
+                cursor.close()
+                stats.record(name, elapsed, cursor.rows, cursor.statements)
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work: the writes made by this thread inside the block commit together
+        when the outermost block exits, or are all rolled back if it raises.
+        
+        Nested blocks are savepoints, so a method can open its own transaction and
+        still be called from inside a larger one. Reads inside the block do not see
+        its uncommitted writes.
+        
+            with db.transaction():
+                course_id = db.add_course(...)
+                db.set_course_search_text(course_id, text)
+        """
+        with self.writer.transaction():
+            yield self
+    
+    def _run_write(self, write, wait=True, *, name):
+        """
+        Run write(cursor) on the writer thread, recording it in query_stats under name.
+        Returns its result once committed, or the Future itself when wait is False.
+        """
+        stats = self.query_stats
+        if not stats.enabled:
+            return self.writer.execute(write) if wait else self.writer.submit_nowait(write)
+        
+        start = perf_counter()
+        
+        def timed_write(cursor):
+            cursor = cursor.connection.cursor(TimedCursor)
+            try:
+                return write(cursor)
+            finally:
+                # Time spent waiting in the queue and committing counts too: callers wait for it
+                stats.record(name, perf_counter() - start, cursor.rows, cursor.statements)
+                cursor.close()
+        
+        return self.writer.execute(timed_write) if wait else self.writer.submit_nowait(timed_write)
+    
+    def _write(self, sql, params=(), wait=True, *, name):
+        """
+        Run a single write statement on the writer thread.
+        Returns (lastrowid, rowcount) once committed, or the Future itself when wait is False.
+        """
+        def write(cursor):
+            cursor.execute(sql, params)
+            return cursor.lastrowid, cursor.rowcount
+        
+        return self._run_write(write, wait, name=name)
+    
+    def _write_many(self, sql, rows, *, name):
+        """Run one statement for many parameter rows in a single queued transaction; returns rows changed."""
+        rows = list(rows)
+        if not rows:
+            return 0
         
-        # Commit changes
-        self.conn.commit()
+        def write(cursor):
+            cursor.executemany(sql, rows)
+            return cursor.rowcount
         
-        # Create admin user if not exists
-        self.cursor.execute("SELECT COUNT(*) FROM users WHERE role='admin'")
-        if self.cursor.fetchone()[0] == 0:
+        return self._run_write(write, name=name)
+    
+    def _fetchone(self, record, query, params=(), *, name):
+        """Run a read query and map its first row to a record (None if no row)."""
+        start = perf_counter()
+        with self._connection() as conn:
+            row = conn.execute(query, params).fetchone()
+        
+        stats = self.query_stats
+        if stats.enabled:
+            stats.record_query(name, perf_counter() - start, 1 if row else 0, query, params)
+        return record.from_row(row) if row else None
+    
+    def _fetchall(self, record, query, params=(), *, name):
+        """Run a read query and map every row to a record."""
+        start = perf_counter()
+        with self._connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        
+        stats = self.query_stats
+        if stats.enabled:
+            stats.record_query(name, perf_counter() - start, len(rows), query, params)
+        return map_rows(record, rows)
+    
+    def _iterate(self, record, query, params=(), batch_size=ITER_BATCH_SIZE, *, name):
+        """
+        Stream the rows of a read query as records, fetching batch_size rows at a time
+        on a cursor of its own, so memory holds one batch however large the result.
+        
+        The query starts on the first next() and is one read transaction until the
+        generator is exhausted or closed: the rows form a consistent snapshot, writers
+        are not blocked (WAL), but the WAL cannot be checkpointed past it meanwhile.
+        Consume the generator from the thread that started it.
+        """
+        stats = self.query_stats
+        
+        def rows():
+            fetched = 0
+            elapsed = 0.0
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    start = perf_counter()
+                    batch = cursor.execute(query, params).fetchmany(batch_size)
+                    elapsed += perf_counter() - start
+                    while batch:
+                        fetched += len(batch)
+                        yield from map(record.from_row, batch)
+                        # Time spent by the consumer between batches is not the query's
+                        start = perf_counter()
+                        batch = cursor.fetchmany(batch_size)
+                        elapsed += perf_counter() - start
+                finally:
+                    cursor.close()
+                    if stats.enabled:
+                        stats.record_query(name, elapsed, fetched, query, params)
+        
+        return rows()
+    
+    def _fetch_page(self, record, query, where_clauses, params, keyset, page_size, token, descending=True, *, name):
+        """
+        Fetch one page of a keyset-paginated listing.
+        
+        Args:
+            record: Record type for the rows
+            query: SELECT ... FROM ... JOIN ... without WHERE/ORDER BY
+            where_clauses: Filter conditions (joined with AND)
+            params: Parameters for the filter conditions
+            keyset: Sort key as ((sql_column, record_field), ...), ending with a unique column
+            page_size: Number of rows per page
+            token: Continuation token from the previous page, or None for the first page
+            descending: Sort direction of the keyset
+            name: Name the query is recorded under in query_stats (the public method)
+        """
+        where_clauses = list(where_clauses)
+        params = list(params)
+        
+        if token:
+            columns = ", ".join(column for column, _ in keyset)
+            placeholders = ", ".join("?" for _ in keyset)
+            where_clauses.append(f"({columns}) {'<' if descending else '>'} ({placeholders})")
+            params.extend(decode_page_token(token, len(keyset)))
+        
+        if where_clauses:
+            query += " WHERE " + " AND ".join(where_clauses)
+        
+        direction = "DESC" if descending else "ASC"
+        query += " ORDER BY " + ", ".join(f"{column} {direction}" for column, _ in keyset)
+        
+        # Fetch one extra row to know whether another page exists
+        query += " LIMIT ?"
+        params.append(page_size + 1)
+        
+        items = self._fetchall(record, query, params, name=name)
+        
+        next_token = None
+        if len(items) > page_size:
+            items = items[:page_size]
+            next_token = encode_page_token([items[-1][field] for _, field in keyset])
+        
+        return Page(items, next_token)
+    
+    def _generations(self, *tables, name):
+        """Read the current values of the cache_generations counters for the given tables."""
+        with self._cursor(name) as cursor:
+            cursor.execute(
+                f"SELECT name, generation FROM cache_generations WHERE name IN ({', '.join('?' for _ in tables)})",
+                tables
+            )
+            generations = dict(cursor.fetchall())
+        return tuple(generations.get(table) for table in tables)
+    
+    def _ensure_schema(self):
+        """Run pending migrations and seed the admin account, once per process and database file."""
+        key = os.path.abspath(self.db_path)
+        if key in _initialized_databases:
+            return
+        
+        with _initialized_lock:
+            if key in _initialized_databases:
+                return
+            
+            with self.pool.connection() as conn:
+                migrate(conn)
+                self._seed_admin(conn)
+            
+            _initialized_databases.add(key)
+    
+    def _seed_admin(self, conn):
+        """Create the default admin user if no admin exists."""
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM users WHERE role='admin'")
+        if cursor.fetchone()[0] == 0:
             from auth import hash_password
             admin_hash = hash_password("admin123")
-            self.cursor.execute(
+            cursor.execute(
                 "INSERT INTO users (username, password_hash, role, full_name, validated) VALUES (?, ?, ?, ?, ?)",
                 ("admin", admin_hash, "admin", "Zouhair Admin", 1)
             )
-            self.conn.commit()
+            conn.commit()
     
     # User Management
+    @invalidates(PLATFORM_STATS)
     def add_user(self, username, password_hash, role, full_name=None, email=None, phone=None):
         """Add a new user to the database."""
         try:
-            self.cursor.execute(
+            user_id, _ = self._write(
                 "INSERT INTO users (username, password_hash, role, full_name, email, phone) VALUES (?, ?, ?, ?, ?, ?)",
-                (username, password_hash, role, full_name, email, phone)
+                (username, password_hash, role, full_name, email, phone),
+                name="add_user"
             )
-            self.conn.commit()
-            return self.cursor.lastrowid
+            return user_id
         except sqlite3.IntegrityError:
             return None
     
     def get_user(self, username):
         """Get user information by username."""
-        self.cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-        user = self.cursor.fetchone()
-        if user:
-            return {
-                "id": user[0],
-                "username": user[1],
-                "password_hash": user[2],
-                "role": user[3],
-                "full_name": user[4],
-                "email": user[5],
-                "phone": user[6],
-                "validated": user[7],
-                "created_at": user[8]
-            }
-        return None
+        return self._fetchone(User, f"SELECT {USER_SELECT} FROM users u WHERE u.username = ?", (username,), name="get_user")
     
     def get_user_by_id(self, user_id):
         """Get user information by ID."""
-        self.cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        user = self.cursor.fetchone()
-        if user:
-            return {
-                "id": user[0],
-                "username": user[1],
-                "password_hash": user[2],
-                "role": user[3],
-                "full_name": user[4],
-                "email": user[5],
-                "phone": user[6],
-                "validated": user[7],
-                "created_at": user[8]
-            }
-        return None
+        return self._fetchone(User, f"SELECT {USER_SELECT} FROM users u WHERE u.id = ?", (user_id,), name="get_user_by_id")
     
     def get_all_users(self, role=None, validated=None):
         """Get all users, optionally filtered by role and validation status."""
-        query = "SELECT * FROM users"
+        query = f"SELECT {USER_SELECT} FROM users u"
         params = []
         
         if role is not None or validated is not None:
             query += " WHERE"
             
             if role is not None:
-                query += " role = ?"
+                query += " u.role = ?"
                 params.append(role)
                 
                 if validated is not None:
-                    query += " AND validated = ?"
+                    query += " AND u.validated = ?"
                     params.append(validated)
             elif validated is not None:
-                query += " validated = ?"
+                query += " u.validated = ?"
                 params.append(validated)
         
-        query += " ORDER BY created_at DESC"
-        
-        self.cursor.execute(query, params)
-        
-        users = []
-        for user in self.cursor.fetchall():
-            users.append({
-                "id": user[0],
-                "username": user[1],
-                "password_hash": user[2],
-                "role": user[3],
-                "full_name": user[4],
-                "email": user[5],
-                "phone": user[6],
-                "validated": user[7],
-                "created_at": user[8]
-            })
-        return users
+        query += " ORDER BY u.created_at DESC"
+        
+        return self._fetchall(User, query, params, name="get_all_users")
     
+    @invalidates(PLATFORM_STATS)
     def update_user(self, user_id, **kwargs):
         """Update user details."""
         valid_fields = ["username", "password_hash", "full_name", "email", "phone", "validated"]
@@ -255,72 +459,63 @@ class Database:
         params.append(user_id)
         
         query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
-        self.cursor.execute(query, params)
-        self.conn.commit()
+        _, rowcount = self._write(query, params, name="update_user")
         
-        return self.cursor.rowcount > 0
+        return rowcount > 0
     
+    @invalidates(PLATFORM_STATS)
     def validate_user(self, user_id, validate=True):
         """Set a user's validation status."""
-        self.cursor.execute(
+        _, rowcount = self._write(
             "UPDATE users SET validated = ? WHERE id = ?",
-            (1 if validate else 0, user_id)
+            (1 if validate else 0, user_id),
+            name="validate_user"
         )
-        self.conn.commit()
-        return self.cursor.rowcount > 0
+        return rowcount > 0
     
+    @invalidates(PLATFORM_STATS)
     def delete_user(self, user_id):
         """Delete a user."""
-        # Delete all user assignments first
-        self.cursor.execute("DELETE FROM user_levels WHERE user_id = ?", (user_id,))
-        self.cursor.execute("DELETE FROM user_subjects WHERE user_id = ?", (user_id,))
-        self.cursor.execute("DELETE FROM user_courses WHERE user_id = ?", (user_id,))
-        
-        # Then delete the user
-        self.cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
-        self.conn.commit()
+        def write(cursor):
+            # Delete all user assignments first
+            cursor.execute("DELETE FROM user_levels WHERE user_id = ?", (user_id,))
+            cursor.execute("DELETE FROM user_subjects WHERE user_id = ?", (user_id,))
+            cursor.execute("DELETE FROM user_courses WHERE user_id = ?", (user_id,))
+            
+            # Then delete the user
+            cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
+            return cursor.rowcount > 0
         
-        return self.cursor.rowcount > 0
+        deleted = self._run_write(write, name="delete_user")
+        self.writer.on_commit(lambda: self.entitlements.forget(user_id))
+        return deleted
     
     # Level Management
+    @invalidates(PLATFORM_STATS)
     def add_level(self, name, description=None):
         """Add a new level."""
         try:
-            self.cursor.execute(
+            level_id, _ = self._write(
                 "INSERT INTO levels (name, description) VALUES (?, ?)",
-                (name, description)
+                (name, description),
+                name="add_level"
             )
-            self.conn.commit()
-            return self.cursor.lastrowid
+            return level_id
         except sqlite3.IntegrityError:
             return None
     
     def get_level(self, level_id):
         """Get level by ID."""
-        self.cursor.execute("SELECT * FROM levels WHERE id = ?", (level_id,))
-        level = self.cursor.fetchone()
-        if level:
-            return {
-                "id": level[0],
-                "name": level[1],
-                "description": level[2],
-                "created_at": level[3]
-            }
-        return None
+        return self._fetchone(Level, f"SELECT {LEVEL_SELECT} FROM levels l WHERE l.id = ?", (level_id,), name="get_level")
     
     def get_all_levels(self):
-        """Get all levels."""
-        self.cursor.execute("SELECT * FROM levels ORDER BY name")
-        
-        levels = []
-        for level in self.cursor.fetchall():
-            levels.append({
-                "id": level[0],
-                "name": level[1],
-                "description": level[2],
-                "created_at": level[3]
-            })
-        return levels
+        """Get all levels (cached until the levels table changes)."""
+        levels = self.cache.get(
+            ALL_LEVELS,
+            lambda: self._fetchall(Level, f"SELECT {LEVEL_SELECT} FROM levels l ORDER BY l.name", name="get_all_levels"),
+            generation=self._generations("levels", name="get_all_levels")
+        )
+        return list(levels)
     
     def update_level(self, level_id, name=None, description=None):
         """Update level details."""
@@ -343,86 +538,64 @@ class Database:
         query = f"UPDATE levels SET {', '.join(updates)} WHERE id = ?"
         
         try:
-            self.cursor.execute(query, params)
-            self.conn.commit()
-            return self.cursor.rowcount > 0
+            _, rowcount = self._write(query, params, name="update_level")
+            return rowcount > 0
         except sqlite3.IntegrityError:
             return False
     
+    @invalidates(PLATFORM_STATS)
     def delete_level(self, level_id):
         """Delete a level."""
-        # Check if level is in use
-        self.cursor.execute("SELECT COUNT(*) FROM subjects WHERE level_id = ?", (level_id,))
-        if self.cursor.fetchone()[0] > 0:
-            return False
-        
-        self.cursor.execute("DELETE FROM levels WHERE id = ?", (level_id,))
-        self.conn.commit()
+        def write(cursor):
+            # Check if level is in use
+            cursor.execute("SELECT COUNT(*) FROM subjects WHERE level_id = ?", (level_id,))
+            if cursor.fetchone()[0] > 0:
+                return False
+            
+            cursor.execute("DELETE FROM levels WHERE id = ?", (level_id,))
+            return cursor.rowcount > 0
         
-        return self.cursor.rowcount > 0
+        return self._run_write(write, name="delete_level")
     
     # Subject Management
+    @invalidates(PLATFORM_STATS)
     def add_subject(self, name, level_id, description=None):
         """Add a new subject."""
         try:
-            self.cursor.execute(
+            subject_id, _ = self._write(
                 "INSERT INTO subjects (name, level_id, description) VALUES (?, ?, ?)",
-                (name, level_id, description)
+                (name, level_id, description),
+                name="add_subject"
             )
-            self.conn.commit()
-            return self.cursor.lastrowid
+            return subject_id
         except sqlite3.IntegrityError:
             return None
     
     def get_subject(self, subject_id):
         """Get subject by ID."""
-        self.cursor.execute("""
-        SELECT s.*, l.name as level_name 
+        return self._fetchone(Subject, f"""
+        SELECT {SUBJECT_SELECT}
         FROM subjects s
         JOIN levels l ON s.level_id = l.id
         WHERE s.id = ?
-        """, (subject_id,))
-        
-        subject = self.cursor.fetchone()
-        if subject:
-            return {
-                "id": subject[0],
-                "name": subject[1],
-                "description": subject[2],
-                "level_id": subject[3],
-                "created_at": subject[4],
-                "level_name": subject[5]
-            }
-        return None
+        """, (subject_id,), name="get_subject")
     
     def get_all_subjects(self, level_id=None):
-        """Get all subjects, optionally filtered by level."""
-        query = """
-        SELECT s.*, l.name as level_name 
-        FROM subjects s
-        JOIN levels l ON s.level_id = l.id
-        """
+        """Get all subjects, optionally filtered by level (cached until levels or subjects change)."""
+        subjects = self.cache.get(
+            ALL_SUBJECTS,
+            lambda: self._fetchall(Subject, f"""
+            SELECT {SUBJECT_SELECT}
+            FROM subjects s
+            JOIN levels l ON s.level_id = l.id
+            ORDER BY s.name
+            """, name="get_all_subjects"),
+            generation=self._generations("levels", "subjects", name="get_all_subjects")
+        )
         
-        params = []
         if level_id:
-            query += " WHERE s.level_id = ?"
-            params.append(level_id)
-        
-        query += " ORDER BY s.name"
-        
-        self.cursor.execute(query, params)
-        
-        subjects = []
-        for subject in self.cursor.fetchall():
-            subjects.append({
-                "id": subject[0],
-                "name": subject[1],
-                "description": subject[2],
-                "level_id": subject[3],
-                "created_at": subject[4],
-                "level_name": subject[5]
-            })
-        return subjects
+            return [subject for subject in subjects if subject.level_id == level_id]
+        return list(subjects)
     
     def update_subject(self, subject_id, name=None, level_id=None, description=None):
         """Update subject details."""
@@ -449,25 +622,27 @@ class Database:
         query = f"UPDATE subjects SET {', '.join(updates)} WHERE id = ?"
         
         try:
-            self.cursor.execute(query, params)
-            self.conn.commit()
-            return self.cursor.rowcount > 0
+            _, rowcount = self._write(query, params, name="update_subject")
+            return rowcount > 0
         except sqlite3.IntegrityError:
             return False
     
+    @invalidates(PLATFORM_STATS)
     def delete_subject(self, subject_id):
         """Delete a subject."""
-        # Check if subject is in use
-        self.cursor.execute("SELECT COUNT(*) FROM courses WHERE subject_id = ?", (subject_id,))
-        if self.cursor.fetchone()[0] > 0:
-            return False
-        
-        self.cursor.execute("DELETE FROM subjects WHERE id = ?", (subject_id,))
-        self.conn.commit()
+        def write(cursor):
+            # Check if subject is in use
+            cursor.execute("SELECT COUNT(*) FROM courses WHERE subject_id = ?", (subject_id,))
+            if cursor.fetchone()[0] > 0:
+                return False
+            
+            cursor.execute("DELETE FROM subjects WHERE id = ?", (subject_id,))
+            return cursor.rowcount > 0
         
-        return self.cursor.rowcount > 0
+        return self._run_write(write, name="delete_subject")
     
     # Course Management
+    @invalidates(PLATFORM_STATS)
     def add_course(self, title, content_type, subject_id, level_id, difficulty, 
                   description=None, content_path=None, youtube_url=None, 
                   image_path=None, created_by=None):
@@ -475,7 +650,7 @@ class Database:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         try:
-            self.cursor.execute('''
+            course_id, _ = self._write('''
             INSERT INTO courses (
                 title, description, content_type, content_path, youtube_url,
                 subject_id, level_id, difficulty, image_path, created_by, updated_at
@@ -483,48 +658,25 @@ class Database:
             ''', (
                 title, description, content_type, content_path, youtube_url,
                 subject_id, level_id, difficulty, image_path, created_by, current_time
-            ))
-            
-            self.conn.commit()
-            return self.cursor.lastrowid
+            ), name="add_course")
+            return course_id
         except sqlite3.IntegrityError:
             return None
     
     def get_course(self, course_id):
         """Get course by ID."""
-        self.cursor.execute("""
-        SELECT c.*, s.name as subject_name, l.name as level_name 
+        return self._fetchone(Course, f"""
+        SELECT {COURSE_SELECT}
         FROM courses c
         JOIN subjects s ON c.subject_id = s.id
         JOIN levels l ON c.level_id = l.id
         WHERE c.id = ?
-        """, (course_id,))
-        
-        course = self.cursor.fetchone()
-        if course:
-            return {
-                "id": course[0],
-                "title": course[1],
-                "description": course[2],
-                "content_type": course[3],
-                "content_path": course[4],
-                "youtube_url": course[5],
-                "subject_id": course[6],
-                "level_id": course[7],
-                "difficulty": course[8],
-                "image_path": course[9],
-                "created_by": course[10],
-                "created_at": course[11],
-                "updated_at": course[12],
-                "subject_name": course[13],
-                "level_name": course[14]
-            }
-        return None
+        """, (course_id,), name="get_course")
     
     def get_all_courses(self, subject_id=None, level_id=None, difficulty=None):
         """Get all courses, optionally filtered by subject, level, and difficulty."""
-        query = """
-        SELECT c.*, s.name as subject_name, l.name as level_name 
+        query = f"""
+        SELECT {COURSE_SELECT}
         FROM courses c
         JOIN subjects s ON c.subject_id = s.id
         JOIN levels l ON c.level_id = l.id
@@ -550,29 +702,9 @@ class Database:
         
         query += " ORDER BY c.created_at DESC"
         
-        self.cursor.execute(query, params)
-        
-        courses = []
-        for course in self.cursor.fetchall():
-            courses.append({
-                "id": course[0],
-                "title": course[1],
-                "description": course[2],
-                "content_type": course[3],
-                "content_path": course[4],
-                "youtube_url": course[5],
-                "subject_id": course[6],
-                "level_id": course[7],
-                "difficulty": course[8],
-                "image_path": course[9],
-                "created_by": course[10],
-                "created_at": course[11],
-                "updated_at": course[12],
-                "subject_name": course[13],
-                "level_name": course[14]
-            })
-        return courses
+        return self._fetchall(Course, query, params, name="get_all_courses")
     
+    @invalidates(PLATFORM_STATS)
     def update_course(self, course_id, **kwargs):
         """Update course details."""
         valid_fields = [
@@ -598,136 +730,210 @@ class Database:
         params.append(course_id)
         
         query = f"UPDATE courses SET {', '.join(updates)} WHERE id = ?"
+        _, rowcount = self._write(query, params, name="update_course")
         
-        self.cursor.execute(query, params)
-        self.conn.commit()
-        
-        return self.cursor.rowcount > 0
+        return rowcount > 0
     
+    @invalidates(PLATFORM_STATS)
     def delete_course(self, course_id):
         """Delete a course."""
-        # Get course file paths before deletion
-        self.cursor.execute("SELECT content_path, image_path FROM courses WHERE id = ?", (course_id,))
-        paths = self.cursor.fetchone()
-        
-        # Delete course assignments
-        self.cursor.execute("DELETE FROM user_courses WHERE course_id = ?", (course_id,))
-        
-        # Delete the course
-        self.cursor.execute("DELETE FROM courses WHERE id = ?", (course_id,))
-        self.conn.commit()
+        def write(cursor):
+            # Get course file paths before deletion
+            cursor.execute("SELECT content_path, image_path FROM courses WHERE id = ?", (course_id,))
+            paths = cursor.fetchone()
+            
+            # Delete course assignments
+            cursor.execute("DELETE FROM user_courses WHERE course_id = ?", (course_id,))
+            
+            # Delete the course
+            cursor.execute("DELETE FROM courses WHERE id = ?", (course_id,))
+            return paths
         
+        paths = self._run_write(write, name="delete_course")
+        # Every user may have had the course
+        self.writer.on_commit(self.entitlements.forget)
         return paths if paths else (None, None)
     
     # Assignment Management
     def assign_level_to_user(self, user_id, level_id):
         """Assign a level to a user."""
         try:
-            self.cursor.execute(
+            self._write(
                 "INSERT INTO user_levels (user_id, level_id) VALUES (?, ?)",
-                (user_id, level_id)
+                (user_id, level_id),
+                name="assign_level_to_user"
             )
-            self.conn.commit()
-            return True
         except sqlite3.IntegrityError:
             return False
+        self.writer.on_commit(lambda: self.entitlements.grant(user_id, levels=(level_id,)))
+        return True
     
     def assign_subject_to_user(self, user_id, subject_id):
         """Assign a subject to a user."""
         try:
-            self.cursor.execute(
+            self._write(
                 "INSERT INTO user_subjects (user_id, subject_id) VALUES (?, ?)",
-                (user_id, subject_id)
+                (user_id, subject_id),
+                name="assign_subject_to_user"
             )
-            self.conn.commit()
-            return True
         except sqlite3.IntegrityError:
             return False
+        self.writer.on_commit(lambda: self.entitlements.grant(user_id, subjects=(subject_id,)))
+        return True
     
     def assign_course_to_user(self, user_id, course_id):
         """Assign a course to a user."""
         try:
-            self.cursor.execute(
+            self._write(
                 "INSERT INTO user_courses (user_id, course_id) VALUES (?, ?)",
-                (user_id, course_id)
+                (user_id, course_id),
+                name="assign_course_to_user"
             )
-            self.conn.commit()
-            return True
         except sqlite3.IntegrityError:
             return False
+        self.writer.on_commit(lambda: self.entitlements.grant(user_id, courses=(course_id,)))
+        return True
     
     def unassign_level_from_user(self, user_id, level_id):
         """Remove level assignment from a user."""
-        self.cursor.execute(
+        _, rowcount = self._write(
             "DELETE FROM user_levels WHERE user_id = ? AND level_id = ?",
-            (user_id, level_id)
+            (user_id, level_id),
+            name="unassign_level_from_user"
         )
-        self.conn.commit()
-        return self.cursor.rowcount > 0
+        if rowcount > 0:
+            self.writer.on_commit(lambda: self.entitlements.revoke(user_id, levels=(level_id,)))
+        return rowcount > 0
     
     def unassign_subject_from_user(self, user_id, subject_id):
         """Remove subject assignment from a user."""
-        self.cursor.execute(
+        _, rowcount = self._write(
             "DELETE FROM user_subjects WHERE user_id = ? AND subject_id = ?",
-            (user_id, subject_id)
+            (user_id, subject_id),
+            name="unassign_subject_from_user"
         )
-        self.conn.commit()
-        return self.cursor.rowcount > 0
+        if rowcount > 0:
+            self.writer.on_commit(lambda: self.entitlements.revoke(user_id, subjects=(subject_id,)))
+        return rowcount > 0
     
     def unassign_course_from_user(self, user_id, course_id):
         """Remove course assignment from a user."""
-        self.cursor.execute(
+        _, rowcount = self._write(
             "DELETE FROM user_courses WHERE user_id = ? AND course_id = ?",
-            (user_id, course_id)
+            (user_id, course_id),
+            name="unassign_course_from_user"
+        )
+        if rowcount > 0:
+            self.writer.on_commit(lambda: self.entitlements.revoke(user_id, courses=(course_id,)))
+        return rowcount > 0
+    
+    # Bulk assignment
+    def assign_courses_to_user(self, user_id, course_ids):
+        """Assign several courses to a user in one transaction; returns the number of new assignments."""
+        course_ids = list(dict.fromkeys(course_ids))
+        assigned = self._write_many(
+            "INSERT OR IGNORE INTO user_courses (user_id, course_id) VALUES (?, ?)",
+            ((user_id, course_id) for course_id in course_ids),
+            name="assign_courses_to_user"
+        )
+        self.writer.on_commit(lambda: self.entitlements.grant(user_id, courses=course_ids))
+        return assigned
+    
+    def assign_course_to_users(self, course_id, user_ids):
+        """Assign a course to several users in one transaction; returns the number of new assignments."""
+        user_ids = list(dict.fromkeys(user_ids))
+        assigned = self._write_many(
+            "INSERT OR IGNORE INTO user_courses (user_id, course_id) VALUES (?, ?)",
+            ((user_id, course_id) for user_id in user_ids),
+            name="assign_course_to_users"
+        )
+        
+        def grant():
+            for user_id in user_ids:
+                self.entitlements.grant(user_id, courses=(course_id,))
+        
+        self.writer.on_commit(grant)
+        return assigned
+    
+    def assign_subjects_to_user(self, user_id, subject_ids):
+        """Assign several subjects to a user in one transaction; returns the number of new assignments."""
+        subject_ids = list(dict.fromkeys(subject_ids))
+        assigned = self._write_many(
+            "INSERT OR IGNORE INTO user_subjects (user_id, subject_id) VALUES (?, ?)",
+            ((user_id, subject_id) for subject_id in subject_ids),
+            name="assign_subjects_to_user"
         )
-        self.conn.commit()
-        return self.cursor.rowcount > 0
+        self.writer.on_commit(lambda: self.entitlements.grant(user_id, subjects=subject_ids))
+        return assigned
+    
+    @invalidates(PLATFORM_STATS)
+    def validate_and_assign(self, user_id, level_id, subject_ids, course_ids):
+        """
+        Validate a student and assign their level, subjects and courses atomically.
+        Existing assignments are kept; returns True if the user exists and was validated.
+        """
+        subject_rows = [(user_id, subject_id) for subject_id in dict.fromkeys(subject_ids)]
+        course_rows = [(user_id, course_id) for course_id in dict.fromkeys(course_ids)]
+        
+        def write(cursor):
+            cursor.execute(
+                "INSERT OR IGNORE INTO user_levels (user_id, level_id) VALUES (?, ?)",
+                (user_id, level_id)
+            )
+            cursor.executemany(
+                "INSERT OR IGNORE INTO user_subjects (user_id, subject_id) VALUES (?, ?)",
+                subject_rows
+            )
+            cursor.executemany(
+                "INSERT OR IGNORE INTO user_courses (user_id, course_id) VALUES (?, ?)",
+                course_rows
+            )
+            cursor.execute("UPDATE users SET validated = 1 WHERE id = ?", (user_id,))
+            if cursor.rowcount == 0:
+                # Unknown user: undo the assignments made above
+                raise LookupError(f"User {user_id} does not exist")
+            return True
+        
+        try:
+            self._run_write(write, name="validate_and_assign")
+        except LookupError:
+            return False
+        
+        self.writer.on_commit(lambda: self.entitlements.grant(
+            user_id,
+            courses=[course_id for _, course_id in course_rows],
+            subjects=[subject_id for _, subject_id in subject_rows],
+            levels=(level_id,)
+        ))
+        return True
     
     def get_user_levels(self, user_id):
         """Get levels assigned to a user."""
-        self.cursor.execute("""
-        SELECT l.* FROM levels l
+        return self._fetchall(Level, f"""
+        SELECT {LEVEL_SELECT} FROM levels l
         JOIN user_levels ul ON l.id = ul.level_id
         WHERE ul.user_id = ?
         ORDER BY l.name
-        """, (user_id,))
-        
-        levels = []
-        for level in self.cursor.fetchall():
-            levels.append({
-                "id": level[0],
-                "name": level[1],
-                "description": level[2],
-                "created_at": level[3]
-            })
-        return levels
+        """, (user_id,), name="get_user_levels")
     
     def get_user_subjects(self, user_id):
         """Get subjects assigned to a user."""
-        self.cursor.execute("""
-        SELECT s.*, l.name as level_name FROM subjects s
+        return self._fetchall(Subject, f"""
+        SELECT {SUBJECT_SELECT} FROM subjects s
         JOIN user_subjects us ON s.id = us.subject_id
         JOIN levels l ON s.level_id = l.id
         WHERE us.user_id = ?
         ORDER BY s.name
-        """, (user_id,))
-        
-        subjects = []
-        for subject in self.cursor.fetchall():
-            subjects.append({
-                "id": subject[0],
-                "name": subject[1],
-                "description": subject[2],
-                "level_id": subject[3],
-                "created_at": subject[4],
-                "level_name": subject[5]
-            })
-        return subjects
+        """, (user_id,), name="get_user_subjects")
     
     def get_user_courses(self, user_id, subject_id=None, difficulty=None):
         """Get courses assigned to a user, optionally filtered by subject and difficulty."""
-        query = """
-        SELECT c.*, s.name as subject_name, l.name as level_name FROM courses c
+        # Users without courses (e.g. students awaiting validation) need no query
+        if not self.entitlements.get(user_id).courses:
+            return []
+        
+        query = f"""
+        SELECT {COURSE_SELECT} FROM courses c
         JOIN user_courses uc ON c.id = uc.course_id
         JOIN subjects s ON c.subject_id = s.id
         JOIN levels l ON c.level_id = l.id
@@ -746,167 +952,605 @@ class Database:
         
         query += " ORDER BY c.created_at DESC"
         
-        self.cursor.execute(query, params)
-        
-        courses = []
-        for course in self.cursor.fetchall():
-            courses.append({
-                "id": course[0],
-                "title": course[1],
-                "description": course[2],
-                "content_type": course[3],
-                "content_path": course[4],
-                "youtube_url": course[5],
-                "subject_id": course[6],
-                "level_id": course[7],
-                "difficulty": course[8],
-                "image_path": course[9],
-                "created_by": course[10],
-                "created_at": course[11],
-                "updated_at": course[12],
-                "subject_name": course[13],
-                "level_name": course[14]
-            })
-        return courses
+        return self._fetchall(Course, query, params, name="get_user_courses")
+    
+    def can_access_course(self, user_id, course_id):
+        """Check whether a course is assigned to a user (an in-memory lookup once the user's entitlements are loaded)."""
+        return self.entitlements.can_view_course(user_id, course_id)
     
     def get_users_assigned_to_level(self, level_id):
         """Get users assigned to a specific level."""
-        self.cursor.execute("""
-        SELECT u.* FROM users u
+        return self._fetchall(User, f"""
+        SELECT {USER_SELECT} FROM users u
         JOIN user_levels ul ON u.id = ul.user_id
         WHERE ul.level_id = ? AND u.role = 'student'
         ORDER BY u.username
-        """, (level_id,))
-        
-        users = []
-        for user in self.cursor.fetchall():
-            users.append({
-                "id": user[0],
-                "username": user[1],
-                "password_hash": user[2],
-                "role": user[3],
-                "full_name": user[4],
-                "email": user[5],
-                "phone": user[6],
-                "validated": user[7],
-                "created_at": user[8]
-            })
-        return users
+        """, (level_id,), name="get_users_assigned_to_level")
     
     def get_users_assigned_to_subject(self, subject_id):
         """Get users assigned to a specific subject."""
-        self.cursor.execute("""
-        SELECT u.* FROM users u
+        return self._fetchall(User, f"""
+        SELECT {USER_SELECT} FROM users u
         JOIN user_subjects us ON u.id = us.user_id
         WHERE us.subject_id = ? AND u.role = 'student'
         ORDER BY u.username
-        """, (subject_id,))
-        
-        users = []
-        for user in self.cursor.fetchall():
-            users.append({
-                "id": user[0],
-                "username": user[1],
-                "password_hash": user[2],
-                "role": user[3],
-                "full_name": user[4],
-                "email": user[5],
-                "phone": user[6],
-                "validated": user[7],
-                "created_at": user[8]
-            })
-        return users
+        """, (subject_id,), name="get_users_assigned_to_subject")
     
     def get_users_assigned_to_course(self, course_id):
         """Get users assigned to a specific course."""
-        self.cursor.execute("""
-        SELECT u.* FROM users u
+        return self._fetchall(User, f"""
+        SELECT {USER_SELECT} FROM users u
         JOIN user_courses uc ON u.id = uc.user_id
         WHERE uc.course_id = ? AND u.role = 'student'
         ORDER BY u.username
-        """, (course_id,))
-        
-        users = []
-        for user in self.cursor.fetchall():
-            users.append({
-                "id": user[0],
-                "username": user[1],
-                "password_hash": user[2],
-                "role": user[3],
-                "full_name": user[4],
-                "email": user[5],
-                "phone": user[6],
-                "validated": user[7],
-                "created_at": user[8]
-            })
-        return users
+        """, (course_id,), name="get_users_assigned_to_course")
     
     # Screenshot tracking
-    def log_screenshot(self, user_id, course_id):
-        """Log a screenshot for tracking."""
-        self.cursor.execute(
-            "INSERT INTO screenshot_logs (user_id, course_id) VALUES (?, ?)",
-            (user_id, course_id)
+    def log_screenshot(self, user_id, course_id, taken_ms=None, wait=True):
+        """
+        Log a screenshot for tracking, taken at taken_ms (epoch ms, default: now).
+        Returns the new log id, or when wait is False the Future of the queued write.
+        """
+        if taken_ms is None:
+            taken_ms = now_ms()
+        result = self._write(
+            "INSERT INTO screenshot_logs (user_id, course_id, timestamp, ts_ms) VALUES (?, ?, ?, ?)",
+            (user_id, course_id, ms_to_text(taken_ms), taken_ms), wait=wait,
+            name="log_screenshot"
         )
-        self.conn.commit()
-        return self.cursor.lastrowid
+        return result[0] if wait else result
     
     def get_recent_screenshots(self, user_id, course_id=None, minutes=15):
         """Get count of screenshots within the last X minutes."""
-        time_limit = (datetime.now() - timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S")
-        
-        if course_id:
-            self.cursor.execute("""
-            SELECT COUNT(*) FROM screenshot_logs
-            WHERE user_id = ? AND course_id = ? AND timestamp > ?
-            """, (user_id, course_id, time_limit))
-        else:
-            self.cursor.execute("""
-            SELECT COUNT(*) FROM screenshot_logs
-            WHERE user_id = ? AND timestamp > ?
-            """, (user_id, time_limit))
-        
-        return self.cursor.fetchone()[0]
+        with self._cursor(name="get_recent_screenshots") as cursor:
+            time_limit = ms_ago(timedelta(minutes=minutes))
+        
+            if course_id:
+                cursor.execute("""
+                SELECT COUNT(*) FROM screenshot_logs
+                WHERE user_id = ? AND course_id = ? AND ts_ms > ?
+                """, (user_id, course_id, time_limit))
+            else:
+                cursor.execute("""
+                SELECT COUNT(*) FROM screenshot_logs
+                WHERE user_id = ? AND ts_ms > ?
+                """, (user_id, time_limit))
+        
+            return cursor.fetchone()[0]
     
     # Activity logging
     def log_activity(self, user_id, action, details=None):
-        """Log user activity."""
-        self.cursor.execute(
-            "INSERT INTO activity_logs (user_id, action, details) VALUES (?, ?, ?)",
-            (user_id, action, details)
-        )
-        self.conn.commit()
+        """Log user activity (buffered: bulk-inserted by the activity logger within a fraction of a second)."""
+        return self.activity_logger.log(user_id, action, details)
     
     def get_activity_logs(self, limit=50, user_id=None):
         """Get recent activity logs, optionally filtered by user."""
         if user_id:
-            self.cursor.execute("""
-            SELECT al.*, u.username FROM activity_logs al
+            return self._fetchall(ActivityLog, f"""
+            SELECT {ACTIVITY_LOG_SELECT} FROM activity_logs al
             JOIN users u ON al.user_id = u.id
             WHERE al.user_id = ?
-            ORDER BY al.timestamp DESC
+            ORDER BY al.ts_ms DESC
             LIMIT ?
-            """, (user_id, limit))
+            """, (user_id, limit), name="get_activity_logs")
+        
+        return self._fetchall(ActivityLog, f"""
+        SELECT {ACTIVITY_LOG_SELECT} FROM activity_logs al
+        JOIN users u ON al.user_id = u.id
+        ORDER BY al.ts_ms DESC
+        LIMIT ?
+        """, (limit,), name="get_activity_logs")
+    
+    # Full-text search
+    def search_courses(self, query, page_size=20, token=None, user_id=None, subject_id=None, level_id=None, difficulty=None):
+        """
+        Search course titles, descriptions and PDF text, best matches first.
+        
+        Args:
+            query: Free text; every word is matched as a prefix
+            page_size: Number of results per page
+            token: Continuation token from the previous page
+            user_id: Only search the courses assigned to this student
+            subject_id, level_id, difficulty: Optional filters as in get_all_courses
+        
+        Returns a Page of SearchResult records. The first page ranks the best
+        SEARCH_RESULT_LIMIT matches and the token carries the ids of the rest in that
+        order: bm25 scores move as courses are added or edited, so ranking again on
+        every page could repeat or skip results.
+        """
+        match = search_match_query(query)
+        if not match:
+            return Page([], None)
+        
+        where_clauses = ["courses_fts MATCH ?"]
+        params = [match]
+        
+        if user_id:
+            where_clauses.append("c.id IN (SELECT uc.course_id FROM user_courses uc WHERE uc.user_id = ?)")
+            params.append(user_id)
+        
+        if subject_id:
+            where_clauses.append("c.subject_id = ?")
+            params.append(subject_id)
+        
+        if level_id:
+            where_clauses.append("c.level_id = ?")
+            params.append(level_id)
+        
+        if difficulty:
+            where_clauses.append("c.difficulty = ?")
+            params.append(difficulty)
+        
+        matches = f"""
+        FROM courses_fts
+        JOIN courses c ON c.id = courses_fts.rowid
+        JOIN subjects s ON c.subject_id = s.id
+        JOIN levels l ON c.level_id = l.id
+        WHERE {" AND ".join(where_clauses)}
+        """
+        
+        if token:
+            ranked = decode_page_token(token)
         else:
-            self.cursor.execute("""
-            SELECT al.*, u.username FROM activity_logs al
-            JOIN users u ON al.user_id = u.id
-            ORDER BY al.timestamp DESC
+            with self._cursor(name="search_courses") as cursor:
+                cursor.execute(
+                    f"SELECT c.id {matches} ORDER BY courses_fts.rank, c.id LIMIT ?",
+                    params + [SEARCH_RESULT_LIMIT]
+                )
+                ranked = [row[0] for row in cursor.fetchall()]
+        
+        page_ids, rest = ranked[:page_size], ranked[page_size:]
+        next_token = encode_page_token(rest) if rest else None
+        if not page_ids:
+            return Page([], next_token)
+        
+        # Rows of this page, filtered again: courses deleted or unassigned since the first page drop out
+        items = self._fetchall(SearchResult, f"""
+        SELECT {COURSE_SELECT}, courses_fts.rank, snippet(courses_fts, -1, '**', '**', '…', 16)
+        {matches} AND c.id IN ({", ".join("?" for _ in page_ids)})
+        """, params + page_ids, name="search_courses")
+        position = {course_id: i for i, course_id in enumerate(page_ids)}
+        items.sort(key=lambda item: position[item.id])
+        return Page(items, next_token)
+    
+    def set_course_search_text(self, course_id, text):
+        """
+        Store the text extracted from a course's document in the search index.
+        A document without text is stored as NULL: nothing to search, and not
+        picked up again by get_unindexed_documents (which looks for '').
+        """
+        _, rowcount = self._write("UPDATE courses_fts SET body = ? WHERE rowid = ?", (text or None, course_id), name="set_course_search_text")
+        return rowcount > 0
+    
+    def get_unindexed_documents(self, after_id=0, limit=50):
+        """
+        PDF courses whose document was never indexed (body still ''), by id, after after_id.
+        Covers PDFs uploaded before the index existed; returns UnindexedDocument records.
+        CROSS JOIN keeps courses as the outer loop, walked by id, with one index lookup per course.
+        """
+        return self._fetchall(UnindexedDocument, """
+        SELECT c.id, c.content_path
+        FROM courses c
+        CROSS JOIN courses_fts f ON f.rowid = c.id
+        WHERE c.id > ? AND c.content_type = 'PDF' AND c.content_path IS NOT NULL AND f.body = ''
+        ORDER BY c.id
+        LIMIT ?
+        """, (after_id, limit), name="get_unindexed_documents")
+    
+    # Activity retention and rollups
+    def archive_activity_logs(self, retention_days=ACTIVITY_RETENTION_DAYS, batch_size=5000, deadline=None):
+        """
+        Move activity events older than retention_days from activity_logs to activity_logs_archive.
+        Runs in batches, each its own write, so other writes are not held up; returns the number of events moved.
+        With a deadline (a time.monotonic() value) it stops between batches once it has passed;
+        the next call picks up the remaining events.
+        The daily rollups are untouched, so charts keep covering archived days.
+        """
+        cutoff = ms_ago(timedelta(days=retention_days))
+        batch = """
+        SELECT id FROM activity_logs WHERE ts_ms < ? ORDER BY ts_ms LIMIT ?
+        """
+        
+        def move_batch(cursor):
+            cursor.execute(f"""
+            INSERT OR REPLACE INTO activity_logs_archive (id, user_id, action, details, timestamp, ts_ms)
+            SELECT id, user_id, action, details, timestamp, ts_ms FROM activity_logs
+            WHERE id IN ({batch})
+            """, (cutoff, batch_size))
+            cursor.execute(f"DELETE FROM activity_logs WHERE id IN ({batch})", (cutoff, batch_size))
+            return cursor.rowcount
+        
+        moved = 0
+        while True:
+            count = self._run_write(move_batch, name="archive_activity_logs")
+            moved += count
+            if count < batch_size or (deadline is not None and monotonic() >= deadline):
+                return moved
+    
+    def _rollup_filters(self, since_day, user_id):
+        """Build the WHERE clause and parameters shared by the rollup queries."""
+        where_clauses = []
+        params = []
+        
+        if since_day:
+            where_clauses.append("r.day >= ?")
+            params.append(since_day)
+        
+        if user_id:
+            where_clauses.append("r.user_id = ?")
+            params.append(user_id)
+        
+        where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        return where, params
+    
+    def get_activity_totals(self, since_day=None, user_id=None):
+        """
+        Count activity events and distinct active users from the daily rollups.
+        
+        Args:
+            since_day: First day to include ('YYYY-MM-DD', UTC), or None for all time
+            user_id: Restrict to one user
+        """
+        if not since_day and not user_id:
+            # All time: the per-day totals and the trigger-maintained active user count
+            return self._fetchone(ActivityTotals, """
+            SELECT (SELECT COALESCE(SUM(t.count), 0) FROM activity_daily_totals t), a.count
+            FROM activity_active_users a WHERE a.id = 1
+            """, name="get_activity_totals")
+        
+        where, params = self._rollup_filters(since_day, user_id)
+        return self._fetchone(ActivityTotals, f"""
+        SELECT COALESCE(SUM(r.count), 0), COUNT(DISTINCT r.user_id)
+        FROM activity_daily_rollups r{where}
+        """, params, name="get_activity_totals")
+    
+    def get_activity_by_day(self, since_day=None, user_id=None):
+        """Get the number of activity events per day, oldest day first, from the daily rollups."""
+        if user_id:
+            where, params = self._rollup_filters(since_day, user_id)
+            return self._fetchall(DailyActivity, f"""
+            SELECT r.day, SUM(r.count)
+            FROM activity_daily_rollups r{where}
+            GROUP BY r.day
+            ORDER BY r.day
+            """, params, name="get_activity_by_day")
+        
+        # All users: one row per day in the totals table
+        if since_day:
+            return self._fetchall(DailyActivity, """
+            SELECT t.day, t.count FROM activity_daily_totals t WHERE t.day >= ? ORDER BY t.day
+            """, (since_day,), name="get_activity_by_day")
+        return self._fetchall(DailyActivity, "SELECT t.day, t.count FROM activity_daily_totals t ORDER BY t.day", name="get_activity_by_day")
+    
+    def get_activity_by_user(self, since_day=None, user_id=None, limit=20):
+        """Get the most active users with their number of activity events, from the daily rollups."""
+        if not since_day and not user_id:
+            # All time: walk the per-user totals by count, stopping after limit users
+            return self._fetchall(UserActivity, """
+            SELECT t.user_id, u.username, t.count
+            FROM activity_user_totals t
+            LEFT JOIN users u ON u.id = t.user_id
+            ORDER BY t.count DESC
             LIMIT ?
-            """, (limit,))
-        
-        logs = []
-        for log in self.cursor.fetchall():
-            logs.append({
-                "id": log[0],
-                "user_id": log[1],
-                "action": log[2],
-                "details": log[3],
-                "timestamp": log[4],
-                "username": log[5]
-            })
-        return logs
+            """, (limit,), name="get_activity_by_user")
+        
+        # Grouping on +r.user_id keeps the planner on the day range instead of walking every user in order
+        where, params = self._rollup_filters(since_day, user_id)
+        return self._fetchall(UserActivity, f"""
+        SELECT r.user_id, u.username, SUM(r.count) AS total
+        FROM activity_daily_rollups r
+        LEFT JOIN users u ON u.id = r.user_id{where}
+        GROUP BY +r.user_id
+        ORDER BY total DESC
+        LIMIT ?
+        """, params + [limit], name="get_activity_by_user")
+    
+    def count_recent_activities(self, hours=24, user_id=None):
+        """Count raw activity events from the last few hours."""
+        since = ms_ago(timedelta(hours=hours))
+        with self._cursor(name="count_recent_activities") as cursor:
+            if user_id:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM activity_logs WHERE user_id = ? AND ts_ms > ?",
+                    (user_id, since)
+                )
+            else:
+                cursor.execute("SELECT COUNT(*) FROM activity_logs WHERE ts_ms > ?", (since,))
+            return cursor.fetchone()[0]
+    
+    # Reference data
+    def get_taxonomy_tree(self):
+        """
+        Get every level with its subjects and each subject with its courses.
+        Levels and subjects are ordered by name, courses newest first; the tree is
+        cached until levels, subjects or courses change.
+        """
+        return self.cache.get(
+            TAXONOMY_TREE,
+            self._build_taxonomy_tree,
+            generation=self._generations("levels", "subjects", "courses", name="get_taxonomy_tree")
+        )
+    
+    def get_level_counts(self):
+        """Get {level_id: LevelCounts} with the subjects and assigned students of every level, in one query."""
+        counts = self._fetchall(LevelCounts, """
+        SELECT l.id, COALESCE(lc.subjects, 0), COALESCE(lc.students, 0)
+        FROM levels l
+        LEFT JOIN level_counts lc ON lc.level_id = l.id
+        """, name="get_level_counts")
+        return {row.level_id: row for row in counts}
+    
+    def get_subject_counts(self):
+        """Get {subject_id: SubjectCounts} with the courses and assigned students of every subject, in one query."""
+        counts = self._fetchall(SubjectCounts, """
+        SELECT s.id, COALESCE(sc.courses, 0), COALESCE(sc.students, 0)
+        FROM subjects s
+        LEFT JOIN subject_counts sc ON sc.subject_id = s.id
+        """, name="get_subject_counts")
+        return {row.subject_id: row for row in counts}
+    
+    def _build_taxonomy_tree(self):
+        """Load the reference tables in one pass and nest them."""
+        with self._cursor(name="get_taxonomy_tree") as cursor:
+            cursor.execute(f"SELECT {LEVEL_SELECT} FROM levels l ORDER BY l.name")
+            levels = cursor.fetchall()
+            cursor.execute(f"SELECT {select_list('s', SUBJECT_COLUMNS)} FROM subjects s ORDER BY s.name")
+            subjects = cursor.fetchall()
+            cursor.execute("""
+            SELECT c.id, c.title, c.content_type, c.difficulty, c.subject_id, c.level_id, c.created_at
+            FROM courses c
+            ORDER BY c.created_at DESC
+            """)
+            courses = cursor.fetchall()
+        
+        level_names = {level[0]: level[1] for level in levels}
+        subject_names = {subject[0]: subject[1] for subject in subjects}
+        
+        courses_by_subject = {}
+        for course_id, title, content_type, difficulty, subject_id, level_id, created_at in courses:
+            courses_by_subject.setdefault(subject_id, []).append(TaxonomyCourse(
+                course_id, title, content_type, difficulty,
+                subject_id, subject_names.get(subject_id), level_id, created_at
+            ))
+        
+        subjects_by_level = {}
+        for subject in subjects:
+            subject_id, level_id = subject[0], subject[3]
+            subjects_by_level.setdefault(level_id, []).append(TaxonomySubject(
+                *subject, level_names.get(level_id), tuple(courses_by_subject.get(subject_id, ()))
+            ))
+        
+        return tuple(
+            TaxonomyLevel(*level, tuple(subjects_by_level.get(level[0], ())))
+            for level in levels
+        )
+    
+    # Platform statistics
+    def get_platform_stats(self):
+        """
+        Get the counts shown on the admin overview.
+        Computed with one aggregate query and cached until a write changes users, levels, subjects or courses.
+        """
+        return self.cache.get(PLATFORM_STATS, self._compute_platform_stats)
+    
+    def _compute_platform_stats(self):
+        """Run the aggregate query behind get_platform_stats."""
+        with self._cursor(name="get_platform_stats") as cursor:
+            cursor.execute("""
+            SELECT 'users', role, validated, COUNT(*) FROM users GROUP BY role, validated
+            UNION ALL
+            SELECT 'courses', difficulty, content_type, COUNT(*) FROM courses GROUP BY difficulty, content_type
+            UNION ALL
+            SELECT 'levels', NULL, NULL, COUNT(*) FROM levels
+            UNION ALL
+            SELECT 'subjects', NULL, NULL, COUNT(*) FROM subjects
+            """)
+            rows = cursor.fetchall()
+        
+        students = validated = courses = levels = subjects = 0
+        by_difficulty = {}
+        by_type = {}
+        
+        for kind, first, second, count in rows:
+            if kind == "users":
+                if first == "student":
+                    students += count
+                    if second:
+                        validated += count
+            elif kind == "courses":
+                courses += count
+                by_difficulty[first] = by_difficulty.get(first, 0) + count
+                by_type[second] = by_type.get(second, 0) + count
+            elif kind == "levels":
+                levels = count
+            else:
+                subjects = count
+        
+        return PlatformStats(
+            students, validated, students - validated, courses,
+            levels, subjects, by_difficulty, by_type
+        )
+    
+    # Keyset pagination
+    def get_users_page(self, page_size=50, token=None, role=None, validated=None):
+        """Get one page of users, newest first, optionally filtered by role and validation status."""
+        where_clauses = []
+        params = []
+        
+        if role is not None:
+            where_clauses.append("u.role = ?")
+            params.append(role)
+        
+        if validated is not None:
+            where_clauses.append("u.validated = ?")
+            params.append(validated)
+        
+        return self._fetch_page(
+            User, f"SELECT {USER_SELECT} FROM users u", where_clauses, params,
+            (("u.created_at", "created_at"), ("u.id", "id")), page_size, token,
+            name="get_users_page"
+        )
+    
+    def get_courses_page(self, page_size=50, token=None, subject_id=None, level_id=None, difficulty=None):
+        """Get one page of courses, newest first, optionally filtered by subject, level, and difficulty."""
+        query = f"""
+        SELECT {COURSE_SELECT}
+        FROM courses c
+        JOIN subjects s ON c.subject_id = s.id
+        JOIN levels l ON c.level_id = l.id
+        """
+        
+        where_clauses = []
+        params = []
+        
+        if subject_id:
+            where_clauses.append("c.subject_id = ?")
+            params.append(subject_id)
+        
+        if level_id:
+            where_clauses.append("c.level_id = ?")
+            params.append(level_id)
+        
+        if difficulty:
+            where_clauses.append("c.difficulty = ?")
+            params.append(difficulty)
+        
+        return self._fetch_page(
+            Course, query, where_clauses, params,
+            (("c.created_at", "created_at"), ("c.id", "id")), page_size, token,
+            name="get_courses_page"
+        )
+    
+    def get_user_courses_page(self, user_id, page_size=50, token=None, subject_id=None, difficulty=None):
+        """Get one page of the courses assigned to a user, newest first."""
+        query = f"""
+        SELECT {COURSE_SELECT} FROM courses c
+        JOIN user_courses uc ON c.id = uc.course_id
+        JOIN subjects s ON c.subject_id = s.id
+        JOIN levels l ON c.level_id = l.id
+        """
+        
+        where_clauses = ["uc.user_id = ?"]
+        params = [user_id]
+        
+        if subject_id:
+            where_clauses.append("c.subject_id = ?")
+            params.append(subject_id)
+        
+        if difficulty:
+            where_clauses.append("c.difficulty = ?")
+            params.append(difficulty)
+        
+        return self._fetch_page(
+            Course, query, where_clauses, params,
+            (("c.created_at", "created_at"), ("c.id", "id")), page_size, token,
+            name="get_user_courses_page"
+        )
+    
+    def get_users_assigned_to_course_page(self, course_id, page_size=50, token=None):
+        """Get one page of the students assigned to a course, in signup (user id) order."""
+        return self._fetch_page(
+            User,
+            f"SELECT {USER_SELECT} FROM users u JOIN user_courses uc ON u.id = uc.user_id",
+            ["uc.course_id = ?", "u.role = 'student'"], [course_id],
+            (("uc.user_id", "id"),), page_size, token, descending=False,
+            name="get_users_assigned_to_course_page"
+        )
+    
+    def get_unassigned_students_page(self, course_id, page_size=50, token=None):
+        """Get one page of the validated students not assigned to a course, newest first."""
+        return self._fetch_page(
+            User, f"SELECT {USER_SELECT} FROM users u",
+            [
+                "u.role = 'student'", "u.validated = 1",
+                "NOT EXISTS (SELECT 1 FROM user_courses uc WHERE uc.user_id = u.id AND uc.course_id = ?)",
+            ],
+            [course_id],
+            (("u.created_at", "created_at"), ("u.id", "id")), page_size, token,
+            name="get_unassigned_students_page"
+        )
+    
+    def get_activity_logs_page(self, page_size=50, token=None, user_id=None):
+        """Get one page of activity logs, most recent first, optionally filtered by user."""
+        where_clauses = []
+        params = []
+        
+        if user_id:
+            where_clauses.append("al.user_id = ?")
+            params.append(user_id)
+        
+        return self._fetch_page(
+            ActivityLog,
+            f"SELECT {ACTIVITY_LOG_SELECT} FROM activity_logs al JOIN users u ON al.user_id = u.id",
+            where_clauses, params,
+            (("al.ts_ms", "ts_ms"), ("al.id", "id")), page_size, token,
+            name="get_activity_logs_page"
+        )
+    
+    # Streams over whole tables, for exports and analytics (see _iterate; rows.iter_frames makes DataFrames of them)
+    def iter_users(self, role=None, validated=None, batch_size=ITER_BATCH_SIZE):
+        """Stream every user in id order, optionally filtered by role and validation status."""
+        # Unary + keeps the filters off the indexes: a scan in id order streams right away,
+        # where an index lookup would have to sort every match before the first row
+        where_clauses = []
+        params = []
+        
+        if role is not None:
+            where_clauses.append("+u.role = ?")
+            params.append(role)
+        
+        if validated is not None:
+            where_clauses.append("+u.validated = ?")
+            params.append(validated)
+        
+        where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        return self._iterate(User, f"SELECT {USER_SELECT} FROM users u{where} ORDER BY u.id", params, batch_size, name="iter_users")
+    
+    def iter_courses(self, batch_size=ITER_BATCH_SIZE):
+        """Stream every course in id order, with its subject and level names."""
+        return self._iterate(Course, f"""
+        SELECT {COURSE_SELECT}
+        FROM courses c
+        JOIN subjects s ON c.subject_id = s.id
+        JOIN levels l ON c.level_id = l.id
+        ORDER BY c.id
+        """, (), batch_size, name="iter_courses")
+    
+    def iter_activity_logs(self, since=None, until=None, user_id=None, batch_size=ITER_BATCH_SIZE):
+        """
+        Stream activity events in time order, optionally within [since, until) and for one user.
+        since and until are epoch milliseconds (see timestamps.ms_ago); archived events are not included.
+        """
+        where_clauses = []
+        params = []
+        
+        if user_id:
+            where_clauses.append("al.user_id = ?")
+            params.append(user_id)
+        
+        if since is not None:
+            where_clauses.append("al.ts_ms >= ?")
+            params.append(since)
+        
+        if until is not None:
+            where_clauses.append("al.ts_ms < ?")
+            params.append(until)
+        
+        where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        # Events without a user are kept, with no username
+        return self._iterate(ActivityLog, f"""
+        SELECT {ACTIVITY_LOG_SELECT} FROM activity_logs al
+        LEFT JOIN users u ON al.user_id = u.id{where}
+        ORDER BY al.ts_ms, al.id
+        """, params, batch_size, name="iter_activity_logs")
+    
+    def iter_assignments(self, batch_size=ITER_BATCH_SIZE):
+        """Stream every course assignment, ordered by user then course."""
+        return self._iterate(Assignment, """
+        SELECT uc.user_id, uc.course_id, uc.assigned_at FROM user_courses uc
+        ORDER BY uc.user_id, uc.course_id
+        """, (), batch_size, name="iter_assignments")
     
     def close(self):
-        """Close database connection."""
-        self.conn.close()
\ No newline at end of file
+        """Release this handle; pooled connections stay open for other handles."""
+        pass
@@ -0,0 +1,472 @@
+"""
+Synthetic, reproducible datasets for load tests and benchmarks.
+
+Fills a database with levels, subjects, courses, students, assignments,
+activity and screenshot logs through bulk inserts, and can attach encrypted
+PDF fixtures to the PDF courses. Every choice comes from one seeded random
+generator, so the same arguments always produce the same data.
+
+Usage:
+    python dataset_generator.py load.db                      # the full-scale defaults below
+    python dataset_generator.py load.db --students 2000 --activity 100000 --pdf-fixtures 5
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from migrations import rebuild_reference_counts
+
+DEFAULT_DIFFICULTIES = {"easy": 0.4, "medium": 0.4, "hard": 0.2}
+DEFAULT_CONTENT_TYPES = {"PDF": 0.7, "YouTube": 0.3}
+DEFAULT_ACTIONS = {"Connexion": 0.55, "Déconnexion": 0.45}
+
+# Words the PDF fixtures (and so the search index) are written with
+VOCABULARY = [
+    "algèbre", "analyse", "matrice", "probabilité", "statistique", "physique", "chimie",
+    "biologie", "histoire", "géographie", "économie", "gestion", "comptabilité", "finance",
+    "marketing", "droit", "informatique", "réseau", "algorithme", "programmation",
+] + [f"terme{i}" for i in range(2000)]
+
+def zipf_weights(count, skew):
+    """Cumulative weights for picking among count items by rank, P(rank r) ~ 1 / r**skew (0 = uniform)."""
+    return list(itertools.accumulate(1.0 / (rank ** skew) for rank in range(1, count + 1)))
+
+def minimal_pdf(pages):
+    """
+    Build a valid PDF (1.4, Helvetica, no compression) with one page per text in pages.
+    Only ASCII-safe text is written; other characters are replaced.
+    """
+    def escape(text):
+        text = text.encode("latin-1", "replace").decode("latin-1")
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, once the page object numbers are known
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_numbers = []
+    for text in pages:
+        lines = [text[i:i + 90] for i in range(0, len(text), 90)][:50] or [""]
+        stream = "BT /F1 10 Tf 12 TL 50 800 Td " + " ".join(f"({escape(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        page_numbers.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{n} 0 R' for n in page_numbers)}] /Count {len(page_numbers)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+class DatasetGenerator:
+    """
+    Bulk loader of synthetic data into one database file.
+
+    Rows are inserted with executemany in transactions of batch_size rows on a
+    dedicated connection, with synchronous=OFF, and with the triggers and
+    indexes of the large tables suspended: indexes are rebuilt after each
+    table is loaded, and the level and subject counts and the activity rollups
+    are computed in one pass instead of row by row. Meant for
+    benchmark and load-test databases: do not run it while the app uses the
+    same file (the change log does not record the bulk rows).
+    """
+
+    def __init__(self, db_path, seed=1234, batch_size=50000, start="2024-01-01", days=365):
+        """
+        Args:
+            db_path: Path to the SQLite database file (created and migrated if needed)
+            seed: Seed of the random generator
+            batch_size: Rows inserted per transaction
+            start: First day (YYYY-MM-DD, UTC) of the generated timestamps
+            days: Number of days the timestamps are spread over
+        """
+        from database import Database
+
+        # Migrates the schema and seeds the admin account
+        db = Database(db_path)
+        db.change_feed.stop()
+
+        self.db_path = db_path
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.start_ms = int(datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+        self.days = days
+
+        self._conn = sqlite3.connect(db_path, isolation_level=None)
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("PRAGMA cache_size=-262144")
+
+        # Text of every day and second of day, so a timestamp is two lookups instead of a strftime
+        first_day = datetime.fromtimestamp(self.start_ms / 1000, timezone.utc)
+        self._day_text = [(first_day + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(days)]
+        self._second_text = [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)]
+
+        self.level_ids = []
+        self.subjects_by_level = {}
+        self.courses_by_subject = {}
+        self.course_ids = []
+        self.student_ids = []
+
+    def close(self):
+        self._conn.close()
+
+    # Helpers
+    def _timestamp(self):
+        """A random (text, epoch ms) moment within the generated period."""
+        offset = self.rng.randrange(self.days * 86400)
+        day, second = divmod(offset, 86400)
+        return f"{self._day_text[day]} {self._second_text[second]}", self.start_ms + offset * 1000
+
+    def _timeline(self, count):
+        """
+        count random moments spread uniformly over the period, in chronological order,
+        as chunks of at most batch_size (text, epoch ms) pairs. Logs are appended in time
+        order, as in production, which keeps their time indexes append-only while loading.
+        """
+        period = self.days * 86400
+        chunks = max(1, -(-count // self.batch_size))
+        for chunk in range(chunks):
+            size = count // chunks + (1 if chunk < count % chunks else 0)
+            low, high = period * chunk // chunks, period * (chunk + 1) // chunks
+            moments = []
+            for offset in sorted(self.rng.randrange(low, high) for _ in range(size)):
+                day, second = divmod(offset, 86400)
+                moments.append((f"{self._day_text[day]} {self._second_text[second]}", self.start_ms + offset * 1000))
+            yield moments
+
+    def _next_id(self, table):
+        """First free id of an AUTOINCREMENT table (ids are assigned explicitly in bulk)."""
+        row = self._conn.execute(
+            f"SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0), COALESCE(MAX(id), 0)) FROM {table}",
+            (table,)
+        ).fetchone()
+        return row[0] + 1
+
+    def _insert(self, sql, rows):
+        """Insert rows from an iterable in transactions of batch_size; returns the number inserted."""
+        rows = iter(rows)
+        count = 0
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                return count
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(sql, batch)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            count += len(batch)
+
+    @contextmanager
+    def _bulk_load(self, *tables):
+        """
+        Drop the triggers and secondary indexes of tables for the duration of the block
+        and recreate them after: building an index once is much cheaper than updating it
+        row by row. Unique constraints are kept.
+        """
+        placeholders = ", ".join("?" for _ in tables)
+        objects = self._conn.execute(f"""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('trigger', 'index') AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+        """, tables).fetchall()
+        for kind, name, _ in objects:
+            self._conn.execute(f"DROP {kind.upper()} {name}")
+        try:
+            yield
+        finally:
+            for _, _, sql in objects:
+                self._conn.execute(sql)
+
+    def _pick(self, items, cum_weights, k):
+        return self.rng.choices(items, cum_weights=cum_weights, k=k)
+
+    # Reference data
+    def add_taxonomy(self, levels=8, subjects_per_level=12):
+        """Add levels and, for each, subjects_per_level subjects."""
+        level_id = self._next_id("levels")
+        level_rows = [(level_id + i, f"Niveau {level_id + i}", None) for i in range(levels)]
+        self._insert("INSERT INTO levels (id, name, description) VALUES (?, ?, ?)", level_rows)
+
+        subject_id = self._next_id("subjects")
+        subject_rows = []
+        for level in level_rows:
+            for _ in range(subjects_per_level):
+                subject_rows.append((subject_id, f"Matière {subject_id}", level[0], None))
+                self.subjects_by_level.setdefault(level[0], []).append(subject_id)
+                subject_id += 1
+        self._insert("INSERT INTO subjects (id, name, level_id, description) VALUES (?, ?, ?, ?)", subject_rows)
+
+        self.level_ids.extend(row[0] for row in level_rows)
+
+    def add_courses(self, count=5000, difficulties=DEFAULT_DIFFICULTIES, content_types=DEFAULT_CONTENT_TYPES):
+        """Add courses spread uniformly over the subjects, with the given difficulty and type weights."""
+        subjects = [(subject_id, level_id) for level_id, ids in self.subjects_by_level.items() for subject_id in ids]
+        difficulty_names, difficulty_weights = list(difficulties), list(difficulties.values())
+        type_names, type_weights = list(content_types), list(content_types.values())
+
+        course_id = self._next_id("courses")
+        rows = []
+        for i in range(count):
+            subject_id, level_id = self.rng.choice(subjects)
+            content_type = self.rng.choices(type_names, type_weights)[0]
+            created_at, _ = self._timestamp()
+            youtube_url = f"https://www.youtube.com/watch?v={course_id + i:011d}" if content_type == "YouTube" else None
+            rows.append((
+                course_id + i, f"Cours {course_id + i}", None, content_type, None, youtube_url, subject_id, level_id,
+                self.rng.choices(difficulty_names, difficulty_weights)[0], created_at, created_at
+            ))
+            self.courses_by_subject.setdefault(subject_id, []).append(course_id + i)
+
+        # Courses keep their triggers: the search index and the counts follow every insert
+        self._insert("""
+        INSERT INTO courses (
+            id, title, description, content_type, content_path, youtube_url, subject_id, level_id,
+            difficulty, created_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        self.course_ids.extend(row[0] for row in rows)
+
+    # Students and assignments
+    def add_students(self, count=200000, validated_ratio=0.9, password_hash=None):
+        """
+        Add students; validated_ratio of them are validated. They all share one
+        password hash (by default the hash of "student", computed once).
+        """
+        if password_hash is None:
+            from auth import hash_password
+            password_hash = hash_password("student")
+
+        user_id = self._next_id("users")
+
+        def rows():
+            for i in range(count):
+                created_at, _ = self._timestamp()
+                yield (
+                    user_id + i, f"etudiant_{user_id + i}", password_hash, "student", f"Étudiant {user_id + i}",
+                    f"etudiant_{user_id + i}@example.com", None, 1 if self.rng.random() < validated_ratio else 0,
+                    created_at
+                )
+
+        with self._bulk_load("users"):
+            self._insert("""
+            INSERT INTO users (id, username, password_hash, role, full_name, email, phone, validated, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows())
+        self.student_ids.extend(range(user_id, user_id + count))
+
+    def assign(self, subjects_per_student=(1, 3), courses_per_student=(5, 30), course_skew=1.0):
+        """
+        Give every generated student one level, a number of its subjects drawn from
+        subjects_per_student (inclusive range) and a number of courses of those subjects
+        drawn from courses_per_student. Courses are picked by popularity: within a
+        subject, the course of rank r is chosen with weight 1 / r**course_skew.
+        """
+        weights = {subject_id: zipf_weights(len(ids), course_skew) for subject_id, ids in self.courses_by_subject.items()}
+        level_rows, subject_rows, course_rows = [], [], []
+
+        for user_id in self.student_ids:
+            level_id = self.rng.choice(self.level_ids)
+            level_rows.append((user_id, level_id))
+
+            level_subjects = self.subjects_by_level[level_id]
+            subjects = self.rng.sample(level_subjects, min(len(level_subjects), self.rng.randint(*subjects_per_student)))
+            subject_rows.extend((user_id, subject_id) for subject_id in subjects)
+
+            pool = [subject_id for subject_id in subjects if subject_id in self.courses_by_subject]
+            if not pool:
+                continue
+            wanted = self.rng.randint(*courses_per_student)
+            chosen = set()
+            for subject_id in self.rng.choices(pool, k=wanted):
+                chosen.add(self._pick(self.courses_by_subject[subject_id], weights[subject_id], 1)[0])
+            course_rows.extend((user_id, course_id) for course_id in chosen)
+
+        with self._bulk_load("user_levels", "user_subjects", "user_courses"):
+            self._insert("INSERT OR IGNORE INTO user_levels (user_id, level_id) VALUES (?, ?)", level_rows)
+            self._insert("INSERT OR IGNORE INTO user_subjects (user_id, subject_id) VALUES (?, ?)", subject_rows)
+            self._insert("INSERT OR IGNORE INTO user_courses (user_id, course_id) VALUES (?, ?)", course_rows)
+
+    # Logs
+    def add_activity(self, count=20000000, actions=DEFAULT_ACTIONS, user_skew=0.8):
+        """
+        Add activity events over the generated period. Users are picked by activity:
+        the student of rank r with weight 1 / r**user_skew (0 = every student alike).
+        """
+        users = list(self.student_ids)
+        self.rng.shuffle(users)
+        user_weights = zipf_weights(len(users), user_skew)
+        action_names, action_weights = list(actions), list(itertools.accumulate(actions.values()))
+        first_id = self._next_id("activity_logs")
+
+        def rows():
+            for moments in self._timeline(count):
+                picked_users = self._pick(users, user_weights, len(moments))
+                picked_actions = self._pick(action_names, action_weights, len(moments))
+                for user_id, action, (timestamp, ts_ms) in zip(picked_users, picked_actions, moments):
+                    yield user_id, action, timestamp, ts_ms
+
+        with self._bulk_load("activity_logs"):
+            self._insert("INSERT INTO activity_logs (user_id, action, timestamp, ts_ms) VALUES (?, ?, ?, ?)", rows())
+
+        # What trg_activity_logs_rollup would have added, in one pass over the new rows
+        self._conn.execute("BEGIN")
+        self._conn.execute("""
+        INSERT INTO activity_daily_rollups (day, user_id, action, count)
+        SELECT date(timestamp), COALESCE(user_id, 0), action, COUNT(*) FROM activity_logs
+        WHERE id >= ?
+        GROUP BY date(timestamp), COALESCE(user_id, 0), action
+        ON CONFLICT (day, user_id, action) DO UPDATE SET count = count + excluded.count
+        """, (first_id,))
+        self._conn.execute("""
+        INSERT INTO activity_daily_totals (day, count)
+        SELECT date(timestamp), COUNT(*) FROM activity_logs
+        WHERE id >= ?
+        GROUP BY date(timestamp)
+        ON CONFLICT (day) DO UPDATE SET count = count + excluded.count
+        """, (first_id,))
+        # And trg_activity_logs_user_totals; the active user count follows through its insert trigger
+        self._conn.execute("""
+        INSERT INTO activity_user_totals (user_id, count)
+        SELECT COALESCE(user_id, 0), COUNT(*) FROM activity_logs
+        WHERE id >= ?
+        GROUP BY COALESCE(user_id, 0)
+        ON CONFLICT (user_id) DO UPDATE SET count = count + excluded.count
+        """, (first_id,))
+        self._conn.execute("COMMIT")
+
+    def add_screenshots(self, count=500000, user_skew=0.8, course_skew=1.0):
+        """Add screenshot logs; users and courses are picked by the same popularity laws as activity and assignments."""
+        users = list(self.student_ids)
+        self.rng.shuffle(users)
+        user_weights = zipf_weights(len(users), user_skew)
+        course_weights = zipf_weights(len(self.course_ids), course_skew)
+
+        def rows():
+            for moments in self._timeline(count):
+                picked_users = self._pick(users, user_weights, len(moments))
+                picked_courses = self._pick(self.course_ids, course_weights, len(moments))
+                for user_id, course_id, (timestamp, ts_ms) in zip(picked_users, picked_courses, moments):
+                    yield user_id, course_id, timestamp, ts_ms
+
+        with self._bulk_load("screenshot_logs"):
+            self._insert("INSERT INTO screenshot_logs (user_id, course_id, timestamp, ts_ms) VALUES (?, ?, ?, ?)", rows())
+
+    # Files
+    def add_pdf_fixtures(self, count=20, pages=(1, 40), words_per_page=200, output_dir=None, encryption=None):
+        """
+        Write count PDFs with a page count drawn from pages (inclusive range), encrypt
+        them with FileEncryption (the app's key by default), and attach them in turn to
+        the PDF courses, with their text in the search index.
+        Returns the paths of the encrypted files.
+        """
+        if not count:
+            return []
+        if encryption is None:
+            from encryption import FileEncryption
+            encryption = FileEncryption()
+        output_dir = output_dir or os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "fixtures")
+
+        fixtures = []
+        with tempfile.TemporaryDirectory() as plain_dir:
+            for i in range(count):
+                texts = [
+                    " ".join(self.rng.choices(VOCABULARY, k=words_per_page))
+                    for _ in range(self.rng.randint(*pages))
+                ]
+                plain_path = os.path.join(plain_dir, f"fixture_{i:04d}.pdf")
+                with open(plain_path, "wb") as f:
+                    f.write(minimal_pdf(texts))
+                fixtures.append((encryption.encrypt_file(plain_path, output_dir), " ".join(texts)))
+
+        pdf_courses = [row[0] for row in self._conn.execute(
+            "SELECT id FROM courses WHERE content_type = 'PDF' AND content_path IS NULL ORDER BY id"
+        )]
+        if fixtures:
+            self._conn.execute("BEGIN")
+            for i, course_id in enumerate(pdf_courses):
+                path, text = fixtures[i % len(fixtures)]
+                self._conn.execute("UPDATE courses SET content_path = ? WHERE id = ?", (path, course_id))
+                self._conn.execute("UPDATE courses_fts SET body = ? WHERE rowid = ?", (text, course_id))
+            self._conn.execute("COMMIT")
+
+        return [path for path, _ in fixtures]
+
+    def finish(self):
+        """Recompute what the suspended triggers maintain and refresh the planner statistics."""
+        self._conn.execute("BEGIN")
+        rebuild_reference_counts(self._conn.cursor())
+        self._conn.execute("COMMIT")
+        self._conn.execute("ANALYZE")
+
+def generate_dataset(db_path, seed=1234, levels=8, subjects_per_level=12, courses=5000, students=200000,
+                     courses_per_student=(5, 30), activity=20000000, screenshots=500000, pdf_fixtures=0,
+                     pages=(1, 40), progress=None):
+    """
+    Generate a complete dataset with the given volumes (defaults: the full-scale load test).
+    progress(step, seconds) is called after each step, if given.
+    """
+    generator = DatasetGenerator(db_path, seed=seed)
+    steps = [
+        ("taxonomy", lambda: generator.add_taxonomy(levels, subjects_per_level)),
+        ("courses", lambda: generator.add_courses(courses)),
+        ("students", lambda: generator.add_students(students)),
+        ("assignments", lambda: generator.assign(courses_per_student=courses_per_student)),
+        ("activity", lambda: generator.add_activity(activity)),
+        ("screenshots", lambda: generator.add_screenshots(screenshots)),
+        ("pdf fixtures", lambda: generator.add_pdf_fixtures(pdf_fixtures, pages=pages)),
+        ("counts and statistics", generator.finish),
+    ]
+    try:
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            if progress:
+                progress(name, time.perf_counter() - start)
+    finally:
+        generator.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill a database with a synthetic, reproducible dataset.")
+    parser.add_argument("db_path")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--levels", type=int, default=8)
+    parser.add_argument("--subjects-per-level", type=int, default=12)
+    parser.add_argument("--courses", type=int, default=5000)
+    parser.add_argument("--students", type=int, default=200000)
+    parser.add_argument("--courses-per-student", type=int, nargs=2, default=(5, 30), metavar=("MIN", "MAX"))
+    parser.add_argument("--activity", type=int, default=20000000)
+    parser.add_argument("--screenshots", type=int, default=500000)
+    parser.add_argument("--pdf-fixtures", type=int, default=0)
+    parser.add_argument("--pages", type=int, nargs=2, default=(1, 40), metavar=("MIN", "MAX"))
+    args = parser.parse_args(argv)
+
+    generate_dataset(
+        args.db_path, seed=args.seed, levels=args.levels, subjects_per_level=args.subjects_per_level,
+        courses=args.courses, students=args.students, courses_per_student=tuple(args.courses_per_student),
+        activity=args.activity, screenshots=args.screenshots, pdf_fixtures=args.pdf_fixtures,
+        pages=tuple(args.pages), progress=lambda step, seconds: print(f"{step:<22} {seconds:8.1f} s")
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
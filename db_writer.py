@@ -0,0 +1,341 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class _Session:
+    """An explicit transaction: the writer thread serves only its requests until it ends."""
+
+    def __init__(self):
+        self.requests = queue.Queue()
+        self.depth = 0
+        self.callbacks = []
+
+class _ThreadState(threading.local):
+    # Transaction opened by the current thread, if any
+    session = None
+
+class WriteQueue:
+    """
+    Single writer thread for one database file.
+
+    Writes are queued as functions taking a cursor. The writer drains the queue
+    and applies everything it finds in one transaction (group commit), with a
+    savepoint around each write so one failing write does not undo the others.
+    Callers wait on the returned Future, or ignore it for fire-and-forget writes.
+
+    transaction() groups the writes of one thread into a unit of work: they are
+    committed together when the outermost block exits, or all rolled back if it
+    raises. Nested blocks are savepoints.
+    """
+
+    def __init__(self, db_path, max_batch=500, timeout=30.0):
+        """
+        Open the writer connection, switch the database to WAL mode and start the thread.
+
+        Args:
+            db_path: Path to the SQLite database file
+            max_batch: Maximum number of queued writes applied in one commit
+            timeout: SQLite busy timeout in seconds
+        """
+        self.db_path = db_path
+        self.max_batch = max_batch
+
+        # Autocommit mode: transactions are opened explicitly for each batch
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=timeout, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+        self._queue = queue.Queue()
+        self._local = _ThreadState()
+        self._closed = False
+        self._busy = False
+        self._last_write = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, func):
+        """Queue func(cursor) for the writer thread and return a Future with its result."""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Write queue is closed")
+
+        future = Future()
+        session = self._local.session
+        if session is not None:
+            session.requests.put((func, future))
+        else:
+            self._queue.put((func, future))
+        return future
+
+    def execute(self, func):
+        """Queue func(cursor) and wait for it to be committed; returns its result."""
+        return self.submit(func).result()
+
+    def submit_nowait(self, func):
+        """Queue func(cursor) without waiting; failures are logged instead of raised."""
+        future = self.submit(func)
+        future.add_done_callback(_log_failure)
+        return future
+
+    def flush(self):
+        """Wait until every write queued so far has been committed."""
+        self.execute(lambda cursor: None)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Make the writes queued by this thread inside the block one transaction.
+
+        The outermost block takes the write lock (BEGIN IMMEDIATE) and commits on
+        exit, so the whole block pays one commit; if the block raises, every write
+        made in it is rolled back. A nested block is a savepoint: if it raises,
+        only its own writes are undone and the exception propagates.
+
+        The writer serves nothing else while the block is open, so keep it short.
+        Reads through the connection pool do not see the uncommitted writes, and
+        waiting inside the block for another thread's write would deadlock.
+        """
+        session = self._local.session
+        if session is not None:
+            session.depth += 1
+            name = f"scope_{session.depth}"
+            callbacks = len(session.callbacks)
+            self._control(session, f"SAVEPOINT {name}")
+            try:
+                yield
+            except BaseException:
+                self._control(session, f"ROLLBACK TO {name}")
+                self._control(session, f"RELEASE {name}")
+                # The writes these callbacks were waiting on are undone
+                del session.callbacks[callbacks:]
+                raise
+            else:
+                self._control(session, f"RELEASE {name}")
+            finally:
+                session.depth -= 1
+            return
+
+        if self._closed:
+            raise sqlite3.ProgrammingError("Write queue is closed")
+
+        session = _Session()
+        started = Future()
+        self._queue.put((session, started))
+        started.result()
+
+        self._local.session = session
+        try:
+            yield
+        except BaseException:
+            self._local.session = None
+            self._control(session, "ROLLBACK")
+            raise
+        self._local.session = None
+        self._control(session, "COMMIT")
+
+        for callback in session.callbacks:
+            callback()
+
+    def on_commit(self, callback):
+        """Call callback() once the current thread's transaction commits, or right away outside of one."""
+        session = self._local.session
+        if session is None:
+            callback()
+        else:
+            session.callbacks.append(callback)
+
+    def _control(self, session, sql):
+        """Have the writer run a transaction control statement for session and wait for it."""
+        future = Future()
+        session.requests.put((sql, future))
+        return future.result()
+
+    def idle_seconds(self):
+        """Seconds since the writer last finished a write (0 while writes are queued or running)."""
+        if self._busy or not self._queue.empty():
+            return 0.0
+        return time.monotonic() - self._last_write
+
+    def set_trace_callback(self, callback):
+        """Trace the SQL executed by the writer connection (None to disable)."""
+        self._conn.set_trace_callback(callback)
+
+    def _run(self):
+        """Writer loop: block for the first write, then drain whatever else is queued."""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            self._busy = True
+
+            batch = []
+            session = None
+            stop = False
+            while True:
+                if isinstance(item[0], _Session):
+                    # Commit what came before, then give the transaction the connection
+                    session = item
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+
+            try:
+                self._apply(batch)
+                if session is not None:
+                    self._serve(*session)
+            finally:
+                self._busy = False
+                self._last_write = time.monotonic()
+            if stop:
+                return
+
+    def _apply(self, batch):
+        """Apply a batch of writes in a single transaction."""
+        batch = [(func, future) for func, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        cursor = self._conn.cursor()
+        outcomes = []
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+
+            for func, future in batch:
+                outcomes.append((future, *self._call(cursor, func)))
+
+            cursor.execute("COMMIT")
+        except Exception as e:
+            # The whole batch is lost (lock timeout, disk full, ...): fail every caller
+            if self._conn.in_transaction:
+                try:
+                    self._conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _call(self, cursor, func):
+        """Run one queued write inside its own savepoint; returns (result, error)."""
+        cursor.execute("SAVEPOINT queued_write")
+        try:
+            result = func(cursor)
+        except Exception as e:
+            cursor.execute("ROLLBACK TO queued_write")
+            cursor.execute("RELEASE queued_write")
+            return None, e
+        cursor.execute("RELEASE queued_write")
+        return result, None
+
+    def _serve(self, session, started):
+        """Run an explicit transaction: begin, apply its requests in order until COMMIT or ROLLBACK."""
+        if not started.set_running_or_notify_cancel():
+            return
+
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+        except Exception as e:
+            started.set_exception(e)
+            return
+        started.set_result(None)
+
+        while True:
+            request, future = session.requests.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            result = error = None
+            try:
+                if isinstance(request, str):
+                    # SAVEPOINT/RELEASE/ROLLBACK TO of a nested block, or the end of the transaction
+                    cursor.execute(request)
+                else:
+                    result, error = self._call(cursor, request)
+            except Exception as e:
+                error = e
+
+            if request in ("COMMIT", "ROLLBACK") and self._conn.in_transaction:
+                # The commit failed (or a rollback did): do not leave the transaction open
+                try:
+                    self._conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+            if request in ("COMMIT", "ROLLBACK"):
+                return
+
+    def close(self):
+        """Commit everything still queued and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._conn.close()
+
+        # Anything queued after the stop marker can no longer be applied
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(sqlite3.ProgrammingError("Write queue is closed"))
+
+def _log_failure(future):
+    """Done-callback for fire-and-forget writes."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Queued database write failed: %s", future.exception())
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+def get_writer(db_path):
+    """Get the process-wide write queue for a database file, starting it on first use."""
+    key = os.path.abspath(db_path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None or writer._closed:
+            writer = WriteQueue(db_path)
+            _writers[key] = writer
+        return writer
+
+@atexit.register
+def close_all_writers():
+    """Flush and stop every write queue created in this process."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+
+    for writer in writers:
+        writer.close()
@@ -0,0 +1,143 @@
+import os
+import threading
+from array import array
+from bisect import bisect_left
+
+from connection_pool import get_pool
+
+def _sorted_ids(ids):
+    """Build a compact sorted array of distinct integer ids."""
+    return array("q", sorted(set(ids)))
+
+def _contains(ids, value):
+    """Binary search in a sorted id array."""
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+class UserEntitlements:
+    """The course, subject and level ids assigned to one user, as sorted arrays; never modified in place."""
+
+    __slots__ = ("courses", "subjects", "levels")
+
+    def __init__(self, courses, subjects, levels):
+        self.courses = courses
+        self.subjects = subjects
+        self.levels = levels
+
+    def has_course(self, course_id):
+        return _contains(self.courses, course_id)
+
+    def has_subject(self, subject_id):
+        return _contains(self.subjects, subject_id)
+
+    def has_level(self, level_id):
+        return _contains(self.levels, level_id)
+
+    def changed(self, courses=(), subjects=(), levels=(), add=True):
+        """Return a copy with the given ids added (or removed)."""
+        def apply(current, ids):
+            if not ids:
+                return current
+            ids = set(ids)
+            if add:
+                return _sorted_ids(list(current) + list(ids))
+            return array("q", [value for value in current if value not in ids])
+
+        return UserEntitlements(apply(self.courses, courses), apply(self.subjects, subjects), apply(self.levels, levels))
+
+class EntitlementIndex:
+    """
+    Per-process index of what each user is assigned to, for one database file.
+
+    A user's entry is loaded from user_courses, user_subjects and user_levels on
+    first use; after that, membership checks are a binary search in memory.
+    Database keeps the loaded entries current by calling grant() and revoke()
+    once its assignment writes commit, and forget() when users or reference
+    rows are deleted. Like ResultCache, each change bumps a version per user,
+    so an entry loaded while a change landed is not stored.
+
+    Several app processes may share the database file. Assignments written by
+    another process reach this index through the change feed: the
+    change_log triggers record the user of every assignment change, and the
+    subscriber installed by Database (watch_changes) forgets that user's
+    entry, or every entry after a gap, within one poll interval.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._entries = {}
+        self._versions = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return the UserEntitlements of a user, loading them on a miss."""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+            epoch = self._epoch
+
+        entry = self._load(user_id)
+
+        with self._lock:
+            if self._versions.get(user_id, 0) == version and self._epoch == epoch:
+                self._entries[user_id] = entry
+        return entry
+
+    def can_view_course(self, user_id, course_id):
+        """Check whether a course is assigned to a user."""
+        return self.get(user_id).has_course(course_id)
+
+    def grant(self, user_id, courses=(), subjects=(), levels=()):
+        """Record new assignments of a user (already committed)."""
+        self._change(user_id, courses, subjects, levels, add=True)
+
+    def revoke(self, user_id, courses=(), subjects=(), levels=()):
+        """Record removed assignments of a user (already committed)."""
+        self._change(user_id, courses, subjects, levels, add=False)
+
+    def _change(self, user_id, courses, subjects, levels, add):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries[user_id] = entry.changed(courses, subjects, levels, add=add)
+
+    def forget(self, user_id=None):
+        """Drop the entry of one user, or of every user when user_id is None; they are reloaded on next use."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                self._epoch += 1
+            else:
+                self._entries.pop(user_id, None)
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def _load(self, user_id):
+        """Read the assignments of a user from the live database."""
+        with get_pool(self.db_path).connection() as conn:
+            courses = conn.execute("SELECT course_id FROM user_courses WHERE user_id = ?", (user_id,)).fetchall()
+            subjects = conn.execute("SELECT subject_id FROM user_subjects WHERE user_id = ?", (user_id,)).fetchall()
+            levels = conn.execute("SELECT level_id FROM user_levels WHERE user_id = ?", (user_id,)).fetchall()
+
+        return UserEntitlements(
+            _sorted_ids(row[0] for row in courses),
+            _sorted_ids(row[0] for row in subjects),
+            _sorted_ids(row[0] for row in levels),
+        )
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_entitlement_index(db_path):
+    """Get the process-wide entitlement index for a database file."""
+    key = os.path.abspath(db_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = EntitlementIndex(db_path)
+            _indexes[key] = index
+        return index
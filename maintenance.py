@@ -0,0 +1,339 @@
+"""
+Routine SQLite maintenance: planner statistics, log archiving, search index backfill,
+free page reclaim and WAL checkpoints.
+
+MaintenanceScheduler runs inside the app process and only works while the
+database is idle; this module is also a command-line tool for running a pass by
+hand, e.g. from cron, or for switching an existing file to incremental vacuum.
+
+Usage:
+    python maintenance.py [DB_PATH] [--budget SECONDS] [--report]
+    python maintenance.py [DB_PATH] --enable-incremental-vacuum   # one full VACUUM; stop the app first
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from connection_pool import get_pool
+from database import Database
+from db_writer import get_writer
+from rows import record_type
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two maintenance passes
+MAINTENANCE_INTERVAL = 6 * 60 * 60
+
+# Seconds between two full ANALYZE runs; passes in between only run PRAGMA optimize
+ANALYZE_INTERVAL = 24 * 60 * 60
+
+# Seconds between two moves of old activity events to the archive
+ARCHIVE_INTERVAL = 24 * 60 * 60
+
+# PDF courses decrypted and indexed for search per step of the backfill
+SEARCH_BACKFILL_BATCH = 5
+
+# Seconds without any write before the database counts as idle
+IDLE_SECONDS = 10.0
+
+# Seconds a pass may spend; the vacuum stops where the budget runs out and resumes next pass
+MAINTENANCE_BUDGET = 5.0
+
+# Rows sampled per index by ANALYZE, so statistics stay cheap on large tables (0 = no limit)
+ANALYSIS_LIMIT = 1000
+
+# Free pages returned to the file system per queued write
+VACUUM_STEP_PAGES = 512
+
+# The WAL is checkpointed and truncated once it grows past this size
+WAL_CHECKPOINT_BYTES = 64 * 1024 * 1024
+
+# PRAGMA auto_vacuum values
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+DatabaseStats = record_type("DatabaseStats", (
+    "file_bytes", "wal_bytes", "page_size", "page_count", "freelist_count", "fragmentation", "auto_vacuum"
+))
+MaintenanceReport = record_type("MaintenanceReport", ("before", "after", "steps", "seconds"))
+
+def database_stats(db_path):
+    """
+    Size and fragmentation of a database file: fragmentation is the share of
+    its pages that are free (left behind by deletes and not yet reclaimed).
+    """
+    with get_pool(db_path).connection() as conn:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+    wal_path = f"{db_path}-wal"
+    return DatabaseStats(
+        file_bytes=os.path.getsize(db_path),
+        wal_bytes=os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        page_size=page_size,
+        page_count=page_count,
+        freelist_count=freelist_count,
+        fragmentation=freelist_count / page_count if page_count else 0.0,
+        auto_vacuum=AUTO_VACUUM_MODES.get(auto_vacuum, str(auto_vacuum)),
+    )
+
+def format_stats(stats):
+    """One-line summary of DatabaseStats for logs and the command line."""
+    return (
+        f"{stats.file_bytes / 1048576:.1f} MB, WAL {stats.wal_bytes / 1048576:.1f} MB, "
+        f"{stats.freelist_count}/{stats.page_count} free pages ({stats.fragmentation:.1%}), "
+        f"auto_vacuum={stats.auto_vacuum}"
+    )
+
+def checkpoint(db_path, timeout=5.0):
+    """
+    Copy the WAL back into the database and truncate it. Readers still using old
+    pages make it stop early (nothing is lost; the next checkpoint continues).
+    Returns (busy, wal_frames, checkpointed_frames) as reported by SQLite.
+    """
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+    try:
+        return conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        conn.close()
+
+def enable_incremental_vacuum(db_path):
+    """
+    Switch an existing file to auto_vacuum=INCREMENTAL, which takes a full VACUUM:
+    it rewrites the whole file and locks it out for the duration, so run it with
+    the app stopped. Files created by migrate() are incremental from the start.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+class MaintenanceScheduler:
+    """
+    Keeps one database file in shape from inside the app process.
+
+    Deletes leave free pages inside the file and the query planner needs
+    statistics that ANALYZE collects; neither happens on its own. Every
+    check_interval seconds the scheduler looks at the writer: once nothing has
+    been written for idle_seconds, it checkpoints an oversized WAL and, every
+    interval seconds, runs a pass: ANALYZE (daily, sampled) or PRAGMA optimize,
+    the daily move of old activity events to the archive, the indexing of PDFs
+    uploaded before the search index existed (a few per step, until none are
+    left), then incremental_vacuum in small steps until the free pages or the
+    time budget run out. Maintenance writes go through the write queue, one step per
+    queued write, so requests arriving meanwhile wait for one step at most.
+    """
+
+    def __init__(self, db_path, interval=MAINTENANCE_INTERVAL, budget=MAINTENANCE_BUDGET,
+                 idle_seconds=IDLE_SECONDS, check_interval=60.0, wal_threshold=WAL_CHECKPOINT_BYTES):
+        """
+        Args:
+            db_path: Path to the SQLite database file
+            interval: Seconds between two passes
+            budget: Seconds one pass may spend
+            idle_seconds: Seconds without writes before maintenance may start
+            check_interval: Seconds between idle checks
+            wal_threshold: WAL size in bytes past which it is checkpointed
+        """
+        self.db_path = db_path
+        self.interval = interval
+        self.budget = budget
+        self.idle_seconds = idle_seconds
+        self.check_interval = check_interval
+        self.wal_threshold = wal_threshold
+
+        self.last_run = None
+        self.last_analyze = None
+        self.last_archive = None
+        # Course id the search backfill resumes after; None once it has been through every course
+        self.search_backfill_after = 0
+        self.last_report = None
+        self._created = time.monotonic()
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_idle(self):
+        """Check that nothing has been written for idle_seconds and no reader holds a connection."""
+        writer = get_writer(self.db_path)
+        return writer.idle_seconds() >= self.idle_seconds and get_pool(self.db_path).stats()["in_use"] == 0
+
+    def run(self, budget=None, analyze=None):
+        """
+        Run one maintenance pass now and return its MaintenanceReport.
+
+        Args:
+            budget: Seconds the pass may spend (default: the scheduler's budget)
+            analyze: Force (True) or skip (False) a full ANALYZE; by default it runs
+                when there are no statistics yet or none was run for ANALYZE_INTERVAL
+        """
+        with self._run_lock:
+            started = time.monotonic()
+            deadline = started + (self.budget if budget is None else budget)
+            writer = get_writer(self.db_path)
+            before = database_stats(self.db_path)
+            steps = []
+
+            if analyze is None:
+                since = self.last_analyze if self.last_analyze is not None else self._created
+                analyze = started - since >= ANALYZE_INTERVAL or not self._has_statistics()
+            if analyze:
+                writer.execute(lambda cursor: self._analyze(cursor, "ANALYZE"))
+                self.last_analyze = time.monotonic()
+                steps.append("analyze")
+            else:
+                writer.execute(lambda cursor: self._analyze(cursor, "PRAGMA optimize"))
+                steps.append("optimize")
+
+            if self.last_archive is None or started - self.last_archive >= ARCHIVE_INTERVAL:
+                # Before the vacuum, so the pages the move frees are reclaimed in the same pass.
+                # Shares the pass budget; when it runs out the move stays due and resumes next pass.
+                moved = Database(self.db_path).archive_activity_logs(deadline=deadline)
+                if time.monotonic() < deadline:
+                    self.last_archive = time.monotonic()
+                steps.append(f"archive({moved})")
+
+            if self.search_backfill_after is not None and time.monotonic() < deadline:
+                # Imported here: only this step needs PyMuPDF and the encryption key
+                from content_manager import backfill_search_text
+
+                db = Database(self.db_path)
+                indexed = 0
+                while self.search_backfill_after is not None and time.monotonic() < deadline:
+                    count, self.search_backfill_after = backfill_search_text(
+                        db, self.search_backfill_after, SEARCH_BACKFILL_BATCH)
+                    indexed += count
+                if indexed:
+                    steps.append(f"search_backfill({indexed})")
+
+            if before.auto_vacuum == "incremental":
+                reclaimed = 0
+                while time.monotonic() < deadline:
+                    freed = writer.execute(self._vacuum_step)
+                    reclaimed += freed
+                    if freed < VACUUM_STEP_PAGES:
+                        break
+                if reclaimed:
+                    steps.append(f"incremental_vacuum({reclaimed})")
+            elif before.freelist_count:
+                logger.info("%s has %d free pages but no incremental vacuum; see enable_incremental_vacuum",
+                            self.db_path, before.freelist_count)
+
+            if database_stats(self.db_path).wal_bytes > self.wal_threshold:
+                checkpoint(self.db_path)
+                steps.append("wal_checkpoint")
+
+            after = database_stats(self.db_path)
+            self.last_run = time.monotonic()
+            self.last_report = MaintenanceReport(before, after, tuple(steps), self.last_run - started)
+
+        logger.info("Maintenance of %s (%s) in %.2fs: before %s; after %s", self.db_path, ", ".join(steps),
+                    self.last_report.seconds, format_stats(before), format_stats(after))
+        return self.last_report
+
+    def _has_statistics(self):
+        with get_pool(self.db_path).connection() as conn:
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is not None
+
+    @staticmethod
+    def _analyze(cursor, statement):
+        """Run ANALYZE or PRAGMA optimize with sampling, so its cost does not grow with the tables."""
+        cursor.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        try:
+            cursor.execute(statement).fetchall()
+        finally:
+            cursor.execute("PRAGMA analysis_limit = 0")
+
+    @staticmethod
+    def _vacuum_step(cursor):
+        """Return up to VACUUM_STEP_PAGES free pages to the file system; returns how many were freed."""
+        free = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        # The sqlite3 module steps a statement returning no rows only once, and each step frees one page
+        for _ in range(min(free, VACUUM_STEP_PAGES)):
+            cursor.execute("PRAGMA incremental_vacuum(1)")
+        return free - cursor.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def check(self):
+        """If the database is idle: checkpoint an oversized WAL, and run a pass if one is due."""
+        if not self.is_idle():
+            return None
+        if self.last_run is None or time.monotonic() - self.last_run >= self.interval:
+            return self.run()
+        if database_stats(self.db_path).wal_bytes > self.wal_threshold:
+            checkpoint(self.db_path)
+        return None
+
+    def start(self):
+        """Check for idle windows in a background thread every check_interval seconds."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("Database maintenance failed: %s", e)
+
+    def stop(self):
+        """Stop the background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_maintenance_scheduler(db_path):
+    """Get the process-wide maintenance scheduler of a database file, starting its thread on first use."""
+    key = os.path.abspath(db_path)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = MaintenanceScheduler(db_path)
+            scheduler.start()
+            _schedulers[key] = scheduler
+        return scheduler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a maintenance pass on an SQLite database.")
+    parser.add_argument("db_path", nargs="?", default="zouhair_elearning.db")
+    parser.add_argument("--budget", type=float, default=60.0, help="seconds the pass may spend")
+    parser.add_argument("--analyze", action="store_true", help="run a full ANALYZE even if statistics exist")
+    parser.add_argument("--report", action="store_true", help="only print size and fragmentation")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="switch the file to incremental vacuum (full VACUUM, app stopped)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db_path):
+        print(f"No such database: {args.db_path}", file=sys.stderr)
+        return 1
+
+    if args.report:
+        print(format_stats(database_stats(args.db_path)))
+        return 0
+
+    if args.enable_incremental_vacuum:
+        print(f"before: {format_stats(database_stats(args.db_path))}")
+        enable_incremental_vacuum(args.db_path)
+        print(f"after:  {format_stats(database_stats(args.db_path))}")
+        return 0
+
+    report = MaintenanceScheduler(args.db_path).run(budget=args.budget, analyze=True if args.analyze else None)
+    print(f"steps:  {', '.join(report.steps)} ({report.seconds:.2f}s)")
+    print(f"before: {format_stats(report.before)}")
+    print(f"after:  {format_stats(report.after)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
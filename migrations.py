@@ -0,0 +1,631 @@
+# Registered migration steps as (version, description, function), kept sorted by version
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a function as the schema migration step for the given version."""
+    def decorator(func):
+        if any(existing[0] == version for existing in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version: {version}")
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda step: step[0])
+        return func
+    return decorator
+
+def get_schema_version(conn):
+    """Read the schema version stored in PRAGMA user_version."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def latest_version():
+    """Return the version the schema reaches once every migration is applied."""
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def column_exists(cursor, table, column):
+    """Check whether a table already has a column."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+def add_column(cursor, table, column, definition):
+    """Add a column to an existing table unless it is already there."""
+    if not column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def migrate(conn):
+    """
+    Bring the database schema up to date.
+    Each pending step runs in its own transaction together with the version bump,
+    so a failed step leaves the schema at the previous version.
+    Returns the list of versions that were applied.
+    """
+    applied = []
+
+    # A new file returns freed pages incrementally (see maintenance.py); it can only be set before the first table
+    if get_schema_version(conn) == 0 and conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is None:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    for version, description, func in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+
+        # Take the write lock first, then re-check in case another process migrated meanwhile
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+
+            cursor = conn.cursor()
+            func(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        applied.append(version)
+
+    return applied
+
+@migration(1, "Initial schema")
+def _initial_schema(cursor):
+    # Users table (both admin and students)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        role TEXT NOT NULL,
+        full_name TEXT,
+        email TEXT,
+        phone TEXT,
+        validated BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Levels table (e.g., Bac+2, Bac+3)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS levels (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        description TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Subjects/Matieres table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS subjects (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT,
+        level_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (level_id) REFERENCES levels(id),
+        UNIQUE(name, level_id)
+    )
+    ''')
+
+    # Courses table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS courses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        description TEXT,
+        content_type TEXT NOT NULL,
+        content_path TEXT,
+        youtube_url TEXT,
+        subject_id INTEGER,
+        level_id INTEGER,
+        difficulty TEXT NOT NULL,
+        image_path TEXT,
+        created_by INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (subject_id) REFERENCES subjects(id),
+        FOREIGN KEY (level_id) REFERENCES levels(id),
+        FOREIGN KEY (created_by) REFERENCES users(id)
+    )
+    ''')
+
+    # User-Level assignments
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_levels (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        level_id INTEGER,
+        assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (level_id) REFERENCES levels(id),
+        UNIQUE(user_id, level_id)
+    )
+    ''')
+
+    # User-Subject assignments
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_subjects (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        subject_id INTEGER,
+        assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (subject_id) REFERENCES subjects(id),
+        UNIQUE(user_id, subject_id)
+    )
+    ''')
+
+    # User-Course assignments
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_courses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        course_id INTEGER,
+        assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (course_id) REFERENCES courses(id),
+        UNIQUE(user_id, course_id)
+    )
+    ''')
+
+    # Screenshot tracking
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS screenshot_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        course_id INTEGER,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (course_id) REFERENCES courses(id)
+    )
+    ''')
+
+    # Activity logs
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS activity_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        action TEXT NOT NULL,
+        details TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''')
+
+@migration(2, "Secondary indexes for filters, joins and time-ordered listings")
+def _secondary_indexes(cursor):
+    indexes = [
+        # Users: role/validation filters ordered by signup date
+        "CREATE INDEX IF NOT EXISTS idx_users_role_validated_created ON users(role, validated, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_users_validated_created ON users(validated, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)",
+
+        # Subjects listed per level
+        "CREATE INDEX IF NOT EXISTS idx_subjects_level_name ON subjects(level_id, name)",
+
+        # Courses: each filter column paired with the listing order
+        "CREATE INDEX IF NOT EXISTS idx_courses_subject_created ON courses(subject_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_courses_level_created ON courses(level_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_courses_difficulty_created ON courses(difficulty, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_courses_created ON courses(created_at)",
+
+        # Reverse direction of the UNIQUE(user_id, x) assignment pairs
+        "CREATE INDEX IF NOT EXISTS idx_user_levels_level_user ON user_levels(level_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_subjects_subject_user ON user_subjects(subject_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_courses_course_user ON user_courses(course_id, user_id)",
+
+        # Logs: per-user and global recency
+        "CREATE INDEX IF NOT EXISTS idx_screenshot_logs_user_course_ts ON screenshot_logs(user_id, course_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_user_ts ON activity_logs(user_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_ts ON activity_logs(timestamp)",
+    ]
+
+    for statement in indexes:
+        cursor.execute(statement)
+
+@migration(3, "Covering index for the course counts on the admin overview")
+def _course_stats_index(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_courses_difficulty_type ON courses(difficulty, content_type)")
+
+@migration(4, "Generation counters for the reference data caches")
+def _cache_generations(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS cache_generations (
+        name TEXT PRIMARY KEY,
+        generation INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+    # One counter per table, bumped by triggers in the same transaction as the write,
+    # so every process sees the change on its next read of the counters
+    for table in ("levels", "subjects", "courses"):
+        cursor.execute("INSERT OR IGNORE INTO cache_generations (name) VALUES (?)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_generation
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE cache_generations SET generation = generation + 1 WHERE name = '{table}';
+            END
+            ''')
+
+@migration(5, "Activity log archive and daily rollups")
+def _activity_retention(cursor):
+    # Cold storage for raw events past the retention window (same columns as activity_logs)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS activity_logs_archive (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        action TEXT NOT NULL,
+        details TEXT,
+        timestamp TIMESTAMP
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_logs_archive_ts ON activity_logs_archive(timestamp)")
+
+    # One row per day, user and action; user_id 0 stands for events without a user
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS activity_daily_rollups (
+        day TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, user_id, action)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_daily_rollups_user_day ON activity_daily_rollups(user_id, day, count)")
+
+    # Platform-wide events per day, so the all-users timeline reads one row per day
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS activity_daily_totals (
+        day TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''')
+
+    # Backfill from the events logged so far, then keep the rollups current on every insert
+    cursor.execute('''
+    INSERT OR IGNORE INTO activity_daily_rollups (day, user_id, action, count)
+    SELECT date(timestamp), COALESCE(user_id, 0), action, COUNT(*)
+    FROM activity_logs
+    GROUP BY date(timestamp), COALESCE(user_id, 0), action
+    ''')
+    cursor.execute('''
+    INSERT OR IGNORE INTO activity_daily_totals (day, count)
+    SELECT date(timestamp), COUNT(*) FROM activity_logs GROUP BY date(timestamp)
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_activity_logs_rollup
+    AFTER INSERT ON activity_logs
+    BEGIN
+        INSERT INTO activity_daily_rollups (day, user_id, action, count)
+        VALUES (date(NEW.timestamp), COALESCE(NEW.user_id, 0), NEW.action, 1)
+        ON CONFLICT (day, user_id, action) DO UPDATE SET count = count + 1;
+        INSERT INTO activity_daily_totals (day, count)
+        VALUES (date(NEW.timestamp), 1)
+        ON CONFLICT (day) DO UPDATE SET count = count + 1;
+    END
+    ''')
+
+@migration(6, "Index screenshot logs by time for rebuilding the rate limiter")
+def _screenshot_logs_ts_index(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_screenshot_logs_ts ON screenshot_logs(timestamp)")
+
+# Searchable text of a course description: the values of its JSON metadata, or the raw text
+COURSE_DESCRIPTION_TEXT = '''
+CASE WHEN json_valid({0}) THEN (
+    SELECT group_concat(value, ' ') FROM json_tree({0}) WHERE type NOT IN ('object', 'array')
+) ELSE {0} END
+'''
+
+@migration(7, "Full-text search index over courses")
+def _course_search_index(cursor):
+    # One row per course (rowid = course id); body holds the text extracted from the PDF at ingest
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS courses_fts USING fts5(
+        title, description, body,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    ''')
+
+    cursor.execute(f'''
+    INSERT INTO courses_fts (rowid, title, description, body)
+    SELECT id, title, {COURSE_DESCRIPTION_TEXT.format("description")}, ''
+    FROM courses
+    WHERE id NOT IN (SELECT rowid FROM courses_fts)
+    ''')
+
+    # Keep title and description in step with the courses table; body is set separately
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_courses_fts_insert
+    AFTER INSERT ON courses
+    BEGIN
+        INSERT INTO courses_fts (rowid, title, description, body)
+        VALUES (NEW.id, NEW.title, {COURSE_DESCRIPTION_TEXT.format("NEW.description")}, '');
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_courses_fts_update
+    AFTER UPDATE OF title, description ON courses
+    BEGIN
+        UPDATE courses_fts
+        SET title = NEW.title, description = {COURSE_DESCRIPTION_TEXT.format("NEW.description")}
+        WHERE rowid = NEW.id;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_courses_fts_delete
+    AFTER DELETE ON courses
+    BEGIN
+        DELETE FROM courses_fts WHERE rowid = OLD.id;
+    END
+    ''')
+
+# (table, epoch-ms column, text timestamp column it is derived from)
+EPOCH_MS_COLUMNS = [
+    ("activity_logs", "ts_ms", "timestamp"),
+    ("activity_logs_archive", "ts_ms", "timestamp"),
+    ("screenshot_logs", "ts_ms", "timestamp"),
+]
+
+@migration(8, "Integer epoch-millisecond timestamps for range queries")
+def _epoch_ms_columns(cursor):
+    for table, column, source in EPOCH_MS_COLUMNS:
+        add_column(cursor, table, column, "INTEGER")
+        cursor.execute(f'''
+        UPDATE {table} SET {column} = CAST(strftime('%s', {source}) AS INTEGER) * 1000
+        WHERE {column} IS NULL AND {source} IS NOT NULL
+        ''')
+
+        # The application writes the column itself; this covers inserts that leave it out
+        if table != "activity_logs_archive":
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{column}
+            AFTER INSERT ON {table}
+            WHEN NEW.{column} IS NULL
+            BEGIN
+                UPDATE {table} SET {column} = CAST(strftime('%s', NEW.{source}) AS INTEGER) * 1000
+                WHERE rowid = NEW.rowid;
+            END
+            ''')
+
+    # Time ranges on the logs now use the integer columns
+    for index in ("idx_activity_logs_ts", "idx_activity_logs_user_ts", "idx_activity_logs_archive_ts",
+                  "idx_screenshot_logs_ts", "idx_screenshot_logs_user_course_ts"):
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+    indexes = [
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_ts_ms ON activity_logs(ts_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_user_ts_ms ON activity_logs(user_id, ts_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_archive_ts_ms ON activity_logs_archive(ts_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_screenshot_logs_ts_ms ON screenshot_logs(ts_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_screenshot_logs_user_course_ts_ms ON screenshot_logs(user_id, course_id, ts_ms)",
+    ]
+    for statement in indexes:
+        cursor.execute(statement)
+
+def rebuild_reference_counts(cursor):
+    """
+    Recompute level_counts and subject_counts from the current rows (students are
+    assigned users with the student role); used to backfill them and after bulk loads.
+    """
+    cursor.execute('''
+    INSERT OR REPLACE INTO level_counts (level_id, subjects, students)
+    SELECT l.id,
+        (SELECT COUNT(*) FROM subjects s WHERE s.level_id = l.id),
+        (SELECT COUNT(*) FROM user_levels ul JOIN users u ON u.id = ul.user_id
+         WHERE ul.level_id = l.id AND u.role = 'student')
+    FROM levels l
+    ''')
+    cursor.execute('''
+    INSERT OR REPLACE INTO subject_counts (subject_id, courses, students)
+    SELECT s.id,
+        (SELECT COUNT(*) FROM courses c WHERE c.subject_id = s.id),
+        (SELECT COUNT(*) FROM user_subjects us JOIN users u ON u.id = us.user_id
+         WHERE us.subject_id = s.id AND u.role = 'student')
+    FROM subjects s
+    ''')
+
+@migration(9, "Trigger-maintained subject, course and student counts per level and subject")
+def _reference_counts(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS level_counts (
+        level_id INTEGER PRIMARY KEY,
+        subjects INTEGER NOT NULL DEFAULT 0,
+        students INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS subject_counts (
+        subject_id INTEGER PRIMARY KEY,
+        courses INTEGER NOT NULL DEFAULT 0,
+        students INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+    rebuild_reference_counts(cursor)
+
+    # (counter table, key column, counted column, child table, child key column)
+    children = [
+        ("level_counts", "level_id", "subjects", "subjects", "level_id"),
+        ("subject_counts", "subject_id", "courses", "courses", "subject_id"),
+    ]
+    for counts, key, column, table, child_key in children:
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_{counts}
+        AFTER INSERT ON {table}
+        WHEN NEW.{child_key} IS NOT NULL
+        BEGIN
+            INSERT INTO {counts} ({key}, {column}) VALUES (NEW.{child_key}, 1)
+            ON CONFLICT ({key}) DO UPDATE SET {column} = {column} + 1;
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_{counts}
+        AFTER DELETE ON {table}
+        WHEN OLD.{child_key} IS NOT NULL
+        BEGIN
+            UPDATE {counts} SET {column} = {column} - 1 WHERE {key} = OLD.{child_key};
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_move_{counts}
+        AFTER UPDATE OF {child_key} ON {table}
+        WHEN OLD.{child_key} IS NOT NEW.{child_key}
+        BEGIN
+            UPDATE {counts} SET {column} = {column} - 1 WHERE {key} = OLD.{child_key};
+            INSERT INTO {counts} ({key}, {column}) SELECT NEW.{child_key}, 1 WHERE NEW.{child_key} IS NOT NULL
+            ON CONFLICT ({key}) DO UPDATE SET {column} = {column} + 1;
+        END
+        ''')
+
+    # (counter table, key column, assignment table)
+    assignments = [
+        ("level_counts", "level_id", "user_levels"),
+        ("subject_counts", "subject_id", "user_subjects"),
+    ]
+    for counts, key, table in assignments:
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_{counts}
+        AFTER INSERT ON {table}
+        WHEN (SELECT role FROM users WHERE id = NEW.user_id) = 'student'
+        BEGIN
+            INSERT INTO {counts} ({key}, students) VALUES (NEW.{key}, 1)
+            ON CONFLICT ({key}) DO UPDATE SET students = students + 1;
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_{counts}
+        AFTER DELETE ON {table}
+        WHEN (SELECT role FROM users WHERE id = OLD.user_id) = 'student'
+        BEGIN
+            UPDATE {counts} SET students = students - 1 WHERE {key} = OLD.{key};
+        END
+        ''')
+
+        # A user becoming or ceasing to be a student moves all of their assignments in or out of the counts
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_users_role_{counts}
+        AFTER UPDATE OF role ON users
+        WHEN (OLD.role IS 'student') != (NEW.role IS 'student')
+        BEGIN
+            INSERT INTO {counts} ({key}, students)
+            SELECT {key}, CASE WHEN NEW.role IS 'student' THEN 1 ELSE -1 END FROM {table} WHERE user_id = NEW.id
+            ON CONFLICT ({key}) DO UPDATE SET students = students + excluded.students;
+        END
+        ''')
+        # Users deleted with their assignments still in place (delete_user removes them first)
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_users_delete_{counts}
+        AFTER DELETE ON users
+        WHEN OLD.role = 'student'
+        BEGIN
+            UPDATE {counts} SET students = students - 1
+            WHERE {key} IN (SELECT {key} FROM {table} WHERE user_id = OLD.id);
+        END
+        ''')
+
+    # Counter rows go away with their level or subject
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_levels_delete_counts
+    AFTER DELETE ON levels
+    BEGIN
+        DELETE FROM level_counts WHERE level_id = OLD.id;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_subjects_delete_counts
+    AFTER DELETE ON subjects
+    BEGIN
+        DELETE FROM subject_counts WHERE subject_id = OLD.id;
+    END
+    ''')
+
+# Tables whose changes are published in change_log, with the columns recorded as row_id and user_id
+CHANGE_LOG_TABLES = [
+    ("users", "id", "id"),
+    ("levels", "id", None),
+    ("subjects", "id", None),
+    ("courses", "id", None),
+    ("user_levels", "level_id", "user_id"),
+    ("user_subjects", "subject_id", "user_id"),
+    ("user_courses", "course_id", "user_id"),
+]
+
+@migration(10, "Change log of the reference and assignment tables for cross-process cache invalidation")
+def _change_log(cursor):
+    # AUTOINCREMENT: sequence numbers are never reused, even after the log is pruned
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        op TEXT NOT NULL,
+        row_id INTEGER,
+        user_id INTEGER,
+        ts_ms INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_ts_ms ON change_log(ts_ms)")
+
+    now_ms = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+    for table, row_column, user_column in CHANGE_LOG_TABLES:
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            user_id = f"{row}.{user_column}" if user_column else "NULL"
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_change_log
+            AFTER {event} ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, op, row_id, user_id, ts_ms)
+                VALUES ('{table}', '{event}', {row}.{row_column}, {user_id}, {now_ms});
+            END
+            ''')
+
+@migration(11, "Index for the users listing filtered by role alone")
+def _users_role_created_index(cursor):
+    # With the rowid appended, (role, created_at) serves the (created_at, id) keyset without a sort
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_role_created ON users(role, created_at)")
+
+@migration(12, "All-time activity totals per user, for the unfiltered activity overview")
+def _activity_user_totals(cursor):
+    # All-time events per user (0 for events without a user); the count index serves the top users
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS activity_user_totals (
+        user_id INTEGER PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_user_totals_count ON activity_user_totals(count)")
+
+    # A single row counting the users with at least one event, bumped when a user gets their first one
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS activity_active_users (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        count INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+    # Backfill from the daily rollups, which also cover the archived days
+    cursor.execute('''
+    INSERT OR IGNORE INTO activity_user_totals (user_id, count)
+    SELECT user_id, SUM(count) FROM activity_daily_rollups GROUP BY user_id
+    ''')
+    cursor.execute('''
+    INSERT OR IGNORE INTO activity_active_users (id, count)
+    SELECT 1, COUNT(*) FROM activity_user_totals
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_activity_logs_user_totals
+    AFTER INSERT ON activity_logs
+    BEGIN
+        INSERT INTO activity_user_totals (user_id, count)
+        VALUES (COALESCE(NEW.user_id, 0), 1)
+        ON CONFLICT (user_id) DO UPDATE SET count = count + 1;
+    END
+    ''')
+    # An upsert that updates fires the UPDATE triggers only, so this runs once per user
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_activity_user_totals_insert
+    AFTER INSERT ON activity_user_totals
+    BEGIN
+        UPDATE activity_active_users SET count = count + 1 WHERE id = 1;
+    END
+    ''')
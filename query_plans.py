@@ -0,0 +1,341 @@
+"""
+Query-plan regression check for every SQL statement issued by Database.
+
+Seeds a temporary database with a large dataset, calls each public Database
+method with representative arguments while tracing the SQL it executes, and
+runs EXPLAIN QUERY PLAN on every traced statement. A statement fails the check
+when SQLite plans a full table scan of a table that grows with usage.
+
+Usage:
+    python query_plans.py [--users N] [--courses N] [--logs N] [--verbose]
+"""
+import argparse
+import inspect
+import os
+import random
+import re
+import sys
+import tempfile
+
+from database import Database
+from rows import encode_page_token
+
+# Tables that stay small enough to scan: a handful of levels and subjects (and their counters), one row per day of activity
+SMALL_TABLES = {"levels", "subjects", "activity_daily_totals", "level_counts", "subject_counts"}
+
+FTS_INTERNAL = re.compile(r"'main'\.'\w+_(?:config|data|idx|content|docsize)'")
+
+# Representative calls for every public Database method; ids refer to seeded rows
+QUERY_CASES = [
+    ("get_user", {"username": "student_42"}),
+    ("get_user_by_id", {"user_id": 42}),
+    ("get_all_users", {}),
+    ("get_all_users", {"role": "student"}),
+    ("get_all_users", {"role": "student", "validated": 1}),
+    ("get_all_users", {"validated": 0}),
+    ("get_level", {"level_id": 1}),
+    ("get_all_levels", {}),
+    ("get_subject", {"subject_id": 1}),
+    ("get_all_subjects", {}),
+    ("get_all_subjects", {"level_id": 1}),
+    ("get_course", {"course_id": 1}),
+    ("get_all_courses", {}),
+    ("get_all_courses", {"subject_id": 1}),
+    ("get_all_courses", {"level_id": 1}),
+    ("get_all_courses", {"difficulty": "hard"}),
+    ("get_all_courses", {"subject_id": 1, "level_id": 1, "difficulty": "easy"}),
+    ("get_user_levels", {"user_id": 42}),
+    ("get_user_subjects", {"user_id": 42}),
+    ("get_user_courses", {"user_id": 42}),
+    ("get_user_courses", {"user_id": 42, "subject_id": 1, "difficulty": "easy"}),
+    ("can_access_course", {"user_id": 43, "course_id": 1}),
+    ("get_users_assigned_to_level", {"level_id": 1}),
+    ("get_users_assigned_to_subject", {"subject_id": 1}),
+    ("get_users_assigned_to_course", {"course_id": 1}),
+    ("get_level_counts", {}),
+    ("get_subject_counts", {}),
+    ("get_recent_screenshots", {"user_id": 42, "course_id": 1}),
+    ("get_recent_screenshots", {"user_id": 42}),
+    ("get_activity_logs", {"limit": 50}),
+    ("get_activity_logs", {"limit": 50, "user_id": 42}),
+    ("get_users_page", {"page_size": 50}),
+    ("get_users_page", {"page_size": 50, "token": encode_page_token(["2024-06-01 12:00:00", 500]), "role": "student", "validated": 1}),
+    ("get_users_page", {"page_size": 50, "token": encode_page_token(["2024-06-01 12:00:00", 500]), "validated": 0}),
+    ("get_users_page", {"page_size": 50, "role": "admin"}),
+    ("get_users_page", {"page_size": 50, "token": encode_page_token(["2024-06-01 12:00:00", 500]), "role": "student"}),
+    ("get_courses_page", {"page_size": 50, "token": encode_page_token(["2024-06-01 12:00:00", 500])}),
+    ("get_courses_page", {"page_size": 50, "subject_id": 1, "token": encode_page_token(["2024-06-01 12:00:00", 500])}),
+    ("get_courses_page", {"page_size": 50, "level_id": 1, "difficulty": "easy"}),
+    ("get_user_courses_page", {"user_id": 42, "page_size": 50}),
+    ("get_users_assigned_to_course_page", {"course_id": 1, "page_size": 50, "token": encode_page_token([500])}),
+    ("get_unassigned_students_page", {"course_id": 1, "page_size": 50}),
+    ("get_unassigned_students_page", {"course_id": 1, "page_size": 50, "token": encode_page_token(["2024-06-01 12:00:00", 500])}),
+    ("get_activity_logs_page", {"page_size": 50, "token": encode_page_token([1717243200000, 500])}),
+    ("get_activity_logs_page", {"page_size": 50, "user_id": 42}),
+    ("get_activity_totals", {}),
+    ("get_activity_totals", {"since_day": "2024-06-01"}),
+    ("get_activity_totals", {"since_day": "2024-06-01", "user_id": 42}),
+    ("get_activity_by_day", {}),
+    ("get_activity_by_day", {"since_day": "2024-06-01"}),
+    ("get_activity_by_day", {"user_id": 42}),
+    ("get_activity_by_user", {}),
+    ("get_activity_by_user", {"since_day": "2024-06-01"}),
+    ("count_recent_activities", {}),
+    ("count_recent_activities", {"user_id": 42}),
+    ("search_courses", {"query": "course 12"}),
+    ("search_courses", {"query": "cou", "user_id": 42}),
+    ("search_courses", {"query": "course", "page_size": 20, "token": encode_page_token(list(range(500, 700)))}),
+    ("search_courses", {"query": "course", "subject_id": 1, "difficulty": "easy"}),
+    ("get_unindexed_documents", {"after_id": 500, "limit": 50}),
+    ("iter_users", {"role": "student"}),
+    ("iter_courses", {}),
+    ("iter_activity_logs", {"since": 1717200000000, "until": 1719792000000}),
+    ("iter_activity_logs", {"since": 1717200000000, "user_id": 42}),
+    ("iter_assignments", {}),
+    ("get_taxonomy_tree", {}),
+    ("get_platform_stats", {}),
+    ("add_user", {"username": "plan_check_user", "password_hash": "x", "role": "student"}),
+    ("update_user", {"user_id": 43, "full_name": "Plan Check"}),
+    ("validate_user", {"user_id": 43}),
+    ("add_level", {"name": "Plan Check Level"}),
+    ("update_level", {"level_id": 1, "description": "Plan check"}),
+    ("delete_level", {"level_id": 1}),
+    ("add_subject", {"name": "Plan Check Subject", "level_id": 1}),
+    ("update_subject", {"subject_id": 1, "description": "Plan check"}),
+    ("delete_subject", {"subject_id": 1}),
+    ("add_course", {"title": "Plan Check", "content_type": "PDF", "subject_id": 1, "level_id": 1, "difficulty": "easy"}),
+    ("update_course", {"course_id": 2, "title": "Plan Check"}),
+    ("assign_level_to_user", {"user_id": 43, "level_id": 2}),
+    ("assign_subject_to_user", {"user_id": 43, "subject_id": 2}),
+    ("assign_course_to_user", {"user_id": 43, "course_id": 2}),
+    ("assign_courses_to_user", {"user_id": 43, "course_ids": [4, 5, 6]}),
+    ("assign_course_to_users", {"course_id": 4, "user_ids": [45, 46, 47]}),
+    ("assign_subjects_to_user", {"user_id": 43, "subject_ids": [3, 4]}),
+    ("validate_and_assign", {"user_id": 48, "level_id": 2, "subject_ids": [3], "course_ids": [4, 5]}),
+    ("unassign_level_from_user", {"user_id": 43, "level_id": 2}),
+    ("unassign_subject_from_user", {"user_id": 43, "subject_id": 2}),
+    ("unassign_course_from_user", {"user_id": 43, "course_id": 2}),
+    ("log_screenshot", {"user_id": 42, "course_id": 1}),
+    ("log_activity", {"user_id": 42, "action": "Plan check"}),
+    ("set_course_search_text", {"course_id": 1, "text": "Plan check document text"}),
+    ("archive_activity_logs", {"retention_days": 30}),
+    ("delete_course", {"course_id": 3}),
+    ("delete_user", {"user_id": 44}),
+]
+
+# Public methods that issue no SQL of their own
+EXEMPT_METHODS = {"close", "transaction"}
+
+# Methods that read every row by design (full listings, whole-table aggregates, streams):
+# their statements are traced and explained, but may scan
+WHOLE_TABLE_METHODS = {
+    "get_all_users", "get_all_courses", "get_taxonomy_tree", "get_platform_stats",
+    "iter_users", "iter_courses", "iter_assignments",
+}
+
+def seed_dataset(db_path, users=20000, courses=5000, logs=200000, levels=8, subjects_per_level=12,
+                 courses_per_user=5, seed=1234):
+    """Fill a fresh database file with a large, reproducible dataset."""
+    rng = random.Random(seed)
+    difficulties = ["easy", "medium", "hard"]
+
+    with Database(db_path).pool.connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.executemany(
+            "INSERT INTO levels (name, description) VALUES (?, ?)",
+            [(f"Level {i}", None) for i in range(1, levels + 1)]
+        )
+        cursor.executemany(
+            "INSERT INTO subjects (name, level_id, description) VALUES (?, ?, ?)",
+            [(f"Subject {l}-{s}", l, None) for l in range(1, levels + 1) for s in range(subjects_per_level)]
+        )
+        subject_count = levels * subjects_per_level
+
+        cursor.executemany(
+            "INSERT INTO users (username, password_hash, role, full_name, validated, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (f"student_{i}", "x", "student", f"Student {i}", rng.randint(0, 1),
+                 f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00")
+                for i in range(users)
+            ]
+        )
+
+        course_rows = []
+        for i in range(courses):
+            subject_id = rng.randint(1, subject_count)
+            level_id = (subject_id - 1) // subjects_per_level + 1
+            course_rows.append((
+                f"Course {i}", "PDF", subject_id, level_id, rng.choice(difficulties),
+                f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00"
+            ))
+        cursor.executemany(
+            "INSERT INTO courses (title, content_type, subject_id, level_id, difficulty, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            course_rows
+        )
+
+        cursor.executemany(
+            "INSERT OR IGNORE INTO user_levels (user_id, level_id) VALUES (?, ?)",
+            [(u, rng.randint(1, levels)) for u in range(2, users + 2)]
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO user_subjects (user_id, subject_id) VALUES (?, ?)",
+            [(u, rng.randint(1, subject_count)) for u in range(2, users + 2) for _ in range(2)]
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO user_courses (user_id, course_id) VALUES (?, ?)",
+            [(u, rng.randint(1, courses)) for u in range(2, users + 2) for _ in range(courses_per_user)]
+        )
+
+        cursor.executemany(
+            "INSERT INTO activity_logs (user_id, action, timestamp) VALUES (?, ?, ?)",
+            [
+                (rng.randint(1, users), rng.choice(["Connexion", "Déconnexion", "Validation"]),
+                 f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00")
+                for _ in range(logs)
+            ]
+        )
+        cursor.executemany(
+            "INSERT INTO screenshot_logs (user_id, course_id, timestamp) VALUES (?, ?, ?)",
+            [
+                (rng.randint(1, users), rng.randint(1, courses),
+                 f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00")
+                for _ in range(logs // 4)
+            ]
+        )
+        conn.commit()
+
+def collect_statements(db):
+    """Run every query case and return [(method_name, sql)] for the statements it traced."""
+    statements = []
+    current = [None]
+
+    def trace(sql):
+        statements.append((current[0], sql))
+
+    with db.pool.connection() as conn:
+        conn.set_trace_callback(trace)
+        db.writer.set_trace_callback(trace)
+        try:
+            for name, kwargs in QUERY_CASES:
+                current[0] = name
+                result = getattr(db, name)(**kwargs)
+                if inspect.isgenerator(result):
+                    # Streams run their query on the first next()
+                    for _ in result:
+                        pass
+                # Buffered and fire-and-forget writes must be traced under their own case name
+                db.activity_logger.flush()
+                db.writer.flush()
+        finally:
+            conn.set_trace_callback(None)
+            db.writer.set_trace_callback(None)
+
+    return statements
+
+def missing_cases():
+    """Return public Database methods that have no entry in QUERY_CASES."""
+    covered = {name for name, _ in QUERY_CASES} | EXEMPT_METHODS
+    public = {
+        name for name, member in inspect.getmembers(Database, inspect.isfunction)
+        if not name.startswith("_")
+    }
+    return sorted(public - covered)
+
+def full_scans(plan_rows, sql):
+    """
+    Return the plan lines that walk a whole large table or index. The one scan
+    allowed is an index walk in ORDER BY order that LIMIT cuts short, with no
+    WHERE to filter rows out along the way (the first page of a listing).
+    """
+    bounded = (
+        re.search(r"\bLIMIT\b", sql, re.IGNORECASE) and not re.search(r"\bWHERE\b", sql, re.IGNORECASE)
+        and not any("TEMP B-TREE" in row[-1] for row in plan_rows)
+    )
+    problems = []
+    for row in plan_rows:
+        detail = row[-1]
+        # SEARCH lines seek into an index; every SCAN line walks a whole table or index
+        match = re.match(r"SCAN (\w+)(?: AS \w+)?", detail)
+        if not match:
+            continue
+        # A virtual table (FTS) with a non-empty index string answers the constraint itself
+        if re.search(r"VIRTUAL TABLE INDEX \d+:\S", detail):
+            continue
+        if match.group(1) in SMALL_TABLES:
+            continue
+        if bounded and "USING" in detail:
+            continue
+        problems.append(detail)
+    return problems
+
+def explain(conn, sql):
+    """Return the EXPLAIN QUERY PLAN rows for a statement."""
+    return conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+
+def resolve_aliases(sql, detail):
+    """Map a plan alias (e.g. 'SCAN c') back to its table name using the statement text."""
+    match = re.match(r"SCAN (\w+)", detail)
+    if not match:
+        return detail
+    alias = match.group(1)
+    table = re.search(rf"\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?{alias}\b", sql, re.IGNORECASE)
+    return detail.replace(f"SCAN {alias}", f"SCAN {table.group(1)}", 1) if table else detail
+
+def check_query_plans(db, verbose=False):
+    """Explain every traced statement and return a list of (method_name, sql, problems)."""
+    failures = []
+
+    with db.pool.connection() as conn:
+        for name, sql in collect_statements(db):
+            keyword = sql.lstrip().split(None, 1)[0].upper()
+            if keyword not in ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT"):
+                continue
+            # Statements FTS5 runs on its own shadow tables ('main'.'courses_fts_config', ...)
+            if FTS_INTERNAL.search(sql):
+                continue
+
+            plan = [row[:-1] + (resolve_aliases(sql, row[-1]),) for row in explain(conn, sql)]
+            problems = full_scans(plan, sql)
+
+            if verbose:
+                print(f"{name}: {' '.join(sql.split())}")
+                for row in plan:
+                    print(f"    {row[-1]}")
+
+            if problems and name not in WHOLE_TABLE_METHODS:
+                failures.append((name, " ".join(sql.split()), problems))
+
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail when a Database query falls back to a full table scan.")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--courses", type=int, default=5000)
+    parser.add_argument("--logs", type=int, default=200000)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    missing = missing_cases()
+    if missing:
+        print(f"Database methods without a query-plan case: {', '.join(missing)}")
+        return 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "query_plans.db")
+        seed_dataset(db_path, users=args.users, courses=args.courses, logs=args.logs)
+        failures = check_query_plans(Database(db_path), verbose=args.verbose)
+
+    for name, sql, problems in failures:
+        print(f"FULL SCAN in {name}: {sql}")
+        for problem in problems:
+            print(f"    {problem}")
+
+    if failures:
+        return 1
+
+    print(f"OK: {len(QUERY_CASES)} query cases, no full scans of large tables")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from array import array
+from collections import deque
+
+import numpy as np
+
+from timestamps import now_ms
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in milliseconds (plus one overflow bucket)
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+_LATENCY_BUCKETS = tuple(bound / 1000 for bound in LATENCY_BUCKETS_MS)
+
+# Queries slower than this many seconds go to the slow-query log
+SLOW_QUERY_SECONDS = 0.1
+
+# Whether the per-database statistics measure queries from the start. Off: measuring
+# costs about 2% of an indexed read (python benchmarks.py instrumentation); switch it on
+# where needed with get_query_stats(db_path).enabled = True
+QUERY_STATS_ENABLED = False
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that remembers the statements it ran and counts the rows they returned or changed."""
+
+    statements = ()
+    rows = 0
+
+    def execute(self, sql, parameters=()):
+        self.statements += ((sql, parameters, False),)
+        super().execute(sql, parameters)
+        if self.rowcount > 0:
+            self.rows += self.rowcount
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        self.statements += ((sql, seq_of_parameters, True),)
+        super().executemany(sql, seq_of_parameters)
+        if self.rowcount > 0:
+            self.rows += self.rowcount
+        return self
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self.rows += len(rows)
+        return rows
+
+def redact(params):
+    """Replace parameter values by their type (and length), so logs never carry user data."""
+    def placeholder(value):
+        if value is None:
+            return None
+        if isinstance(value, (str, bytes)):
+            return f"<{type(value).__name__}:{len(value)}>"
+        return f"<{type(value).__name__}>"
+
+    if isinstance(params, dict):
+        return {key: placeholder(value) for key, value in params.items()}
+    return [placeholder(value) for value in params]
+
+class QueryStat:
+    """Call count, rows and latency histogram of one logical query."""
+
+    __slots__ = ("calls", "rows", "total", "max", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, timings, rows):
+        """Fold a batch of runs, given as arrays of their elapsed seconds and row counts, into the statistics."""
+        timings = np.frombuffer(timings, dtype=np.float64)
+        self.calls += len(timings)
+        self.rows += int(np.frombuffer(rows, dtype=np.int64).sum())
+        self.total += float(timings.sum())
+        self.max = max(self.max, float(timings.max()))
+
+        # Bucket i counts the runs no slower than its bound (and above the previous one)
+        indexes = np.searchsorted(_LATENCY_BUCKETS, timings, side="left")
+        for index, count in enumerate(np.bincount(indexes, minlength=len(self.buckets)).tolist()):
+            self.buckets[index] += count
+
+    def percentile(self, fraction):
+        """Upper bound (ms) of the bucket holding the given fraction of calls (None past the last bound)."""
+        target = fraction * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= target:
+                return bound
+        return None
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "rows": self.rows,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.calls if self.calls else 0.0,
+            "max_ms": self.max * 1000,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "histogram": dict(zip([str(bound) for bound in LATENCY_BUCKETS_MS] + ["inf"], self.buckets)),
+        }
+
+class QueryStats:
+    """
+    Per-query statistics for one database file.
+
+    Queries are named by the caller (Database names them after the method
+    that runs them, e.g. get_user_courses). Queries slower than
+    slow_threshold seconds are also kept, with their SQL and redacted
+    parameters, in a bounded slow-query log.
+
+    To keep the cost per call low, record() only appends the run's duration and
+    row count to two typed arrays per query (no object is allocated per run and
+    no lock is taken); the runs are folded into the histograms in vectorized batches,
+    every FOLD_SIZE runs and whenever the statistics are read. The statements of
+    a run are only looked at when it is slow.
+    """
+
+    FOLD_SIZE = 4096
+
+    def __init__(self, slow_threshold=SLOW_QUERY_SECONDS, slow_log_size=100, enabled=True):
+        """
+        Args:
+            slow_threshold: Seconds above which a query is logged as slow
+            slow_log_size: Number of slow queries kept (oldest are dropped first)
+            enabled: Whether queries are measured at all
+        """
+        self.slow_threshold = slow_threshold
+        self.enabled = enabled
+        self._stats = {}
+        self._pending = {}
+        self._slow = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed, rows, statements=()):
+        """
+        Add one run of a query: its duration in seconds, the rows it returned or changed,
+        and the statements it executed as (sql, params, many) tuples.
+        """
+        pending = self._pending.get(name)
+        if pending is None:
+            pending = self._pending.setdefault(name, (array("d"), array("q")))
+        timings, rows_pending = pending
+        timings.append(elapsed)
+        rows_pending.append(rows)
+
+        if len(timings) >= self.FOLD_SIZE:
+            self._fold(name, pending)
+        if elapsed >= self.slow_threshold:
+            self._log_slow(name, elapsed, rows, statements)
+
+    def record_query(self, name, elapsed, rows, sql, params):
+        """record() for a run of a single read statement; its statement tuple is only built if the run is slow."""
+        pending = self._pending.get(name)
+        if pending is None:
+            pending = self._pending.setdefault(name, (array("d"), array("q")))
+        timings, rows_pending = pending
+        timings.append(elapsed)
+        rows_pending.append(rows)
+
+        if len(timings) >= self.FOLD_SIZE:
+            self._fold(name, pending)
+        if elapsed >= self.slow_threshold:
+            self._log_slow(name, elapsed, rows, ((sql, params, False),))
+
+    def _fold(self, name, pending):
+        """Move the runs pending for a query into its statistics."""
+        timings, rows = pending
+        with self._lock:
+            # Row counts are appended after durations: runs appended meanwhile land past count and stay pending
+            count = len(rows)
+            if not count:
+                return
+            batch = (timings[:count], rows[:count])
+            del timings[:count]
+            del rows[:count]
+
+            stat = self._stats.get(name)
+            if stat is None:
+                stat = self._stats[name] = QueryStat()
+            stat.add(*batch)
+
+    def _log_slow(self, name, elapsed, rows, statements):
+        entry = {
+            "query": name,
+            "at_ms": now_ms(),
+            "duration_ms": elapsed * 1000,
+            "rows": rows,
+            "statements": [
+                {
+                    "sql": " ".join(sql.split()),
+                    "params": f"<{len(params)} rows>" if many else redact(params),
+                }
+                for sql, params, many in statements
+            ],
+        }
+        with self._lock:
+            self._slow.append(entry)
+        logger.warning("Slow query %s: %.1f ms, %d rows", name, elapsed * 1000, rows)
+
+    def stats(self):
+        """Return {query name: summary dict} for every query seen so far."""
+        for name, pending in list(self._pending.items()):
+            self._fold(name, pending)
+        with self._lock:
+            return {name: stat.to_dict() for name, stat in self._stats.items()}
+
+    def slow_queries(self):
+        """Return the slow-query log, oldest first."""
+        with self._lock:
+            return list(self._slow)
+
+    def reset(self):
+        """Forget all statistics and the slow-query log."""
+        with self._lock:
+            self._pending.clear()
+            self._stats.clear()
+            self._slow.clear()
+
+    def dump(self, stream=None):
+        """Write a table of the statistics, slowest total time first, and the slow-query log."""
+        stream = stream or sys.stdout
+        stats = sorted(self.stats().items(), key=lambda item: item[1]["total_ms"], reverse=True)
+
+        def ms(value):
+            return f">{LATENCY_BUCKETS_MS[-1]:g}" if value is None else f"{value:g}"
+
+        width = max([len(name) for name, _ in stats] + [5])
+        print(f"{'query'.ljust(width)}  {'calls':>8}  {'rows':>9}  {'total ms':>10}  {'mean ms':>8}  "
+              f"{'p50':>6}  {'p95':>6}  {'p99':>6}  {'max ms':>8}", file=stream)
+        for name, stat in stats:
+            print(f"{name.ljust(width)}  {stat['calls']:8d}  {stat['rows']:9d}  {stat['total_ms']:10.1f}  "
+                  f"{stat['mean_ms']:8.2f}  {ms(stat['p50_ms']):>6}  {ms(stat['p95_ms']):>6}  "
+                  f"{ms(stat['p99_ms']):>6}  {stat['max_ms']:8.1f}", file=stream)
+
+        slow = self.slow_queries()
+        if slow:
+            print(f"\nSlow queries (>= {self.slow_threshold * 1000:g} ms):", file=stream)
+            for entry in slow:
+                print(f"  {entry['query']}: {entry['duration_ms']:.1f} ms, {entry['rows']} rows", file=stream)
+                for statement in entry["statements"]:
+                    print(f"    {statement['sql']}  {statement['params']}", file=stream)
+
+    def write_json(self, path):
+        """Save the statistics and the slow-query log to a JSON file."""
+        with open(path, "w") as f:
+            json.dump({"queries": self.stats(), "slow_queries": self.slow_queries()}, f, indent=2)
+
+_query_stats = {}
+_query_stats_lock = threading.Lock()
+
+def get_query_stats(db_path):
+    """Get the process-wide query statistics for a database file."""
+    key = os.path.abspath(db_path)
+    with _query_stats_lock:
+        stats = _query_stats.get(key)
+        if stats is None:
+            stats = QueryStats(enabled=QUERY_STATS_ENABLED)
+            _query_stats[key] = stats
+        return stats
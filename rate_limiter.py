@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Screenshots allowed per user and course within the sliding window
+SCREENSHOT_LIMIT = 3
+SCREENSHOT_WINDOW_MINUTES = 15
+
+class ScreenshotRateLimiter:
+    """
+    In-memory sliding-window limiter for screenshots, per (user, course).
+
+    Each key keeps the times of its accepted screenshots in a deque of at most
+    `limit` entries, so a check is O(1): drop the entries that left the window,
+    compare the length, append. The check and the append happen under one lock,
+    so concurrent clicks cannot exceed the limit. Accepted screenshots are
+    written to screenshot_logs through the write queue without waiting, and the
+    windows are rebuilt from the last `window` seconds of logs on startup.
+
+    The windows belong to one process. With several app processes each enforces
+    the limit on its own from the screenshots it accepted (plus those logged
+    before it started), so a user whose requests reach N processes can take up
+    to N * limit screenshots per window.
+    """
+
+    def __init__(self, db, limit=SCREENSHOT_LIMIT, window=SCREENSHOT_WINDOW_MINUTES * 60):
+        """
+        Create the limiter and load the screenshots still inside the window.
+
+        Args:
+            db: Database handle the screenshots are logged through
+            limit: Screenshots allowed per user and course within the window
+            window: Window length in seconds
+        """
+        self.db = db
+        self.limit = limit
+        self.window = window
+
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.time() + window
+
+        self._rebuild()
+
+    def try_acquire(self, user_id, course_id):
+        """
+        Record a screenshot if the limit allows it.
+        Returns (allowed, remaining) where remaining is the number of screenshots left in the window.
+        """
+        now = time.time()
+        key = (user_id, course_id)
+
+        with self._lock:
+            times = self._windows.get(key)
+            if times is None:
+                times = self._windows[key] = deque(maxlen=self.limit)
+
+            cutoff = now - self.window
+            while times and times[0] <= cutoff:
+                times.popleft()
+
+            if len(times) >= self.limit:
+                return False, 0
+
+            times.append(now)
+            remaining = self.limit - len(times)
+
+            if now >= self._next_sweep:
+                self._sweep(cutoff)
+                self._next_sweep = now + self.window
+
+        self._persist(user_id, course_id, now)
+        return True, remaining
+
+    def count(self, user_id, course_id):
+        """Return the number of screenshots for a user and course within the window."""
+        cutoff = time.time() - self.window
+        with self._lock:
+            times = self._windows.get((user_id, course_id), ())
+            return sum(1 for t in times if t > cutoff)
+
+    def _sweep(self, cutoff):
+        """Forget keys whose screenshots have all left the window (called with the lock held)."""
+        expired = [key for key, times in self._windows.items() if not times or times[-1] <= cutoff]
+        for key in expired:
+            del self._windows[key]
+
+    def _persist(self, user_id, course_id, taken_at):
+        """Queue the screenshot log row through Database.log_screenshot, without waiting for the commit."""
+        self.db.log_screenshot(user_id, course_id, taken_ms=int(taken_at * 1000), wait=False)
+
+    def _rebuild(self):
+        """Load the screenshots logged within the window, so a restart does not reset the limits."""
+        since_ms = int((time.time() - self.window) * 1000)
+        with self.db.pool.connection() as conn:
+            rows = conn.execute("""
+            SELECT user_id, course_id, ts_ms FROM screenshot_logs
+            WHERE ts_ms > ?
+            ORDER BY ts_ms
+            """, (since_ms,)).fetchall()
+
+        with self._lock:
+            for user_id, course_id, taken_ms in rows:
+                key = (user_id, course_id)
+                if key not in self._windows:
+                    self._windows[key] = deque(maxlen=self.limit)
+                self._windows[key].append(taken_ms / 1000)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_screenshot_limiter(db):
+    """Get the process-wide screenshot limiter for a Database's file, rebuilding it on first use; it keeps that handle."""
+    key = os.path.abspath(db.db_path)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = ScreenshotRateLimiter(db)
+            _limiters[key] = limiter
+        return limiter
@@ -0,0 +1,65 @@
+import os
+import threading
+
+class ResultCache:
+    """
+    Process-wide memo of query results for one database file.
+
+    Values are computed on first use and kept until a write invalidates them,
+    or, for values tagged with a generation read from the database, until the
+    stored generation moves on (which also catches writes from other processes).
+    Each invalidation bumps a version number; a value computed while a write
+    landed is returned to its caller but not stored, so a slow reader can never
+    put stale results back into the cache.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._versions = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, compute, generation=None):
+        """
+        Return the cached value for key, computing and storing it on a miss.
+        When a generation is given, a value cached under another generation counts as a miss.
+        """
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None and entry[0] == generation:
+                return entry[1]
+            version = self._versions.get(key, 0)
+            epoch = self._epoch
+
+        value = compute()
+
+        with self._lock:
+            if self._versions.get(key, 0) == version and self._epoch == epoch:
+                self._values[key] = (generation, value)
+        return value
+
+    def invalidate(self, *keys):
+        """Drop the cached values for the given keys."""
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+    def clear(self):
+        """Drop every cached value, including ones still being computed."""
+        with self._lock:
+            self._values.clear()
+            self._epoch += 1
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(db_path):
+    """Get the process-wide result cache for a database file."""
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = ResultCache()
+            _caches[key] = cache
+        return cache
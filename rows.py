@@ -0,0 +1,113 @@
+import base64
+import json
+import sys
+from collections import namedtuple
+from itertools import islice
+
+def record_type(name, columns):
+    """
+    Build a compact, immutable record class for a fixed column list.
+
+    Records are tuples underneath (no per-instance __dict__), so a row from
+    sqlite3 becomes a record without copying values into a dict. They support
+    both attribute access (user.username) and the dict-style key access the
+    dashboards already use (user['username'], user.get('email'), dict(user)),
+    and pandas builds DataFrames from them with the column names in order.
+    """
+    columns = tuple(columns)
+    base = namedtuple(name, columns)
+    index = {column: i for i, column in enumerate(columns)}
+    tuple_getitem = tuple.__getitem__
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return tuple_getitem(self, index[key])
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple_getitem(self, key)
+
+    def get(self, key, default=None):
+        i = index.get(key)
+        return default if i is None else tuple_getitem(self, i)
+
+    def keys(self):
+        return columns
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return zip(columns, self)
+
+    def __contains__(self, key):
+        return key in index
+
+    def to_dict(self):
+        return dict(zip(columns, self))
+
+    namespace = {
+        "__slots__": (),
+        "__getitem__": __getitem__,
+        "get": get,
+        "keys": keys,
+        "values": values,
+        "items": items,
+        "__contains__": __contains__,
+        "to_dict": to_dict,
+        "from_row": classmethod(tuple.__new__),
+        # Like namedtuple: report the caller's module so records can be pickled
+        "__module__": sys._getframe(1).f_globals.get("__name__", __name__),
+    }
+    return type(name, (base,), namespace)
+
+def select_list(alias, columns):
+    """Render 'alias.col1, alias.col2, ...' for a column list."""
+    return ", ".join(f"{alias}.{column}" for column in columns)
+
+def map_rows(record, rows):
+    """Convert raw sqlite3 row tuples into records."""
+    return list(map(record.from_row, rows))
+
+def iter_frames(records, chunk_size=50000):
+    """
+    Group a stream of records (e.g. Database.iter_activity_logs()) into pandas
+    DataFrames of at most chunk_size rows, so a table too large to load at once
+    can be processed chunk by chunk:
+
+        counts = pd.Series(dtype="int64")
+        for frame in iter_frames(db.iter_activity_logs(since=since_ms)):
+            counts = counts.add(frame["action"].value_counts(), fill_value=0)
+    """
+    # pandas is only needed by the dashboards and analytics code
+    import pandas as pd
+
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield pd.DataFrame(chunk, columns=chunk[0].keys())
+
+# One page of a keyset-paginated listing; next_token is None on the last page
+Page = namedtuple("Page", ["items", "next_token"])
+
+def encode_page_token(values):
+    """Encode the sort-key values of the last row of a page into an opaque continuation token."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_page_token(token, size=None):
+    """
+    Decode a continuation token into its list of values (size of them, when given);
+    raises ValueError for tokens this code did not produce.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid page token: {token!r}") from e
+
+    if not isinstance(values, list) or (size is not None and len(values) != size):
+        raise ValueError(f"Invalid page token: {token!r}")
+    return values
@@ -0,0 +1,15 @@
+from database import Database
+
+def test_validate_and_assign_refreshes_platform_stats(tmp_path):
+    db = Database(str(tmp_path / "stats.db"))
+    db.change_feed.stop()
+    level_id = db.add_level("Bac+2")
+    subject_id = db.add_subject("Algèbre", level_id)
+    course_id = db.add_course("Matrices", "PDF", subject_id, level_id, "easy")
+    user_id = db.add_user("etudiant", "x", "student")
+
+    assert db.get_platform_stats().validated_students == 0
+
+    assert db.validate_and_assign(user_id, level_id, [subject_id], [course_id])
+    # Read right away: the cached stats must not wait for the change feed
+    assert db.get_platform_stats().validated_students == 1
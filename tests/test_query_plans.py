@@ -0,0 +1,13 @@
+import query_plans
+from database import Database
+
+def test_every_database_method_has_a_query_plan_case():
+    assert query_plans.missing_cases() == []
+
+def test_no_query_scans_a_large_table(tmp_path):
+    db_path = str(tmp_path / "plans.db")
+    query_plans.seed_dataset(db_path, users=2000, courses=500, logs=20000)
+    db = Database(db_path)
+    db.change_feed.stop()
+
+    assert query_plans.check_query_plans(db) == []
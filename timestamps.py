@@ -0,0 +1,17 @@
+import time
+from datetime import datetime, timezone
+
+# Text format of the TIMESTAMP columns (UTC, as written by CURRENT_TIMESTAMP)
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def now_ms():
+    """Current time as integer milliseconds since the Unix epoch."""
+    return time.time_ns() // 1_000_000
+
+def ms_ago(delta):
+    """Epoch milliseconds for a moment in the past, given as a timedelta."""
+    return now_ms() - int(delta.total_seconds() * 1000)
+
+def ms_to_text(ms):
+    """Format epoch milliseconds like a CURRENT_TIMESTAMP value."""
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime(TIMESTAMP_FORMAT)
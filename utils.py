@@ -4,6 +4,7 @@ import tempfile
 from datetime import datetime
 from encryption import FileEncryption
 from database import Database
+from rate_limiter import get_screenshot_limiter, SCREENSHOT_LIMIT, SCREENSHOT_WINDOW_MINUTES
 import streamlit as st
 import io
 import re
@@ -242,6 +243,35 @@ def create_card(title, content, card_class="card"):
     """
     return card_html
 
+def current_page_token(state_key, filters):
+    """
+    Return the continuation token of the page currently shown for a paginated list.
+    Navigation restarts at the first page whenever the filters change.
+    """
+    state = st.session_state.get(state_key)
+    if not state or state["filters"] != filters:
+        state = {"filters": filters, "tokens": [None]}
+        st.session_state[state_key] = state
+    return state["tokens"][-1]
+
+def page_navigation(state_key, next_token):
+    """Render previous/next buttons for a list paginated with current_page_token()."""
+    state = st.session_state[state_key]
+    col1, col2, col3 = st.columns([1, 2, 1])
+
+    with col1:
+        if len(state["tokens"]) > 1 and st.button("← Previous page", key=f"{state_key}_prev"):
+            state["tokens"].pop()
+            st.rerun()
+
+    with col2:
+        st.caption(f"Page {len(state['tokens'])}")
+
+    with col3:
+        if next_token and st.button("Next page →", key=f"{state_key}_next"):
+            state["tokens"].append(next_token)
+            st.rerun()
+
 def format_size(size_bytes):
     """Format file size in a human-readable format."""
     for unit in ['B', 'KB', 'MB', 'GB']:
@@ -290,19 +320,13 @@ def log_screenshot_attempt(user_id, course_id):
     """
     db = Database()
     
-    # Get current count
-    recent_count = db.get_recent_screenshots(user_id, course_id, minutes=15)
-    
-    # Check if limit exceeded
-    if recent_count >= 3:
-        return False, "Screenshot limit reached (3 per 15 minutes). Please try again later."
+    # Atomic in-memory check and record; the log row is written in the background
+    allowed, remaining = get_screenshot_limiter(db).try_acquire(user_id, course_id)
     
-    # Log the new attempt
-    db.log_screenshot(user_id, course_id)
+    if not allowed:
+        return False, f"Screenshot limit reached ({SCREENSHOT_LIMIT} per {SCREENSHOT_WINDOW_MINUTES} minutes). Please try again later."
     
-    # Calculate remaining
-    remaining = 3 - (recent_count + 1)
-    return True, f"Screenshot taken. You have {remaining} screenshot{'s' if remaining != 1 else ''} remaining in this 15-minute period."
+    return True, f"Screenshot taken. You have {remaining} screenshot{'s' if remaining != 1 else ''} remaining in this {SCREENSHOT_WINDOW_MINUTES}-minute period."
 
 def protect_pdf_content():
     """Add JavaScript to protect PDF content."""